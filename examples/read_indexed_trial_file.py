@@ -0,0 +1,39 @@
+# %% Imports
+
+from platformdirs import user_data_dir
+import os
+import numpy as np
+
+from pcms_txbdc.model.application_configuration import ApplicationConfiguration
+from pcms_txbdc.model.indexed_trial_data import IndexedTrialData
+
+# %% Define the subject ID and then find all Stage 0a/0b data files
+
+subject_id: str = "TEST"
+
+app_data_path: str = user_data_dir(ApplicationConfiguration.appname, ApplicationConfiguration.appauthor)
+subject_data_path: str = os.path.join(app_data_path, subject_id)
+
+file_list: list[str] = [f for f in os.listdir(subject_data_path) if (f.endswith("_fwave0a.pcms") or f.endswith("_mep0b.pcms"))]
+
+print(f"{len(file_list)} files were found: ")
+for f in file_list:
+    print(f)
+
+# %% Print data from the first file that was found
+
+if (len(file_list) > 0):
+
+    #The file is memory-mapped, so only the trials that are used are read from disk
+    session_data: IndexedTrialData = IndexedTrialData(os.path.join(subject_data_path, file_list[0]))
+
+    #Display the number of trials
+    print(f"Trial count = {len(session_data)}")
+    if (session_data.is_recovered):
+        print("The file was not closed properly. Its trial index was rebuilt from the trial records.")
+
+    #Display the peak-to-peak amplitude of each trial
+    for (i, trial) in enumerate(session_data.iter_trials()):
+        print(f"Trial {i + 1}: t = {session_data.timestamps[i]:.2f} s, amplitude = {session_data.amplitudes[i]} mA, peak-to-peak = {np.ptp(trial):.2f}")
+
+    session_data.close()
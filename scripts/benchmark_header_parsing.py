@@ -0,0 +1,158 @@
+'''
+Micro-benchmark for parsing the headers of Open Ephys ZMQ data messages.
+
+A local ZMQ publisher stands in for Open Ephys and sends data messages laid
+out the same way as the Open Ephys ZMQ interface (envelope, JSON header, and
+float32 payload). The messages are received with a SUB socket and their
+headers are parsed with each header parsing configuration, and the number of
+messages per second is reported for each configuration.
+
+Usage:
+    python scripts/benchmark_header_parsing.py [message count]
+'''
+
+import sys
+import json
+import time
+import threading
+import numpy as np
+import zmq
+
+from pcms_txbdc.model.open_ephys_header_parser import OpenEphysHeaderParser, orjson
+
+BENCHMARK_ADDRESS: str = "tcp://127.0.0.1:5599"
+DEFAULT_MESSAGE_COUNT: int = 200000
+CHANNEL_COUNT: int = 2
+SAMPLES_PER_BLOCK: int = 64
+SAMPLE_RATE: float = 5000.0
+
+def compose_messages (message_count: int) -> list[list[bytes]]:
+    '''
+    Creates data messages that are laid out the same way as messages from Open Ephys
+    '''
+
+    payload: bytes = np.zeros(SAMPLES_PER_BLOCK, dtype=np.float32).tobytes()
+    messages: list[list[bytes]] = []
+    for i in range(0, message_count):
+        header: dict = {
+            'message_num': i,
+            'type': 'data',
+            'content': {
+                'stream': 'Rhythm Data',
+                'channel_num': i % CHANNEL_COUNT,
+                'num_samples': SAMPLES_PER_BLOCK,
+                'sample_num': (i // CHANNEL_COUNT) * SAMPLES_PER_BLOCK,
+                'sample_rate': SAMPLE_RATE
+            },
+            'data_size': len(payload),
+            'timestamp': 1700000000000 + i
+        }
+
+        messages.append([b'data', json.dumps(header).encode('utf-8'), payload])
+
+    return messages
+
+def publish_messages (context: zmq.Context, messages: list[list[bytes]], ready: threading.Event) -> None:
+    '''
+    Stands in for Open Ephys by publishing the messages on a PUB socket
+    '''
+
+    socket: zmq.Socket = context.socket(zmq.PUB)
+    socket.setsockopt(zmq.SNDHWM, 0)
+    socket.bind(BENCHMARK_ADDRESS)
+
+    #Wait for the subscriber to connect (PUB sockets drop messages until it has)
+    ready.wait()
+    time.sleep(0.5)
+
+    for message in messages:
+        socket.send_multipart(message)
+
+    socket.close(linger = -1)
+
+def run_benchmark (label: str, parser: OpenEphysHeaderParser, message_count: int) -> float:
+    '''
+    Receives the messages from the publisher and parses each header. Returns the
+    number of messages per second.
+    '''
+
+    context: zmq.Context = zmq.Context()
+    messages: list[list[bytes]] = compose_messages(message_count)
+
+    #Connect the subscriber before starting the publisher
+    socket: zmq.Socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 0)
+    socket.setsockopt(zmq.SUBSCRIBE, b'')
+    socket.connect(BENCHMARK_ADDRESS)
+
+    ready: threading.Event = threading.Event()
+    publisher: threading.Thread = threading.Thread(target = publish_messages, args = (context, messages, ready))
+    publisher.start()
+    ready.set()
+
+    #Wait for the first message before starting the clock
+    message = socket.recv_multipart()
+    parser.parse(message[1])
+
+    start_time: float = time.perf_counter()
+    for i in range(1, message_count):
+        message = socket.recv_multipart()
+        parser.parse(message[1])
+    elapsed_time: float = time.perf_counter() - start_time
+
+    publisher.join()
+    socket.close()
+    context.term()
+
+    messages_per_second: float = (message_count - 1) / elapsed_time
+    print(f"{label:<32} {messages_per_second:>12,.0f} messages/sec  (fast path hits = {parser.fast_path_count}, full parses = {parser.full_parse_count})")
+
+    return messages_per_second
+
+def run_parse_only_benchmark (label: str, parser: OpenEphysHeaderParser, message_count: int) -> float:
+    '''
+    Parses the headers without any socket I/O, to isolate the cost of header parsing
+    '''
+
+    headers: list[bytes] = [m[1] for m in compose_messages(message_count)]
+
+    start_time: float = time.perf_counter()
+    for header in headers:
+        parser.parse(header)
+    elapsed_time: float = time.perf_counter() - start_time
+
+    messages_per_second: float = message_count / elapsed_time
+    print(f"{label:<32} {messages_per_second:>12,.0f} headers/sec")
+
+    return messages_per_second
+
+def main () -> None:
+    message_count: int = DEFAULT_MESSAGE_COUNT
+    if (len(sys.argv) > 1):
+        message_count = int(sys.argv[1])
+
+    #Each configuration is (label, use fast path, use orjson)
+    configurations: list[tuple[str, bool, bool]] = [
+        ("json (previous behavior)", False, False),
+        ("json + template fast path", True, False)
+    ]
+    if (orjson is not None):
+        configurations.append(("orjson", False, True))
+        configurations.append(("orjson + template fast path", True, True))
+    else:
+        print("orjson is not installed, so the orjson configurations are skipped")
+
+    print(f"Header parsing only ({message_count} headers)")
+    for (label, use_fast_path, use_orjson) in configurations:
+        run_parse_only_benchmark(label, OpenEphysHeaderParser(use_fast_path, use_orjson), message_count)
+
+    print()
+    print(f"Receive and parse over ZMQ ({message_count} messages)")
+    for (label, use_fast_path, use_orjson) in configurations:
+        run_benchmark(label, OpenEphysHeaderParser(use_fast_path, use_orjson), message_count)
+
+    print()
+    print(f"The default configuration is: fast path = {OpenEphysHeaderParser().use_fast_path}, orjson = {OpenEphysHeaderParser().use_orjson}")
+
+if __name__ == "__main__":
+    main()
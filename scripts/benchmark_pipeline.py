@@ -0,0 +1,165 @@
+'''
+Headless end-to-end benchmark of the EMG acquisition pipeline.
+
+The Open Ephys simulator runs in a separate process (so that its CPU use is
+not counted), and the application's own streamer, background worker, and
+stage runner receive and process its data exactly as they do in the GUI,
+without any plotting. At the end of the run, this reports:
+
+    - frames per second, and how many frames/blocks were dropped
+    - latency from Open Ephys sending a block to the block being received,
+      from the frame being complete to it being emitted by the background
+      worker, from being emitted to arriving on the UI thread, and from
+      arriving on the UI thread to being processed by the stage
+    - CPU time used by this process per frame
+
+Usage:
+    python scripts/benchmark_pipeline.py [--duration S] [--channels N] [--block-size N]
+                                         [--sample-rate HZ] [--jitter-ms MS] [--drop-probability P]
+'''
+
+import argparse
+import multiprocessing
+import time
+import numpy as np
+
+from PySide6.QtCore import QCoreApplication, QThreadPool, QTimer
+
+from pcms_txbdc.model.open_ephys_simulator import OpenEphysSimulator
+from pcms_txbdc.model.open_ephys_streamer import OpenEphysStreamer, OpenEphysDataFrame
+from pcms_txbdc.model.background_worker import BackgroundWorker
+from pcms_txbdc.model.stage_runner import StageRunner
+from pcms_txbdc.model.stages.stage import Stage
+
+#The benchmark uses its own ports so that it doesn't interfere with a running copy of Open Ephys
+BENCHMARK_DATA_PORT: int = 5596
+BENCHMARK_EVENT_PORT: int = 5597
+
+class BenchmarkStage (Stage):
+    '''
+    A stage that records when each frame was processed
+    '''
+
+    def __init__(self):
+        super().__init__()
+
+        self.stage_name = "Benchmark"
+        self.frame_count: int = 0
+        self.sent_to_received_ms: list[float] = []
+        self.received_to_emitted_ms: list[float] = []
+        self.emitted_to_delivered_ms: list[float] = []
+        self.delivered_to_processed_ms: list[float] = []
+
+    def process (self, data_frame: OpenEphysDataFrame) -> None:
+        processed_ms: float = time.time() * 1000
+
+        #The frame was complete once its last block was received
+        received_ms: float = max([b.timestamp_received_millis for b in data_frame.channel_data_blocks])
+
+        self.frame_count += 1
+        self.sent_to_received_ms.append(received_ms - data_frame.timestamp)
+        self.received_to_emitted_ms.append(data_frame.timestamp_emitted - received_ms)
+        self.emitted_to_delivered_ms.append(data_frame.timestamp_delivered - data_frame.timestamp_emitted)
+        self.delivered_to_processed_ms.append(processed_ms - data_frame.timestamp_delivered)
+
+def run_simulator (simulator_arguments: dict, duration_seconds: float, results: multiprocessing.Queue) -> None:
+    '''
+    Runs the simulator in its own process
+    '''
+
+    simulator: OpenEphysSimulator = OpenEphysSimulator(**simulator_arguments)
+    simulator.start()
+    time.sleep(duration_seconds)
+    simulator.stop()
+
+    results.put((simulator.sent_block_count, simulator.dropped_block_count))
+
+def print_latency (label: str, values_ms: list[float]) -> None:
+    if (len(values_ms) == 0):
+        print(f"  {label:<28} no data")
+        return
+
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    print(f"  {label:<28} p50 = {p50:7.2f} ms   p95 = {p95:7.2f} ms   p99 = {p99:7.2f} ms   max = {np.max(values_ms):7.2f} ms")
+
+def main () -> None:
+    parser = argparse.ArgumentParser(description = "Headless end-to-end benchmark of the EMG acquisition pipeline")
+    parser.add_argument("--duration", type = float, default = 10.0, help = "length of the run (seconds)")
+    parser.add_argument("--channels", type = int, default = 2, help = "number of channels to publish and subscribe to")
+    parser.add_argument("--block-size", type = int, default = 64, help = "samples per data block")
+    parser.add_argument("--sample-rate", type = float, default = 5000.0, help = "sample rate (Hz)")
+    parser.add_argument("--jitter-ms", type = float, default = 0.0, help = "maximum random delay added to each block (ms)")
+    parser.add_argument("--drop-probability", type = float, default = 0.0, help = "probability that any given block is dropped")
+    args = parser.parse_args()
+
+    #Start the simulator in its own process (before Qt is initialized in this process)
+    simulator_arguments: dict = {
+        'channel_count': args.channels,
+        'samples_per_block': args.block_size,
+        'sample_rate': args.sample_rate,
+        'jitter_ms': args.jitter_ms,
+        'drop_probability': args.drop_probability,
+        'data_address': f"tcp://*:{BENCHMARK_DATA_PORT}",
+        'event_address': f"tcp://*:{BENCHMARK_EVENT_PORT}"
+    }
+    simulator_results: multiprocessing.Queue = multiprocessing.Queue()
+    simulator_process = multiprocessing.Process(target = run_simulator, args = (simulator_arguments, args.duration + 1.0, simulator_results))
+    simulator_process.start()
+
+    app = QCoreApplication([])
+
+    #Set up the pipeline the same way the main window does, minus the plotting
+    streamer: OpenEphysStreamer = OpenEphysStreamer(
+        subscribed_channels = list(range(0, args.channels)),
+        data_address = f"tcp://localhost:{BENCHMARK_DATA_PORT}",
+        event_address = f"tcp://localhost:{BENCHMARK_EVENT_PORT}")
+    background_worker: BackgroundWorker = BackgroundWorker(streamer)
+    stage: BenchmarkStage = BenchmarkStage()
+    stage_runner: StageRunner = StageRunner(stage)
+
+    def on_data_received (data_frame: OpenEphysDataFrame) -> None:
+        data_frame.timestamp_delivered = time.time() * 1000
+        stage_runner.submit(data_frame)
+
+    background_worker.signals.data_received_signal.connect(on_data_received)
+
+    threadpool: QThreadPool = QThreadPool()
+    threadpool.start(background_worker)
+    threadpool.start(stage_runner)
+
+    #Run the Qt event loop for the duration of the benchmark
+    start_wall_time: float = time.perf_counter()
+    start_cpu_time: float = time.process_time()
+    QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec()
+    elapsed_wall_time: float = time.perf_counter() - start_wall_time
+    elapsed_cpu_time: float = time.process_time() - start_cpu_time
+
+    #Shut the pipeline down
+    background_worker.cancel()
+    stage_runner.cancel()
+    stage_runner.wait()
+    threadpool.waitForDone()
+
+    (sent_block_count, simulator_dropped_block_count) = simulator_results.get()
+    simulator_process.join()
+
+    #Report the results
+    frame_assembler = background_worker.frame_assembler
+    frame_count: int = stage.frame_count
+
+    print(f"Channels = {args.channels}, Block size = {args.block_size}, Sample rate = {args.sample_rate} Hz, Jitter = {args.jitter_ms} ms, Drop probability = {args.drop_probability}")
+    print(f"Frames processed = {frame_count} ({frame_count / elapsed_wall_time:.1f} frames/sec)")
+    print(f"Blocks sent by the simulator = {sent_block_count}, Blocks dropped by the simulator = {simulator_dropped_block_count}")
+    print(f"Frames dropped by the frame assembler = {frame_assembler.dropped_frame_count}, Blocks dropped by the frame assembler = {frame_assembler.dropped_block_count}")
+    print(f"Frames dropped by the stage runner = {stage_runner.dropped_frame_count}")
+    print("Latency:")
+    print_latency("sent -> received", stage.sent_to_received_ms)
+    print_latency("received -> emitted", stage.received_to_emitted_ms)
+    print_latency("emitted -> UI thread", stage.emitted_to_delivered_ms)
+    print_latency("UI thread -> stage processed", stage.delivered_to_processed_ms)
+    if (frame_count > 0):
+        print(f"CPU time = {elapsed_cpu_time:.2f} s ({100 * elapsed_cpu_time / elapsed_wall_time:.1f}% of one core), {1e6 * elapsed_cpu_time / frame_count:.1f} us per frame")
+
+if __name__ == "__main__":
+    main()
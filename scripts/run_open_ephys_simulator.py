@@ -0,0 +1,44 @@
+'''
+Runs the Open Ephys ZMQ simulator on the standard Open Ephys ports, so that the
+application can be run without the Open Ephys GUI or any acquisition hardware.
+
+Usage:
+    python scripts/run_open_ephys_simulator.py [--channels N] [--block-size N] [--sample-rate HZ]
+                                               [--jitter-ms MS] [--drop-probability P]
+'''
+
+import argparse
+import time
+
+from pcms_txbdc.model.open_ephys_simulator import OpenEphysSimulator
+
+def main () -> None:
+    parser = argparse.ArgumentParser(description = "Simulates the Open Ephys ZMQ interface")
+    parser.add_argument("--channels", type = int, default = 2, help = "number of channels to publish")
+    parser.add_argument("--block-size", type = int, default = 64, help = "samples per data block")
+    parser.add_argument("--sample-rate", type = float, default = 5000.0, help = "sample rate (Hz)")
+    parser.add_argument("--jitter-ms", type = float, default = 0.0, help = "maximum random delay added to each block (ms)")
+    parser.add_argument("--drop-probability", type = float, default = 0.0, help = "probability that any given block is dropped")
+    args = parser.parse_args()
+
+    simulator: OpenEphysSimulator = OpenEphysSimulator(
+        channel_count = args.channels,
+        samples_per_block = args.block_size,
+        sample_rate = args.sample_rate,
+        jitter_ms = args.jitter_ms,
+        drop_probability = args.drop_probability)
+
+    print(f"Publishing {args.channels} channels at {args.sample_rate} Hz ({args.block_size} samples per block). Press Ctrl+C to stop.")
+    simulator.start()
+
+    try:
+        while True:
+            time.sleep(1)
+            print(f"Blocks sent = {simulator.sent_block_count}, Blocks dropped = {simulator.dropped_block_count}, Events sent = {simulator.sent_event_count}, Requests answered = {simulator.received_request_count}")
+    except KeyboardInterrupt:
+        pass
+
+    simulator.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import serial
 import socket
+import threading
+import queue
+import time
+from typing import Callable
+from concurrent.futures import Future
 from dataclasses import dataclass
 from serial.tools.list_ports_common import ListPortInfo
 
@@ -42,6 +47,31 @@ This class interfaces with the A-M Systems 4100 Instrumentation Amplifier.
 '''
 class AmSystems4100:
 
+    #region Constants
+
+    #The range of values (inclusive) accepted for each menu item that has a setter method.
+    #Event items are listed under CONSTANTS.MENU.EVENT, and apply to this library's event menu.
+    #These are the same limits that the individual setter methods enforce.
+    MENU_ITEM_RANGES: dict[tuple[int, int], tuple[int, int]] = {
+        (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MODE): (0, 5),
+        (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.AUTO): (0, 2),
+        (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DELAY): (0, 9_360_000_000),
+        (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DURATION): (2, 9_360_000_000),
+        (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.PERIOD): (2, 9_360_000_000),
+        (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.QUANTITY): (1, 100),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.TYPE): (0, 3),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.DELAY): (0, 9_360_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.QUANTITY): (0, 99_999),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.PERIOD): (2, 9_360_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.DUR_1): (1, 9_360_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.AMP_1): (0, 200_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.DUR_2): (0, 9_360_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.AMP_2): (0, 200_000_000),
+        (CONSTANTS.MENU.EVENT, CONSTANTS.EVENT.DUR_3): (0, 9_360_000_000),
+    }
+
+    #endregion
+
     #region Constructor
 
     def __init__(self, connection_info: AmSystems4100_ConnectionInfo):
@@ -52,12 +82,36 @@ class AmSystems4100:
         #Store the pin from the connection information
         self._am4100_pin: int = connection_info.pin
 
+        #An optional callback that is called (on the I/O thread) each time a command or burst of
+        #commands has been acknowledged by the device. It is passed the command(s) and the round-trip
+        #time in seconds. This is used for latency measurements.
+        self.on_command_completed: Callable[[str | list[str], float], None] = None
+
         if (isinstance(connection_info, AmSystems4100_SerialConnectionInfo)):
             #Initialize the connection with the A-M systems stimulator
             self._initialize_serial_connection(connection_info)
         elif (isinstance(connection_info, AmSystems4100_TcpConnectionInfo)):
             self._initialize_tcpip_connection(connection_info)
 
+        #This is a local mirror of the device's menu. It holds the last known value of
+        #each (menu number, item number) pair, so that redundant writes can be skipped.
+        self._menu_state: dict[tuple[int, int], int] = {}
+        self._menu_state_lock: threading.Lock = threading.Lock()
+
+        #This holds the items that have been written since the most recent resync was
+        #queued. The resync will not overwrite the mirrored values of these items.
+        self._menu_items_written_since_resync: set[tuple[int, int]] = set()
+
+        #All communication with the device happens on a dedicated I/O thread, so that
+        #callers (such as the UI thread) are never blocked waiting for a reply.
+        #Commands are executed in the order in which they are queued.
+        self._command_queue: queue.Queue = queue.Queue()
+        self._io_thread: threading.Thread = threading.Thread(target = self._run_io_thread, name = "AmSystems4100 I/O", daemon = True)
+        self._io_thread.start()
+
+        #Populate the local mirror of the device's menu
+        self.resync()
+
         pass
 
     #endregion
@@ -125,6 +179,28 @@ class AmSystems4100:
 
         return result
 
+    def _serial_send_commands_and_read_responses (self, commands: list[str]) -> list[list[str]]:
+
+        results: list[list[str]] = []
+
+        self._clear_serial_buffers()
+
+        if (self._serial_port is not None):
+            try:
+                #Send all of the commands in a single write
+                encoded_commands: bytes = "".join(commands).encode()
+                self._serial_port.write(encoded_commands)
+
+                #Read one response for each command that was sent
+                for i in range(0, len(commands)):
+                    response: bytes = self._serial_port.read_until(b'*\r\n')
+                    results.append(response.decode().strip().split("\r\n"))
+
+            except serial.SerialException as e:
+                print(f"Error sending commands or reading responses: {e}")
+
+        return results
+
     #endregion
 
     #region TcpIp communication
@@ -163,10 +239,6 @@ class AmSystems4100:
 
         if (self._sock is not None):
             try:
-                #DEBUGGING OUTPUT
-                print(f"Command: {command}")
-                #END OF DEBUGGING OUTPUT
-
                 #Encode the command
                 encoded_command: bytes = command.encode()
 
@@ -182,18 +254,90 @@ class AmSystems4100:
                 #Split the result using "\r" and "\n" as delimiters
                 result = decoded_response.split("\r\n")
 
-                #DEBUGGING OUTPUT
-                print(f"Response received: ")
-                for i in range(0, len(result)):
-                    print(result[i])
-                print("")
-                #END OF DEBUGGING OUTPUT
-
             except serial.SerialException as e:
                 print(f"Error sending command or reading response: {e}")
 
         return result
 
+    def _tcpip_send_commands_and_read_responses (self, commands: list[str]) -> list[list[str]]:
+
+        results: list[list[str]] = []
+
+        if (self._sock is not None):
+            #Send all of the commands in a single write
+            encoded_commands: bytes = "".join(commands).encode()
+            self._sock.sendall(encoded_commands)
+
+            #Read one response for each command that was sent
+            for i in range(0, len(commands)):
+                response: bytes = self._socket_buffer.read_until(b'*')
+                results.append(response.decode().strip().split("\r\n"))
+
+        return results
+
+    #endregion
+
+    #region I/O thread
+
+    def _run_io_thread (self) -> None:
+        '''
+        This is the code executed by the I/O thread. It sends each queued command
+        to the device and resolves the command's future with the device's response.
+        '''
+
+        while (True):
+            #Wait for the next command
+            item: tuple[Future, str | list[str]] = self._command_queue.get()
+
+            #A value of None tells the thread to exit
+            if (item is None):
+                break
+
+            (future, command) = item
+
+            #Skip commands that were cancelled while they were waiting in the queue
+            if (not future.set_running_or_notify_cancel()):
+                continue
+
+            #A command of None is only used to wait for the commands queued before it
+            if (command is None):
+                future.set_result([])
+                continue
+
+            try:
+                start_time: float = time.perf_counter()
+                if (isinstance(command, list)):
+                    response = self._send_commands_and_read_responses(command)
+                else:
+                    response = self._send_command_and_read_response(command)
+                elapsed_time: float = time.perf_counter() - start_time
+
+                #Report the round-trip time before resolving the future
+                if (self.on_command_completed is not None):
+                    try:
+                        self.on_command_completed(command, elapsed_time)
+                    except Exception as e:
+                        print(f"Error in command completed callback: {e}")
+
+                future.set_result(response)
+            except Exception as e:
+                print(f"Error sending command or reading response: {e}")
+                future.set_exception(e)
+
+    def _queue_command (self, command: str | list[str]) -> Future:
+        '''
+        Queues a command to be sent to the device by the I/O thread. Returns a future
+        that will hold the device's response once it has been received.
+
+        If a list of commands is passed, the commands are sent to the device in a single
+        burst, and the future holds the list of responses once every command has been
+        acknowledged.
+        '''
+
+        future: Future = Future()
+        self._command_queue.put((future, command))
+        return future
+
     #endregion
 
     #region Communication-type agnostic methods
@@ -209,22 +353,140 @@ class AmSystems4100:
 
         return []
 
+    def _send_commands_and_read_responses (self, commands: list[str]) -> list[list[str]]:
+
+        if (hasattr(self, "_serial_port")):
+            if (self._serial_port is not None):
+                return self._serial_send_commands_and_read_responses(commands)
+        elif (hasattr(self, "_sock")):
+            if (self._sock is not None):
+                return self._tcpip_send_commands_and_read_responses(commands)
+
+        return []
+
     def _send_get_command (self, preliminary_command: str) -> list[str]:
+        '''
+        Sends a "get" command and waits for the response. Any commands that were
+        queued before this one are sent first.
+        '''
 
         command: str = "get " + preliminary_command + "\r"
         
-        return self._send_command_and_read_response(command)
+        return self._queue_command(command).result()
+
+    def _send_set_command (self, preliminary_command: str) -> Future:
+        '''
+        Queues a "set" command and returns immediately. The returned future can
+        be used to wait for the device's acknowledgement.
+        '''
+
+        return self._queue_command(self._format_set_command(preliminary_command))
+
+    def _completed_future (self) -> Future:
+        '''
+        Returns a future that has already completed. This is used when there is
+        no need to send anything to the device.
+        '''
+
+        future: Future = Future()
+        future.set_result([])
+        return future
+
+    def _format_set_command (self, preliminary_command: str) -> str:
 
-    def _send_set_command (self, preliminary_command: str) -> list[str]:
+        return str(self._am4100_pin) + " set " + preliminary_command + "\r"
 
-        command: str = str(self._am4100_pin) + " set " + preliminary_command + "\r"
+    def _forget_menu_items_if_not_acknowledged (self, future: Future, keys: list[tuple[int, int]], burst_offset: int = None) -> None:
+        '''
+        Removes menu items from the local mirror of the device's menu if the commands that
+        set them fail or are not acknowledged. The next write of those items is then always
+        sent to the device.
+
+        If burst_offset is None, the future holds the response to a single command that set
+        the one item in keys. Otherwise, the future holds the list of responses to a burst of
+        commands, and keys[i] was set by the command whose response is at burst_offset + i.
+        '''
+
+        def _on_command_complete (completed_future: Future) -> None:
+            failed_keys: list[tuple[int, int]] = keys
+            if (not completed_future.cancelled()) and (completed_future.exception() is None):
+                responses: list[list[str]] = [completed_future.result()]
+                offset: int = 0
+                if (burst_offset is not None):
+                    responses = completed_future.result()
+                    offset = burst_offset
+
+                failed_keys = [
+                    key for (i, key) in enumerate(keys)
+                    if ((offset + i) >= len(responses)) or (not self.is_acknowledgement(responses[offset + i]))
+                ]
+
+            if (len(failed_keys) > 0):
+                with self._menu_state_lock:
+                    for key in failed_keys:
+                        self._menu_state.pop(key, None)
 
-        return self._send_command_and_read_response(command)
+        future.add_done_callback(_on_command_complete)
+
+    def is_acknowledgement (self, response: list[str]) -> bool:
+        '''
+        Returns True if a response contains at least one non-empty line from the device.
+        A read that timed out decodes to [''] (or to nothing at all), which is not an acknowledgement.
+        '''
+
+        if (response is None):
+            return False
+
+        return any(len(line.strip(" *")) > 0 for line in response)
+
+    def _validate_menu_item_value (self, menu_number: int, item_number: int, item_value: int) -> None:
+        '''
+        Raises a ValueError if the value is not accepted by the setter method for the menu item.
+        Items that do not have a setter method are only checked to be numbers.
+        '''
+
+        if (isinstance(item_value, bool)) or (not isinstance(item_value, (int, float))):
+            raise ValueError(f"Menu {menu_number} item {item_number}: {item_value!r} is not a number")
+
+        #The ranges of event items are listed under the generic event menu number
+        if (menu_number == self.event_menu_number):
+            menu_number = CONSTANTS.MENU.EVENT
+
+        item_range: tuple[int, int] = AmSystems4100.MENU_ITEM_RANGES.get((menu_number, item_number))
+        if (item_range is not None):
+            (minimum, maximum) = item_range
+            if (item_value < minimum) or (item_value > maximum):
+                raise ValueError(f"Menu {menu_number} item {item_number}: {item_value} is outside of the range {minimum} to {maximum}")
 
     #endregion
 
     #region Public methods
 
+    def wait_for_pending_commands (self) -> None:
+        '''
+        Blocks until every command that has been queued so far has been sent
+        to the device and acknowledged.
+        '''
+
+        self._queue_command(None).result()
+
+    def close (self) -> None:
+        '''
+        Stops the I/O thread and closes the connection to the device.
+        '''
+
+        #Tell the I/O thread to exit once it has sent any commands that are already queued
+        self._command_queue.put(None)
+        self._io_thread.join(timeout = 10)
+
+        #Close the connection
+        if (hasattr(self, "_serial_port")) and (self._serial_port is not None):
+            self._serial_port.close()
+            self._serial_port = None
+        elif (hasattr(self, "_sock")) and (self._sock is not None):
+            self._sock.close()
+            self._sock = None
+
     def get_firmware_revision (self) -> str:
         '''
         Returns the firmware revision
@@ -278,6 +540,94 @@ class AmSystems4100:
 
         return 0    
     
+    def resync (self) -> Future:
+        '''
+        Reads the value of every known menu item from the device in a single burst,
+        and stores the values in the local mirror of the device's menu. This should
+        be called whenever the menu may have been changed from the front panel.
+        The returned future completes once the mirror has been updated.
+        '''
+
+        #Build the list of items to read
+        event_menu: int = self.event_menu_number
+        keys: list[tuple[int, int]] = [
+            (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MODE),
+            (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MONITOR),
+            (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.TRIGGER),
+            (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.AUTO),
+            (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.ISO_OUTPUT),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.TYPE),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DELAY),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DURATION),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.PERIOD),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.QUANTITY),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.OFFSET_OR_HOLD),
+            (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.LEVEL),
+            (event_menu, CONSTANTS.EVENT.TYPE),
+            (event_menu, CONSTANTS.EVENT.DELAY),
+            (event_menu, CONSTANTS.EVENT.QUANTITY),
+            (event_menu, CONSTANTS.EVENT.PERIOD),
+            (event_menu, CONSTANTS.EVENT.DUR_1),
+            (event_menu, CONSTANTS.EVENT.DUR_2),
+            (event_menu, CONSTANTS.EVENT.DUR_3),
+            (event_menu, CONSTANTS.EVENT.AMP_1),
+            (event_menu, CONSTANTS.EVENT.AMP_2),
+        ]
+
+        with self._menu_state_lock:
+            self._menu_items_written_since_resync.clear()
+
+        def _on_resync_complete (future: Future) -> None:
+            if (future.exception() is not None):
+                return
+
+            with self._menu_state_lock:
+                for (key, result) in zip(keys, future.result()):
+                    #Do not overwrite items that were written after the resync was queued,
+                    #because those writes reach the device after the values were read.
+                    if (key in self._menu_items_written_since_resync):
+                        continue
+
+                    if (len(result) > 1):
+                        try:
+                            self._menu_state[key] = int(result[1])
+                        except ValueError:
+                            self._menu_state.pop(key, None)
+                    else:
+                        #The device did not report a value, so the mirror cannot be trusted for this item
+                        self._menu_state.pop(key, None)
+
+        #Queue all of the "get" commands as a single burst
+        commands: list[str] = [f"get menu {menu_number} {item_number}\r" for (menu_number, item_number) in keys]
+        future: Future = self._queue_command(commands)
+        future.add_done_callback(_on_resync_complete)
+
+        return future
+
+    def is_front_panel_changed (self) -> bool:
+        '''
+        Returns True if the device reports that its settings have been changed from
+        the front panel (bit 0 of the second character of the "condition" response).
+        '''
+
+        condition: str = self.get_condition()
+        if (len(condition) > 1):
+            return (ord(condition[1]) & 0x01) != 0
+
+        return False
+
+    def resync_if_front_panel_changed (self) -> bool:
+        '''
+        Resyncs the local mirror of the device's menu if the front panel has been changed.
+        Returns True if a resync was performed.
+        '''
+
+        if (self.is_front_panel_changed()):
+            self.resync().result()
+            return True
+
+        return False
+
     def get_condition (self) -> str:
         '''
         Returns two characters representing several instrument internal switches.
@@ -311,7 +661,7 @@ class AmSystems4100:
         
         return ""
     
-    def set_active (self, run: bool) -> None:
+    def set_active (self, run: bool) -> Future:
         '''
         Either starts or stops the generation of pulses
         '''
@@ -321,27 +671,81 @@ class AmSystems4100:
             parameter = "stop"
         command: str = f"active {parameter}"
 
-        self._send_set_command(command)
+        return self._send_set_command(command)
     
-    def set_network (self, ip_address: str, mask: str, gateway: str) -> None:
+    def set_network (self, ip_address: str, mask: str, gateway: str) -> Future:
         '''
         Sets the IP address, mask, and gateway
         '''
         
         command: str = f"network {ip_address} {mask} {gateway}"
-        self._send_set_command(command)
+        return self._send_set_command(command)
 
-    def set_menu (self, menu_number: int, item_number: int, item_value: int) -> None:
+    def set_menu (self, menu_number: int, item_number: int, item_value: int) -> Future:
         '''
         Sets the value of the item in the menu to the specified value.
         The value is a 64-bit signed integer in uV, uA, or microseconds.
         Microseconds have only positive values.
         '''
 
+        with self._menu_state_lock:
+            #If the device already has this value, there is nothing to do
+            key: tuple[int, int] = (menu_number, item_number)
+            if (self._menu_state.get(key) == item_value):
+                return self._completed_future()
+
+            self._menu_state[key] = item_value
+            self._menu_items_written_since_resync.add(key)
+
         command: str = f"menu {menu_number} {item_number} {item_value}"
-        self._send_set_command(command)
+        future: Future = self._send_set_command(command)
+        self._forget_menu_items_if_not_acknowledged(future, [key])
+
+        return future
+
+    def apply_menu_preset (self, preset: dict[tuple[int, int], int]) -> Future:
+        '''
+        Sets a group of menu items at once. The preset maps (menu number, item number)
+        pairs to the desired value of each item.
+
+        Only the items whose value differs from the last value written to the device
+        are sent. Any active stimulation is stopped, and then the changed items are sent
+        to the device in a single burst. The returned future completes once the device
+        has acknowledged every command in the burst.
+
+        Every value is checked against the same limits as the individual setter methods
+        (see MENU_ITEM_RANGES) before anything is queued. If any value is out of range,
+        a ValueError is raised and none of the items are sent.
+        '''
+
+        #Check every value before anything is queued
+        for ((menu_number, item_number), item_value) in preset.items():
+            self._validate_menu_item_value(menu_number, item_number, item_value)
+
+        #Determine which items have changed
+        with self._menu_state_lock:
+            changed_items: dict[tuple[int, int], int] = {
+                key: value for (key, value) in preset.items() if (self._menu_state.get(key) != value)
+            }
+            self._menu_state.update(changed_items)
+            self._menu_items_written_since_resync.update(changed_items.keys())
+
+        #If nothing has changed, there is nothing to send to the device
+        if (len(changed_items) == 0):
+            return self._completed_future()
+
+        #Stop any active stimulation, and then set each of the changed items
+        commands: list[str] = [self._format_set_command("active stop")]
+        for ((menu_number, item_number), item_value) in changed_items.items():
+            commands.append(self._format_set_command(f"menu {menu_number} {item_number} {item_value}"))
+
+        #The first response in the burst belongs to the "active stop" command
+        future: Future = self._queue_command(commands)
+        self._forget_menu_items_if_not_acknowledged(future, list(changed_items.keys()), burst_offset = 1)
+
+        return future
     
-    def set_trigger (self, trigger_type: str) -> None:
+    def set_trigger (self, trigger_type: str) -> Future:
         '''
         Generates an output trigger.
 
@@ -351,9 +755,9 @@ class AmSystems4100:
         '''
 
         command: str = f"trigger {trigger_type}"
-        self._send_set_command(command)
+        return self._send_set_command(command)
     
-    def set_relay (self, open: bool) -> None:
+    def set_relay (self, open: bool) -> Future:
         '''
         Opens or closes the relay on the output of the instrument
         '''
@@ -363,12 +767,36 @@ class AmSystems4100:
             relay_open = "close"
 
         command: str = f"relay {relay_open}"
-        self._send_set_command(command)
+        return self._send_set_command(command)
 
     #endregion
 
     #region Higher level public methods
 
+    def _set_menu_item_if_changed (self, menu_number: int, item_number: int, item_value: int) -> None:
+        '''
+        Sets the value of a menu item, but only if it differs from the last known value
+        of that item. Any stimulation train that is currently active is stopped first.
+        '''
+
+        with self._menu_state_lock:
+            if (self._menu_state.get((menu_number, item_number)) == item_value):
+                return
+
+        #Stop any stimulation train that is currently active
+        self.set_active(False)
+
+        #Set the parameter
+        self.set_menu(menu_number, item_number, item_value)
+
+    @property
+    def event_menu_number (self) -> int:
+        '''
+        The menu number that holds the event parameters for this library
+        '''
+
+        return CONSTANTS.MENU.EVENT + (self._lib_id - 1)
+
     def set_train_delay (self, train_delay: int) -> None:
         '''
         Sets the duration from trigger input until the onset of the first pulse in the train.
@@ -379,11 +807,8 @@ class AmSystems4100:
         if (train_delay < 0) or (train_delay > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the train delay value
-        self.set_menu(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DELAY, train_delay)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DELAY, train_delay)
 
         pass
 
@@ -398,11 +823,8 @@ class AmSystems4100:
         if (train_duration < 2) or (train_duration > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the train duration parameter
-        self.set_menu(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DURATION, train_duration)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DURATION, train_duration)
 
         pass
 
@@ -416,11 +838,8 @@ class AmSystems4100:
         if (train_period < 2) or (train_period > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the train period parameter
-        self.set_menu(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.PERIOD, train_period)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.PERIOD, train_period)
 
         pass
 
@@ -434,11 +853,8 @@ class AmSystems4100:
         if (train_quantity < 1) or (train_quantity > 100):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the train quantity parameter
-        self.set_menu(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.QUANTITY, train_quantity)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.QUANTITY, train_quantity)
 
         pass
 
@@ -463,11 +879,8 @@ class AmSystems4100:
         if (auto_type < 0) or (auto_type > 2):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the auto parameter
-        self.set_menu(CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.AUTO, auto_type)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.AUTO, auto_type)
 
         pass
     
@@ -492,11 +905,8 @@ class AmSystems4100:
         if (mode < 0) or (mode > 5):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the mode
-        self.set_menu(CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MODE, mode)
+        self._set_menu_item_if_changed(CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MODE, mode)
 
         pass
 
@@ -516,12 +926,9 @@ class AmSystems4100:
         if (event_period < 2) or (event_period > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.PERIOD, event_period)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.PERIOD, event_period)
 
         pass
 
@@ -536,12 +943,9 @@ class AmSystems4100:
         if (event_quantity < 0) or (event_quantity > 99_999):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.QUANTITY, event_quantity)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.QUANTITY, event_quantity)
 
         pass
 
@@ -561,12 +965,9 @@ class AmSystems4100:
         if (event_type < 0) or (event_type > 3):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the event type
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.TYPE, event_type)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.TYPE, event_type)
 
         pass
 
@@ -585,12 +986,9 @@ class AmSystems4100:
         if (event_duration < 1) or (event_duration > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the event_duration1 parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.DUR_1, event_duration)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.DUR_1, event_duration)
 
         pass
 
@@ -609,12 +1007,9 @@ class AmSystems4100:
         if (event_amplitude < 0) or (event_amplitude > 200_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)        
-
         #Set the event_amplitude1 parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.AMP_1, event_amplitude)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.AMP_1, event_amplitude)
 
         pass
 
@@ -629,12 +1024,9 @@ class AmSystems4100:
         if (event_duration < 0) or (event_duration > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the event_duration1 parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.DUR_2, event_duration)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.DUR_2, event_duration)
 
         pass
 
@@ -650,12 +1042,9 @@ class AmSystems4100:
         if (event_amplitude < 0) or (event_amplitude > 200_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)        
-
         #Set the event_amplitude1 parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.AMP_2, event_amplitude)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.AMP_2, event_amplitude)
 
         pass
 
@@ -673,12 +1062,9 @@ class AmSystems4100:
         if (event_duration < 0) or (event_duration > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the event_duration1 parameter
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.DUR_3, event_duration)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.DUR_3, event_duration)
 
         pass
 
@@ -694,12 +1080,9 @@ class AmSystems4100:
         if (event_delay < 0) or (event_delay > 9_360_000_000):
             return
         
-        #Stop any stimulation train that is currently active
-        self.set_active(False)
-
         #Set the event delay
         menu_number: int = CONSTANTS.MENU.EVENT + (self._lib_id - 1)
-        self.set_menu(menu_number, CONSTANTS.EVENT.DELAY, event_delay)
+        self._set_menu_item_if_changed(menu_number, CONSTANTS.EVENT.DELAY, event_delay)
 
         pass
 
@@ -785,12 +1168,15 @@ class AmSystems4100:
 
         pass
 
-    def trigger_single (self) -> None:
-        self.set_trigger("one")
-        pass
+    def trigger_single (self) -> Future:
+        '''
+        Queues a single trigger and returns immediately. The returned future
+        completes when the device acknowledges the trigger.
+        '''
 
-    def trigger_free_run (self) -> None:
-        self.set_trigger("free-run")
-        pass
+        return self.set_trigger("one")
+
+    def trigger_free_run (self) -> Future:
+        return self.set_trigger("free-run")
 
     #endregion
\ No newline at end of file
@@ -4,6 +4,10 @@ import time
 
 from am_systems_4100.am_systems_4100 import AmSystems4100
 from am_systems_4100.am_systems_4100 import AmSystems4100_SerialConnectionInfo, AmSystems4100_TcpConnectionInfo
+from am_systems_4100.am_systems_4100_comm_constants import CONSTANTS
+
+from .latency_metrics import LatencyMetrics
+from .open_ephys_streamer import OpenEphysStreamer, STIMULUS_EVENT_CHANNEL
 #from .stimjim import StimJim, PulseTrain, PulseStage, StimJimOutputModes, STIMJIM_SERIAL_BAUDRATE
 
 class ApplicationConfiguration:
@@ -17,6 +21,9 @@ class ApplicationConfiguration:
     # AM Systems 4100 stimulator object
     stimulator: list[AmSystems4100] = []
 
+    # The Open Ephys streamer that is receiving data. Stimulus events are sent to Open Ephys through it.
+    open_ephys_streamer: OpenEphysStreamer = None
+
     #region Methods
 
     @staticmethod
@@ -34,14 +41,29 @@ class ApplicationConfiguration:
 
         #Connect to the stimulator
         new_am4100 = AmSystems4100(connection_info)
+        new_am4100.on_command_completed = ApplicationConfiguration._on_stimulator_command_completed
         ApplicationConfiguration.stimulator.append(new_am4100)
 
+    @staticmethod
+    def _on_stimulator_command_completed (command: str | list[str], elapsed_seconds: float) -> None:
+        #Record the round-trip time of each command (or burst of commands) sent to a stimulator
+        LatencyMetrics.record(LatencyMetrics.STIMULATOR, elapsed_seconds)
+
+    @staticmethod
+    def send_stimulus_event (sample_num: int, event_channel: int = STIMULUS_EVENT_CHANNEL) -> None:
+        '''
+        Sends a TTL event to Open Ephys to mark the sample number at which a stimulus was issued
+        '''
+
+        if (ApplicationConfiguration.open_ephys_streamer is not None):
+            ApplicationConfiguration.open_ephys_streamer.queue_event(sample_num, event_channel)
+
     @staticmethod
     def disconnect_from_am_systems_4100 () -> None:
         if (ApplicationConfiguration.stimulator is not None):
             try:
                 for stim in ApplicationConfiguration.stimulator:
-                    ApplicationConfiguration.stimulator[stim]._sock.close()
+                    stim.close()
                 ApplicationConfiguration.stimulator = None
             except:
                 pass
@@ -118,50 +140,61 @@ class ApplicationConfiguration:
 
         if index < len(ApplicationConfiguration.stimulator):
             stim: AmSystems4100 = ApplicationConfiguration.stimulator[index]
+            event_menu: int = stim.event_menu_number
 
-            #Stop any active stimulation
-            stim.set_active(False)
+            #Build the desired state of the stimulator's menu items. The stimulator
+            #stops any active stimulation and then only uploads the items that have
+            #changed since they were last set, all in a single burst of commands.
+            preset: dict[tuple[int, int], int] = {
+                #Tell the unit to produce "current" pulses (not "voltage" pulses).
+                (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.MODE): 1,
 
-            #Tell the unit to produce "current" pulses (not "voltage" pulses).
-            stim.set_mode(1)
+                #Tell the stimulator unit that we will provide a specific number
+                #of pulses for it to generate
+                (CONSTANTS.MENU.GENERAL, CONSTANTS.GENERAL.AUTO): 1,
 
-            #Tell the stimulator unit that we will provide a specific number
-            #of pulses for it to generate
-            stim.set_auto(1)
+                #Tell the stimulator unit that there will be 0 delay between the trigger
+                #and the onset of the stimulation train.
+                (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.DELAY): 0,
 
-            #Tell the stimulator unit that there will be 0 delay between the trigger
-            #and the onset of the stimulation train.
-            stim.set_train_delay(0)
+                #Tell the stimulator unit that we will produce 1 stimulation train.
+                (CONSTANTS.MENU.TRAIN, CONSTANTS.TRAIN.QUANTITY): 1,
 
-            #Tell the stimulator unit that we will produce 1 stimulation train.
-            stim.set_train_quantity(1)
+                #Tell the stimulator unit that there will be 0 delay between the onset
+                #of the stimulation train and the first event within the train.
+                (event_menu, CONSTANTS.EVENT.DELAY): 0,
 
-            #Tell the stimulator unit that there will be 0 delay between the onset
-            #of the stimulation train and the first event within the train.
-            stim.set_event_delay(0)
+                #Tell the stimulator unit that we want to use biphasic pulses.
+                (event_menu, CONSTANTS.EVENT.TYPE): 1,
 
-            #Tell the stimulator unit that we want to use biphasic pulses.
-            stim.set_event_type(1)
+                #Tell the stimulator unit that we will deliver exactly 1 pulse.
+                (event_menu, CONSTANTS.EVENT.QUANTITY): 1,
 
-            #Tell the stimulator unit that we will deliver exactly 1 pulse.
-            stim.set_event_quantity(1)
+                #Tell the stimulator unit that each phase of the biphasic pulse will be 500 uS
+                #in duration.
+                (event_menu, CONSTANTS.EVENT.DUR_1): 500,
 
-            #Tell the stimulator unit that each phase of the biphasic pulse will be 500 uS
-            #in duration.
-            stim.set_event_duration1(500)
+                #Tell the stimulator unit the amplitude of each phase of the biphasic pulse.
+                (event_menu, CONSTANTS.EVENT.AMP_1): amplitude_ma,
 
-            #Tell the stimulator unit that each phase of the biphasic pulse will be 0.8 mA
-            #in amplitude.
-            stim.set_event_amplitude1(amplitude_ma)
+                #Biphasic pulses do not use "duration2" and "amplitude2", so we will set them
+                #to a value of 0.
+                (event_menu, CONSTANTS.EVENT.DUR_2): 0,
+                (event_menu, CONSTANTS.EVENT.AMP_2): 0,
 
-            #Biphasic pulses do not use "duration2" and "amplitude2", so we will set them
-            #to a value of 0.
-            stim.set_event_duration2(0)
-            stim.set_event_amplitude2(0)
+                #Tell the stimulator unit that there is 0 uS interval between the two phases
+                #of the biphasic pulse.
+                (event_menu, CONSTANTS.EVENT.DUR_3): 0,
+            }
 
-            #Tell the stimulator unit that there is 0 uS interval between the two phases
-            #of the biphasic pulse.
-            stim.set_event_duration3(0)
+            #If the settings were changed from the stimulator's front panel, re-read them first,
+            #so that the preset does not skip items the device no longer has
+            stim.resync_if_front_panel_changed()
+
+            try:
+                stim.apply_menu_preset(preset)
+            except ValueError as e:
+                print(f"Stimulus parameters were not set: {e}")
 
         else:
             print("index out of range")
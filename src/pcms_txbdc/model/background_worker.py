@@ -3,12 +3,13 @@ from PySide6.QtCore import QRunnable, Slot, Signal, QObject
 import numpy as np
 import time
 import math
-import bisect
 
 from .open_ephys_streamer import OpenEphysStreamer
 from .open_ephys_streamer import OpenEphysDataBlock
 from .open_ephys_streamer import OpenEphysDataFrame
-from .open_ephys_streamer import OPEN_EPHYS_EXPECTED_CHANNEL_COUNT
+from .emg_data_filter import EmgDataFilter
+from .frame_assembler import FrameAssembler
+from .latency_metrics import LatencyMetrics
 
 class BackgroundWorkerSignals (QObject):
 
@@ -25,16 +26,33 @@ class BackgroundWorker (QRunnable):
 
     #region Constructor
 
-    def __init__(self):
+    def __init__(self, open_ephys_streamer: OpenEphysStreamer = None):
         super().__init__()
 
         #Public signals
         self.signals = BackgroundWorkerSignals()
 
         #Private members
-        self._open_ephys_streamer = OpenEphysStreamer()
+        if (open_ephys_streamer is None):
+            open_ephys_streamer = OpenEphysStreamer()
+        self._open_ephys_streamer = open_ephys_streamer
         self._should_cancel = False
 
+        #The EMG filter bank is created once the sample rate of the incoming data is known
+        self._emg_filter: EmgDataFilter = None
+
+        #The frame assembler groups the blocks from all subscribed channels by sample number.
+        #Its counters can be read from other threads to see how often data is lost.
+        self.frame_assembler: FrameAssembler = FrameAssembler(self._open_ephys_streamer.subscribed_channels)
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def open_ephys_streamer (self) -> OpenEphysStreamer:
+        return self._open_ephys_streamer
+
     #endregion
 
     #region Methods
@@ -51,37 +69,39 @@ class BackgroundWorker (QRunnable):
         #Initialize the open ephys streamer
         self._open_ephys_streamer.initialize()
 
-        #Create a variable to hold a "frame" of data
-        df: OpenEphysDataFrame = None
-
         #Iterate until the "should cancel" is set to True
         while (not self._should_cancel):
 
-            #Process any messages to/from OpenEphys
-            result: OpenEphysDataBlock =  self._open_ephys_streamer.callback()
-
-            #Check to see if any data was received
-            if (result is not None) and (result.data is not None):
-                
-                #Check if a new dataframe should be created
-                if (df is None):# or ((df is not None) and (result.timestamp != df.timestamp)):
-                    df = OpenEphysDataFrame(result.timestamp, result.sample_id, [], 0)
-                
-                #Insert this data block into the dataframe's list of blocks
-                #We maintain the list of blocks IN ORDER of index, so we INSERT IN ORDER
-                #For this reason, we use bisect.insort rather than list.append
-                #(The data blocks SHOULD come into our app already "in order", but it's not guaranteed, so 
-                #it's useful to do this just to make sure)
-                bisect.insort(df.channel_data_blocks, result, key=lambda x: x.channel_index)
-
-                #Check if it is time to emit
-                if (len(df.channel_data_blocks) >= OPEN_EPHYS_EXPECTED_CHANNEL_COUNT):
-                    #Emit the data
-                    df.timestamp_emitted = int(math.floor(time.time() * 1000))
-                    self.signals.data_received_signal.emit(df)
-
-                    #Set the dataframe to None
-                    df = None
+            #Wait for messages from OpenEphys, and receive all of the data blocks that are waiting
+            blocks: list[OpenEphysDataBlock] = self._open_ephys_streamer.receive_data_blocks()
+
+            #Pass the received data to the frame assembler, and collect any frames that are now complete
+            assemble_start_time: float = time.perf_counter()
+            frames: list[OpenEphysDataFrame] = []
+            for block in blocks:
+                frames.extend(self.frame_assembler.add_block(block))
+            frames.extend(self.frame_assembler.flush_expired())
+            if (len(blocks) > 0):
+                LatencyMetrics.record(LatencyMetrics.ASSEMBLE, time.perf_counter() - assemble_start_time)
+
+            #Attach any events that were received from Open Ephys to the first frame that is emitted
+            if (len(frames) > 0):
+                frames[0].events = self._open_ephys_streamer.take_received_events()
+
+            for df in frames:
+                #Calculate the differential, filtered, and absolute-valued data on this
+                #thread, so that the UI thread receives data that is ready to plot
+                sample_rate: float = df.channel_data_blocks[0].sample_rate
+                if ((self._emg_filter is None) or 
+                    (self._emg_filter.sample_rate != sample_rate) or 
+                    (self._emg_filter.channel_count != df.derivation_count)):
+                    self._emg_filter = EmgDataFilter(channel_count = df.derivation_count, sample_rate = sample_rate)
+                with LatencyMetrics.timer(LatencyMetrics.FILTER):
+                    df.calculate_fields(self._emg_filter)
+
+                #Emit the data
+                df.timestamp_emitted = int(math.floor(time.time() * 1000))
+                self.signals.data_received_signal.emit(df)
 
         return
 
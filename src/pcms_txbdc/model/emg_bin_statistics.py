@@ -0,0 +1,103 @@
+import numpy as np
+
+from .emg_ring_buffer import EmgRingBuffer
+
+class EmgBinStatistics:
+    '''
+    Tracks a sliding window of (absolute-valued) EMG samples that is divided into
+    equally-sized bins, as used during the trial-initiation phase of a stage.
+
+    The grand mean of the bins is the mean of the whole window, so it is maintained
+    as a running sum that is updated in O(new samples) each time data is appended.
+    The individual bin means are only calculated (in a single vectorized operation)
+    when they are requested, which is typically once per trial.
+    '''
+
+    #region Constructor
+
+    def __init__(self, bin_count: int, bin_sample_count: int):
+
+        #Store the dimensions of the window
+        self.bin_count: int = bin_count
+        self.bin_sample_count: int = bin_sample_count
+        self.sample_count: int = bin_count * bin_sample_count
+
+        #Create a ring buffer to hold the monitored signal. Like the previous implementation,
+        #the window starts out full of zeros.
+        self._signal: EmgRingBuffer = EmgRingBuffer(1, self.sample_count)
+
+        #The running sum of all samples in the window
+        self._running_sum: float = 0.0
+
+        #The number of samples appended since the running sum was last recalculated from scratch.
+        #The running sum is periodically recalculated so that floating point error does not accumulate.
+        self._samples_since_resync: int = 0
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def grand_mean (self) -> float:
+        '''
+        The mean of all bins in the window
+        '''
+
+        return self._running_sum / self.sample_count
+
+    @property
+    def monitored_signal (self) -> np.ndarray:
+        '''
+        The samples in the window, from oldest to newest. This is a view, not a copy.
+        '''
+
+        return self._signal.ordered_view(0)
+
+    @property
+    def bins (self) -> np.ndarray:
+        '''
+        The mean of each bin in the window
+        '''
+
+        return self.monitored_signal.reshape(self.bin_count, self.bin_sample_count).mean(axis = 1)
+
+    #endregion
+
+    #region Methods
+
+    def append (self, data: np.ndarray) -> None:
+        '''
+        Adds new samples to the window, discarding the oldest samples.
+        '''
+
+        n: int = len(data)
+        if (n == 0):
+            return
+
+        if (n < self.sample_count):
+            #Remove the samples that are about to be overwritten from the running sum,
+            #and add the new samples to the running sum
+            evicted: np.ndarray = self._signal.ordered_view(0)[:n]
+            self._running_sum += float(np.sum(data)) - float(np.sum(evicted))
+
+            #Add the new samples to the window
+            self._signal.append(data)
+
+            #Recalculate the running sum once every window-length of samples
+            self._samples_since_resync += n
+            if (self._samples_since_resync >= self.sample_count):
+                self._resync_running_sum()
+        else:
+            #The entire window is being replaced
+            self._signal.append(data)
+            self._resync_running_sum()
+
+    #endregion
+
+    #region Private methods
+
+    def _resync_running_sum (self) -> None:
+        self._running_sum = float(np.sum(self._signal.ordered_view(0)))
+        self._samples_since_resync = 0
+
+    #endregion
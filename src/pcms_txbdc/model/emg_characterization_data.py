@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import BinaryIO
+from typing import BinaryIO, Iterator
 from platformdirs import user_data_dir
 import struct
 import os
@@ -57,22 +57,29 @@ class EmgCharacterizationTrial:
 
     trial_datetime: datetime = datetime.min
     grand_mean: float = 0.0
-    bins: list[float] = field(default_factory=list)
-    monitored_signal: list[float] = field(default_factory=list)
+    bins: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    monitored_signal: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+    def read_from_file (self, fid: BinaryIO, scalars_only: bool = False) -> None:
+        '''
+        Reads a trial from the file. If scalars_only is True, the bins and the monitored
+        signal are skipped over (using their stored lengths) rather than being read.
+        '''
 
-    def read_from_file (self, fid: BinaryIO) -> None:
         self.trial_datetime = FileIO_Helpers.read_datetime(fid)
         self.grand_mean = FileIO_Helpers.read(fid, "float64")
 
-        self.bins.clear()
         N: int = FileIO_Helpers.read(fid, "int32")
-        for i in range(0, N):
-            self.bins.append(FileIO_Helpers.read(fid, "float64"))
+        if (scalars_only):
+            fid.seek(N * FileIO_Helpers.length_dictionary["float64"], os.SEEK_CUR)
+        else:
+            self.bins = FileIO_Helpers.read_array(fid, "float64", N)
         
-        self.monitored_signal.clear()
         N = FileIO_Helpers.read(fid, "int32")
-        for i in range(0, N):
-            self.monitored_signal.append(FileIO_Helpers.read(fid, "float64"))
+        if (scalars_only):
+            fid.seek(N * FileIO_Helpers.length_dictionary["float64"], os.SEEK_CUR)
+        else:
+            self.monitored_signal = FileIO_Helpers.read_array(fid, "float64", N)
 
 
 @dataclass
@@ -81,9 +88,23 @@ class EmgCharacterizationData:
     header: EmgCharacterizationHeader = None
     trials: list[EmgCharacterizationTrial] = field(default_factory=list)
 
-    def read (self, fid: BinaryIO) -> None:
+    def read (self, fid: BinaryIO, scalars_only: bool = False) -> None:
         '''
         Readers the EMG characterization data file from disk.
+        If scalars_only is True, only the datetime and grand mean of each
+        trial are loaded (see iter_trials).
+        '''
+
+        self.trials.extend(self.iter_trials(fid, scalars_only))
+        
+        pass
+
+    def iter_trials (self, fid: BinaryIO, scalars_only: bool = False) -> Iterator[EmgCharacterizationTrial]:
+        '''
+        Reads the file header into this object, and then yields the trials in the
+        file one at a time without keeping them. If scalars_only is True, the bins
+        and monitored signal of each trial are skipped over, so that reading the
+        grand means does not require reading the rest of the file.
         '''
 
         self.header = EmgCharacterizationHeader()
@@ -97,11 +118,9 @@ class EmgCharacterizationData:
             block_id: int = struct.unpack(FileIO_Helpers.type_dictionary["int32"], chunk)[0]
             if (block_id == 1):
                 trial: EmgCharacterizationTrial = EmgCharacterizationTrial()
-                trial.read_from_file(fid)
+                trial.read_from_file(fid, scalars_only)
 
-                self.trials.append(trial)
-        
-        pass
+                yield trial
 
     def get_all_grandmeans (self) -> list[float]:
         '''
@@ -2,6 +2,11 @@ import numpy as np
 from scipy.signal import butter, sosfilt, sosfilt_zi
 
 class EmgDataFilter:
+    '''
+    A bank of identical band-pass filters, one per EMG channel (or derivation).
+    Each channel keeps its own filter state, so that consecutive blocks of data
+    are filtered continuously. All channels are filtered in a single call.
+    '''
 
     #region Constants
 
@@ -12,37 +17,69 @@ class EmgDataFilter:
 
     #endregion
 
-    #region Non-Constants
+    #region Constructor
 
-    sos = None
-    filter_state = None
+    def __init__(self,
+        channel_count: int = 1,
+        sample_rate: float = FS,
+        order: int = ORDER,
+        cutoff_freq_min: float = CUTOFF_FREQ_MIN,
+        cutoff_freq_max: float = CUTOFF_FREQ_MAX):
+
+        #Store the filter configuration
+        self.channel_count: int = channel_count
+        self.sample_rate: float = sample_rate
+        self.order: int = order
+        self.cutoff_freq_min: float = cutoff_freq_min
+        self.cutoff_freq_max: float = cutoff_freq_max
+
+        #Design the filter
+        self.sos: np.ndarray = butter(
+            self.order,
+            [self.cutoff_freq_min, self.cutoff_freq_max],
+            btype='bandpass',
+            output='sos',
+            fs = self.sample_rate)
+
+        #Initialize the filter state of each channel
+        self.filter_state: np.ndarray = None
+        self.reset()
 
     #endregion
 
-    #region Static methods
+    #region Methods
 
-    def initialize_filter () -> None:
+    def reset (self) -> None:
+        '''
+        Resets the filter state of every channel
+        '''
 
-        EmgDataFilter.sos = butter(
-            EmgDataFilter.ORDER, 
-            [EmgDataFilter.CUTOFF_FREQ_MIN, EmgDataFilter.CUTOFF_FREQ_MAX],
-            btype='bandpass',
-            output='sos',
-            fs = EmgDataFilter.FS)
-        
-        EmgDataFilter.filter_state = sosfilt_zi(EmgDataFilter.sos)
+        #The filter state has shape (section count, channel count, 2), which is the shape
+        #expected by sosfilt when filtering along axis 1 of a (channel count, sample count) block
+        zi: np.ndarray = sosfilt_zi(self.sos)
+        self.filter_state = np.repeat(zi[:, np.newaxis, :], self.channel_count, axis = 1)
 
         pass
 
-    def filter (data: np.ndarray) -> np.ndarray:
-        
-        #Calculate the filtered data and the new filter state
-        filtered_data, filter_state = sosfilt(EmgDataFilter.sos, data, zi = EmgDataFilter.filter_state)
+    def filter (self, data: np.ndarray) -> np.ndarray:
+        '''
+        Filters a block of data with shape (channel count, sample count). A 1-D
+        block of data may be passed to a single-channel filter bank, in which
+        case a 1-D block of filtered data is returned.
+        '''
 
-        #Set the filter state
-        EmgDataFilter.filter_state = filter_state
+        #Allow single-channel filter banks to be given a 1-D block of data
+        is_1d: bool = (np.ndim(data) == 1)
+        if (is_1d):
+            data = np.reshape(data, (1, -1))
+
+        #Calculate the filtered data and the new filter state of every channel
+        filtered_data, self.filter_state = sosfilt(self.sos, data, axis = 1, zi = self.filter_state)
 
         #Return the filtered data
-        return filtered_data
+        if (is_1d):
+            return filtered_data[0]
+        else:
+            return filtered_data
 
-    #endregion
\ No newline at end of file
+    #endregion
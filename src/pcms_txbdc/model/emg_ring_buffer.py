@@ -0,0 +1,119 @@
+import numpy as np
+
+class EmgRingBuffer:
+    '''
+    A fixed-capacity, multi-channel ring buffer for EMG samples.
+
+    Every sample is written twice: once at the write cursor, and once at the write
+    cursor plus the capacity of the buffer. Because of this, the most recent samples
+    are always available (oldest to newest) as a single contiguous slice of the backing
+    array. This allows the ordered view to be handed out without making a copy.
+    '''
+
+    #region Constructor
+
+    def __init__(self, channel_count: int, capacity: int, dtype = np.float64):
+
+        #Store the dimensions of the buffer
+        self.channel_count: int = channel_count
+        self.capacity: int = capacity
+
+        #Allocate the backing store. It is twice as long as the capacity so that
+        #the ordered view is always contiguous (see the class description).
+        self._buffer: np.ndarray = np.zeros((channel_count, 2 * capacity), dtype = dtype)
+
+        #This is the index at which the next sample will be written
+        self._write_index: int = 0
+
+        #This is the total number of samples that have ever been appended to the buffer
+        self.total_sample_count: int = 0
+
+    #endregion
+
+    #region Methods
+
+    def append (self, data) -> None:
+        '''
+        Appends new samples to the buffer, overwriting the oldest samples.
+
+        The data can be a 1-D array (for a single-channel buffer), a 2-D array with
+        one row per channel, or a list containing one 1-D array per channel. All
+        channels must contain the same number of samples.
+        '''
+
+        #Allow single-channel buffers to be given a 1-D array
+        if (self.channel_count == 1) and (np.ndim(data) == 1):
+            data = (data,)
+
+        #Determine how many samples are being appended
+        sample_count: int = len(data[0])
+        if (sample_count == 0):
+            return
+
+        self.total_sample_count += sample_count
+
+        #If more samples arrived than the buffer can hold, only the newest samples are kept
+        n: int = min(sample_count, self.capacity)
+
+        #Determine how many samples fit before the cursor wraps around
+        start: int = self._write_index
+        first_count: int = min(n, self.capacity - start)
+        wrapped_count: int = n - first_count
+
+        for c in range(0, self.channel_count):
+            source: np.ndarray = data[c][sample_count - n:]
+            channel: np.ndarray = self._buffer[c]
+
+            #Write the samples (and their mirror copies) up to the end of the buffer
+            channel[start:start + first_count] = source[:first_count]
+            channel[start + self.capacity:start + self.capacity + first_count] = source[:first_count]
+
+            #Write any remaining samples at the beginning of the buffer
+            if (wrapped_count > 0):
+                channel[0:wrapped_count] = source[first_count:]
+                channel[self.capacity:self.capacity + wrapped_count] = source[first_count:]
+
+        #Advance the write cursor
+        self._write_index = (start + n) % self.capacity
+
+    def ordered_view (self, channel: int = None) -> np.ndarray:
+        '''
+        Returns a view of the buffer contents ordered from oldest to newest. If a channel
+        is specified, a 1-D view of that channel is returned. Otherwise a 2-D view with
+        one row per channel is returned. The view is NOT a copy, so its contents will
+        change the next time data is appended to the buffer.
+        '''
+
+        start: int = self._write_index
+        end: int = start + self.capacity
+
+        if (channel is None):
+            return self._buffer[:, start:end]
+        else:
+            return self._buffer[channel, start:end]
+
+    def latest (self, sample_count: int, channel: int = None) -> np.ndarray:
+        '''
+        Returns a view of the most recent samples in the buffer, ordered from oldest
+        to newest. Like ordered_view, this is NOT a copy.
+        '''
+
+        sample_count = min(sample_count, self.capacity)
+        end: int = self._write_index + self.capacity
+        start: int = end - sample_count
+
+        if (channel is None):
+            return self._buffer[:, start:end]
+        else:
+            return self._buffer[channel, start:end]
+
+    def clear (self) -> None:
+        '''
+        Resets the contents of the buffer to zeros.
+        '''
+
+        self._buffer.fill(0)
+        self._write_index = 0
+        self.total_sample_count = 0
+
+    #endregion
@@ -2,6 +2,7 @@ from typing import BinaryIO
 from datetime import datetime
 from datetime import timedelta
 import struct
+import numpy as np
 
 class FileIO_Helpers:
 
@@ -9,6 +10,7 @@ class FileIO_Helpers:
         'char': 'c',
         'int': 'i',
         'int32': 'i',
+        'int64': 'q',
         'int8': 'b',
         'unsigned int': 'I',
         'uint8': 'B',
@@ -21,6 +23,7 @@ class FileIO_Helpers:
         'char': 2,
         'int': 4,
         'int32': 4,
+        'int64': 8,
         'int8': 1,
         'unsigned int': 4,
         'uint8': 1,
@@ -34,6 +37,17 @@ class FileIO_Helpers:
         bytes_object: bytes = struct.pack(FileIO_Helpers.type_dictionary[desired_type], data)
         opened_file.write(bytes_object)
     
+    @staticmethod
+    def write_array (opened_file: BinaryIO, desired_type: str, data) -> None:
+        '''
+        Writes every element of an array to an opened file as the caller's desired type.
+        The bytes written are identical to calling "write" on each element in turn, but
+        the whole array is written with a single call.
+        '''
+
+        array: np.ndarray = np.ascontiguousarray(data, dtype = FileIO_Helpers.type_dictionary[desired_type])
+        opened_file.write(array.tobytes())
+
     @staticmethod
     def write_string (opened_file: BinaryIO, str_to_write: str) -> None:
         #Write the string's length
@@ -61,6 +75,7 @@ class FileIO_Helpers:
         char -- Reads 2 bytes and interprets as a character
         int - Reads 4 bytes and interprets as an int
         int32 - Reads 4 bytes and interprets as an int
+        int64 - Reads 8 bytes and interprets as an int
         int8 - Reads 1 byte and interprets as an int
         unsigned int - Reads 4 bytes and interprets as an unsigned int
         uint8 - Reads 1 byte and interprets as an unsigned int
@@ -72,6 +87,27 @@ class FileIO_Helpers:
         unpacked = struct.unpack(FileIO_Helpers.type_dictionary[desired_type], opened_file.read(FileIO_Helpers.length_dictionary[desired_type]))
         return unpacked[0]
     
+    @staticmethod
+    def read_array (opened_file: BinaryIO, desired_type: str, count: int) -> np.ndarray:
+        """Reads a set number of elements of the caller's desired type from an opened file.
+
+        This is the bulk equivalent of calling "read" count times. The data is read with a single
+        call and is returned as a (read-only) numpy array.
+
+        Arguments:
+        opened_file -- A file handle to an opened file that is being read into memory.
+        desired_type -- A string indicating what to read in from the opened file (see "read").
+        count -- The number of elements to read.
+        """
+
+        dtype: np.dtype = np.dtype(FileIO_Helpers.type_dictionary[desired_type])
+        byte_count: int = count * dtype.itemsize
+        buffer: bytes = opened_file.read(byte_count)
+        if (len(buffer) != byte_count):
+            raise EOFError(f"Expected {byte_count} bytes but only {len(buffer)} bytes remain in the file")
+
+        return np.frombuffer(buffer, dtype = dtype)
+
     @staticmethod
     def read_string(opened_file: BinaryIO) -> str:
 
@@ -0,0 +1,168 @@
+import time
+import bisect
+import numpy as np
+
+from .open_ephys_streamer import OpenEphysDataBlock
+from .open_ephys_streamer import OpenEphysDataFrame
+
+class FrameAssembler:
+    '''
+    Assembles data blocks from Open Ephys into frames. A frame holds one block
+    from each subscribed channel, and all of the blocks in a frame share the
+    same sample number.
+
+    Frames are released in order of sample number. A frame that is still
+    missing blocks is held back for a short time (and only while a limited
+    number of newer frames are waiting behind it). After that, it is discarded
+    and counted as dropped. This way, blocks that were recorded at different
+    times are never paired with each other.
+
+    Each frame has a preallocated (channel count, sample count) array. The
+    samples of each block are copied into their row of that array as the
+    block arrives, and the block's data is replaced by a view of that row.
+    '''
+
+    #region Constants
+
+    #The maximum number of frames that may be waiting to be completed at one time. If this
+    #is exceeded, the oldest incomplete frame is discarded.
+    REORDER_WINDOW_FRAME_COUNT: int = 8
+
+    #The maximum amount of time (in seconds) to wait for the remaining blocks of a frame
+    #after its first block has arrived
+    FRAME_TIMEOUT_SECONDS: float = 0.05
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self,
+        channels: set[int],
+        reorder_window_frame_count: int = REORDER_WINDOW_FRAME_COUNT,
+        frame_timeout_seconds: float = FRAME_TIMEOUT_SECONDS):
+
+        #Store the configuration of the assembler
+        self.channels: set[int] = set(channels)
+        self.reorder_window_frame_count: int = reorder_window_frame_count
+        self.frame_timeout_seconds: float = frame_timeout_seconds
+
+        #Counters that describe how often data is lost
+        self.emitted_frame_count: int = 0
+        self.dropped_frame_count: int = 0
+        self.dropped_block_count: int = 0
+        self.late_block_count: int = 0
+        self.duplicate_block_count: int = 0
+
+        #Private members
+        self._channel_rows: dict[int, int] = {c: i for (i, c) in enumerate(sorted(self.channels))}
+        self._pending_frames: dict[int, OpenEphysDataFrame] = {}
+        self._pending_frame_start_times: dict[int, float] = {}
+        self._last_released_sample_id: int = -1
+        self._consecutive_late_block_count: int = 0
+
+    #endregion
+
+    #region Methods
+
+    def reset (self) -> None:
+        '''
+        Discards all pending frames and forgets the most recently released sample number.
+        The counters are not reset.
+        '''
+
+        self._pending_frames.clear()
+        self._pending_frame_start_times.clear()
+        self._last_released_sample_id = -1
+        self._consecutive_late_block_count = 0
+
+    def add_block (self, block: OpenEphysDataBlock) -> list[OpenEphysDataFrame]:
+        '''
+        Adds a data block to the frame it belongs to. Returns a list of any
+        complete frames that are ready to be released, in order of sample number.
+        '''
+
+        #Ignore blocks from channels that are not part of the frames
+        if (block.channel_index not in self.channels):
+            return self.flush_expired()
+
+        #Check whether a frame with this sample number has already been released or dropped
+        if (block.sample_id <= self._last_released_sample_id):
+            self.late_block_count += 1
+            self.dropped_block_count += 1
+
+            #If many blocks in a row are "late", then Open Ephys has most likely restarted
+            #acquisition and the sample numbers have started over
+            self._consecutive_late_block_count += 1
+            if (self._consecutive_late_block_count > (self.reorder_window_frame_count * len(self.channels))):
+                self.reset()
+
+            return self.flush_expired()
+
+        self._consecutive_late_block_count = 0
+
+        #Find the frame that this block belongs to, or create a new frame
+        df: OpenEphysDataFrame = self._pending_frames.get(block.sample_id, None)
+        if (df is None):
+            df = OpenEphysDataFrame(block.timestamp, block.sample_id, [], 0)
+            df.channel_data = np.empty((len(self.channels), len(block.data)), dtype = block.data.dtype)
+            self._pending_frames[block.sample_id] = df
+            self._pending_frame_start_times[block.sample_id] = time.monotonic()
+
+        #Make sure this frame doesn't already have a block from this channel
+        for b in df.channel_data_blocks:
+            if (b.channel_index == block.channel_index):
+                self.duplicate_block_count += 1
+                self.dropped_block_count += 1
+                return self.flush_expired()
+
+        #Every block in a frame must have the same number of samples
+        if (len(block.data) != df.channel_data.shape[1]):
+            self.dropped_block_count += 1
+            return self.flush_expired()
+
+        #Copy the samples into this channel's row of the frame, and point the block at that row
+        row: np.ndarray = df.channel_data[self._channel_rows[block.channel_index]]
+        row[:] = block.data
+        block.data = row
+
+        #Insert the block, keeping the blocks in order of channel index
+        bisect.insort(df.channel_data_blocks, block, key=lambda x: x.channel_index)
+
+        return self.flush_expired()
+
+    def flush_expired (self) -> list[OpenEphysDataFrame]:
+        '''
+        Releases complete frames and discards incomplete frames that have timed out
+        or fallen out of the reorder window. Returns the released frames in order of
+        sample number. This should be called periodically, even when no data is arriving.
+        '''
+
+        released_frames: list[OpenEphysDataFrame] = []
+        current_time: float = time.monotonic()
+
+        while (len(self._pending_frames) > 0):
+            #Look at the oldest pending frame
+            sample_id: int = min(self._pending_frames.keys())
+            df: OpenEphysDataFrame = self._pending_frames[sample_id]
+
+            if (len(df.channel_data_blocks) >= len(self.channels)):
+                #The frame is complete, so release it
+                released_frames.append(df)
+                self.emitted_frame_count += 1
+            elif ((len(self._pending_frames) > self.reorder_window_frame_count) or
+                ((current_time - self._pending_frame_start_times[sample_id]) >= self.frame_timeout_seconds)):
+                #The frame is incomplete and we are done waiting for it, so drop it
+                self.dropped_frame_count += 1
+                self.dropped_block_count += len(df.channel_data_blocks)
+            else:
+                #Keep waiting for the oldest frame. Newer frames must wait behind it
+                #so that frames are always released in order.
+                break
+
+            del self._pending_frames[sample_id]
+            del self._pending_frame_start_times[sample_id]
+            self._last_released_sample_id = sample_id
+
+        return released_frames
+
+    #endregion
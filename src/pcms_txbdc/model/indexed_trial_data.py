@@ -0,0 +1,259 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO
+import os
+import numpy as np
+
+from .fileio_helpers import FileIO_Helpers
+
+#The bytes at the very end of a complete indexed trial file. If these are missing, the file
+#was not closed properly (and so it has no trial index).
+INDEXED_TRIAL_FILE_MAGIC: bytes = b"PCMSIDX1"
+
+#The versions of the file format that can be read. Version 2 files have no stimulus sample
+#numbers in their index, and only version 4 files can be recovered if the index is missing.
+INDEXED_TRIAL_FILE_VERSIONS: tuple[int, ...] = (2, 3, 4)
+
+#The layout of the record that precedes the samples of each trial (version 4 and later)
+INDEXED_TRIAL_RECORD_DTYPE: np.dtype = np.dtype([
+    ('channel_count', np.int32),
+    ('sample_count', np.int32),
+    ('timestamp', np.float64),
+    ('amplitude', np.float64),
+    ('stimulus_sample_num', np.int64)
+])
+
+#The layout of each entry in the trial index of a version 2 file
+INDEXED_TRIAL_INDEX_DTYPE_V2: np.dtype = np.dtype([
+    ('offset', np.int64),
+    ('channel_count', np.int32),
+    ('sample_count', np.int32),
+    ('timestamp', np.float64),
+    ('amplitude', np.float64)
+])
+
+#The layout of each entry in the trial index
+INDEXED_TRIAL_INDEX_DTYPE: np.dtype = np.dtype([
+    ('offset', np.int64),
+    ('channel_count', np.int32),
+    ('sample_count', np.int32),
+    ('timestamp', np.float64),
+    ('amplitude', np.float64),
+    ('stimulus_sample_num', np.int64)
+])
+
+#The layout of the footer
+INDEXED_TRIAL_FOOTER_DTYPE: np.dtype = np.dtype([
+    ('index_offset', np.int64),
+    ('trial_count', np.int64),
+    ('magic', 'S8')
+])
+
+@dataclass
+class IndexedTrialHeader:
+    file_version: int = 0
+    header_length: int = 0
+    subject_id: str = ""
+    session_datetime: datetime = datetime.min
+    stage_name: str = ""
+    stage_description: str = ""
+    stage_type: int = 0
+    sample_rate: float = 0.0
+
+    def read_from_file (self, fid: BinaryIO) -> None:
+        self.file_version = FileIO_Helpers.read(fid, "int32")
+        self.header_length = FileIO_Helpers.read(fid, "int32")
+        self.subject_id = FileIO_Helpers.read_string(fid)
+        self.session_datetime = FileIO_Helpers.read_datetime(fid)
+        self.stage_name = FileIO_Helpers.read_string(fid)
+        self.stage_description = FileIO_Helpers.read_string(fid)
+        self.stage_type = FileIO_Helpers.read(fid, "int32")
+        self.sample_rate = FileIO_Helpers.read(fid, "float64")
+
+        pass
+
+class IndexedTrialData:
+    '''
+    Reads a file that was written by IndexedTrialWriter.
+
+    The file is memory-mapped rather than read into memory. The trial index is read
+    from the end of the file when it is opened, and the data of each trial is only
+    touched when that trial is requested, so any trial can be read in constant time
+    and memory no matter how long the session was.
+
+    If the session ended without the writer being closed (for example, if the
+    application crashed), the file has no trial index. For version 4 files, the
+    index is then rebuilt by scanning the trial records, and any trial that was
+    only partially written is ignored. Older files without an index cannot be read.
+
+    File layout (native byte order):
+        Header:
+            int32       file version
+            int32       header length in bytes (the trial data starts at this offset)
+            string      subject id
+            datetime    session date/time
+            string      stage name
+            string      stage description
+            int32       stage type
+            float64     sample rate
+        Trial data (one record per trial):
+            int32       channel count (C)                                   (version 4 and later)
+            int32       sample count (N)                                    (version 4 and later)
+            float64     timestamp                                           (version 4 and later)
+            float64     stimulus amplitude                                  (version 4 and later)
+            int64       Open Ephys sample number of the stimulus            (version 4 and later)
+            float32[C*N] the samples of the trial, one channel after another
+        Trial index (one entry per trial):
+            int64       offset of the trial's samples from the start of the file
+            int32       channel count (C)
+            int32       sample count (N)
+            float64     timestamp
+            float64     stimulus amplitude
+            int64       Open Ephys sample number of the stimulus (-1 if unknown, version 3 and later)
+        Footer:
+            int64       offset of the trial index from the start of the file
+            int64       trial count
+            char[8]     "PCMSIDX1"
+    '''
+
+    #region Constructor
+
+    def __init__(self, file_path: str):
+        self.file_path: str = file_path
+
+        #Read the header
+        with open(file_path, "rb") as fid:
+            self.header: IndexedTrialHeader = IndexedTrialHeader()
+            self.header.read_from_file(fid)
+
+        if (self.header.file_version not in INDEXED_TRIAL_FILE_VERSIONS):
+            raise ValueError(f"{file_path} has file version {self.header.file_version}, which this reader does not support.")
+
+        #True if the file was not closed properly, and its index was rebuilt from the trial records
+        self.is_recovered: bool = False
+
+        #Map the file into memory
+        file_size: int = os.path.getsize(file_path)
+        self._memmap: np.memmap = np.memmap(file_path, dtype = np.uint8, mode = "r")
+
+        #Read the footer and check that the file is complete
+        footer: np.ndarray = None
+        if (file_size >= (self.header.header_length + INDEXED_TRIAL_FOOTER_DTYPE.itemsize)):
+            footer = self._memmap[file_size - INDEXED_TRIAL_FOOTER_DTYPE.itemsize:].view(INDEXED_TRIAL_FOOTER_DTYPE)[0]
+            if (footer['magic'] != INDEXED_TRIAL_FILE_MAGIC):
+                footer = None
+
+        if (footer is None):
+            if (self.header.file_version < 4):
+                raise ValueError(f"{file_path} does not contain a trial index. The file may not have been closed properly.")
+
+            #Rebuild the index from the trial records
+            self.index: np.ndarray = self._scan_trial_records(file_size)
+            self.is_recovered = True
+        elif (self.header.file_version == 2):
+            #Version 2 index entries have no stimulus sample number
+            index_offset: int = int(footer['index_offset'])
+            index_length: int = int(footer['trial_count']) * INDEXED_TRIAL_INDEX_DTYPE_V2.itemsize
+            index_v2: np.ndarray = self._memmap[index_offset:index_offset + index_length].view(INDEXED_TRIAL_INDEX_DTYPE_V2)
+
+            self.index: np.ndarray = np.zeros(len(index_v2), dtype = INDEXED_TRIAL_INDEX_DTYPE)
+            for name in INDEXED_TRIAL_INDEX_DTYPE_V2.names:
+                self.index[name] = index_v2[name]
+            self.index['stimulus_sample_num'] = -1
+        else:
+            #Get a view of the trial index
+            index_offset: int = int(footer['index_offset'])
+            index_length: int = int(footer['trial_count']) * INDEXED_TRIAL_INDEX_DTYPE.itemsize
+            self.index: np.ndarray = self._memmap[index_offset:index_offset + index_length].view(INDEXED_TRIAL_INDEX_DTYPE)
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def trial_count (self) -> int:
+        return len(self.index)
+
+    @property
+    def timestamps (self) -> np.ndarray:
+        return self.index['timestamp']
+
+    @property
+    def amplitudes (self) -> np.ndarray:
+        return self.index['amplitude']
+
+    @property
+    def stimulus_sample_nums (self) -> np.ndarray:
+        return self.index['stimulus_sample_num']
+
+    #endregion
+
+    #region Methods
+
+    def __len__ (self) -> int:
+        return self.trial_count
+
+    def get_trial (self, trial_index: int) -> np.ndarray:
+        '''
+        Returns a read-only (channel count, sample count) view of the data of a trial.
+        The data is not read from disk until it is used.
+        '''
+
+        entry: np.ndarray = self.index[trial_index]
+        channel_count: int = int(entry['channel_count'])
+        sample_count: int = int(entry['sample_count'])
+        offset: int = int(entry['offset'])
+        byte_count: int = channel_count * sample_count * np.dtype(np.float32).itemsize
+
+        return self._memmap[offset:offset + byte_count].view(np.float32).reshape(channel_count, sample_count)
+
+    def iter_trials (self):
+        '''
+        Yields a view of the data of each trial, in order
+        '''
+
+        for i in range(0, self.trial_count):
+            yield self.get_trial(i)
+
+    def close (self) -> None:
+        '''
+        Releases this object's reference to the memory map. The file is unmapped
+        once every view that was returned by this object has also been released.
+        '''
+
+        self.index = np.zeros(0, dtype = INDEXED_TRIAL_INDEX_DTYPE)
+        self._memmap = None
+
+    #endregion
+
+    #region Private methods
+
+    def _scan_trial_records (self, file_size: int) -> np.ndarray:
+        '''
+        Builds a trial index by walking the trial records from the end of the header.
+        The scan stops at the first record that is incomplete or does not make sense,
+        which is where the writing of the file was interrupted.
+        '''
+
+        sample_size: int = np.dtype(np.float32).itemsize
+        entries: list[tuple] = []
+
+        offset: int = self.header.header_length
+        while ((offset + INDEXED_TRIAL_RECORD_DTYPE.itemsize) <= file_size):
+            record: np.ndarray = self._memmap[offset:offset + INDEXED_TRIAL_RECORD_DTYPE.itemsize].view(INDEXED_TRIAL_RECORD_DTYPE)[0]
+            channel_count: int = int(record['channel_count'])
+            sample_count: int = int(record['sample_count'])
+            if (channel_count <= 0) or (sample_count < 0):
+                break
+
+            data_offset: int = offset + INDEXED_TRIAL_RECORD_DTYPE.itemsize
+            data_end: int = data_offset + (channel_count * sample_count * sample_size)
+            if (data_end > file_size):
+                break
+
+            entries.append((data_offset, channel_count, sample_count, record['timestamp'], record['amplitude'], record['stimulus_sample_num']))
+            offset = data_end
+
+        return np.array(entries, dtype = INDEXED_TRIAL_INDEX_DTYPE)
+
+    #endregion
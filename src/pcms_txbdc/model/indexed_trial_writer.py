@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import BinaryIO
+import io
+import numpy as np
+
+from .fileio_helpers import FileIO_Helpers
+from .indexed_trial_data import INDEXED_TRIAL_FILE_MAGIC, INDEXED_TRIAL_RECORD_DTYPE, INDEXED_TRIAL_INDEX_DTYPE, INDEXED_TRIAL_FOOTER_DTYPE
+
+class IndexedTrialWriter:
+    '''
+    Writes the trials of a session to an indexed trial file (see IndexedTrialData
+    for the layout).
+
+    The samples of each trial are appended to the file as one contiguous float32
+    array, and the trial's offset, size, timestamp, stimulus amplitude, and stimulus
+    sample number are kept in memory. When the writer is closed, the trial index and the footer are written
+    at the end of the file. This allows a reader to find any trial without parsing
+    the trials that come before it.
+
+    Each trial's samples are preceded by a small record that repeats the trial's
+    size, timestamp, amplitude, and stimulus sample number. If the writer is never
+    closed (for example, if the application crashes), the file has no index, and
+    the reader rebuilds the index from these records.
+    '''
+
+    #region Constants
+
+    #The version of the file format
+    FILE_VERSION: int = 4
+
+    #The trial data starts on a multiple of this many bytes
+    DATA_ALIGNMENT: int = 8
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self, file_path: str, subject_id: str, stage_name: str, stage_description: str, stage_type: int, sample_rate: float):
+
+        #Store the file details
+        self.file_path: str = file_path
+        self.subject_id: str = subject_id
+        self.stage_name: str = stage_name
+        self.stage_description: str = stage_description
+        self.stage_type: int = stage_type
+        self.sample_rate: float = sample_rate
+
+        #Private members
+        self._fid: BinaryIO = None
+        self._index_entries: list[tuple] = []
+        self._data_offset: int = 0
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def trial_count (self) -> int:
+        return len(self._index_entries)
+
+    #endregion
+
+    #region Methods
+
+    def open (self) -> None:
+        '''
+        Opens the file and writes the file header
+        '''
+
+        self._fid = open(self.file_path, "wb")
+        self._index_entries = []
+        self._write_file_header()
+
+    def write_trial (self, data: np.ndarray, timestamp: float, amplitude: float, stimulus_sample_num: int = -1) -> None:
+        '''
+        Appends the data of a trial to the file. The data can be a 1-D array
+        (for a single channel), or a 2-D array with one row per channel. The
+        stimulus sample number is the Open Ephys sample number at which the
+        trial's stimulus was issued.
+        '''
+
+        if (self._fid is None):
+            return
+
+        trial_data: np.ndarray = np.atleast_2d(data)
+        (channel_count, sample_count) = trial_data.shape
+
+        #Save the trial's record, followed by the trial's data
+        record: np.ndarray = np.array([(channel_count, sample_count, timestamp, amplitude, stimulus_sample_num)], dtype = INDEXED_TRIAL_RECORD_DTYPE)
+        self._fid.write(record.tobytes())
+        self._data_offset += INDEXED_TRIAL_RECORD_DTYPE.itemsize
+
+        FileIO_Helpers.write_array(self._fid, "float", trial_data)
+
+        #Remember where the trial's data is
+        self._index_entries.append((self._data_offset, channel_count, sample_count, timestamp, amplitude, stimulus_sample_num))
+        self._data_offset += trial_data.size * np.dtype(np.float32).itemsize
+
+    def close (self) -> None:
+        '''
+        Writes the trial index and the footer, and then closes the file
+        '''
+
+        if (self._fid is None):
+            return
+
+        #Save the trial index
+        index: np.ndarray = np.array(self._index_entries, dtype = INDEXED_TRIAL_INDEX_DTYPE)
+        self._fid.write(index.tobytes())
+
+        #Save the footer
+        footer: np.ndarray = np.array([(self._data_offset, len(index), INDEXED_TRIAL_FILE_MAGIC)], dtype = INDEXED_TRIAL_FOOTER_DTYPE)
+        self._fid.write(footer.tobytes())
+
+        self._fid.close()
+        self._fid = None
+
+    #endregion
+
+    #region Private methods
+
+    def _write_file_header (self) -> None:
+        #Build the variable-length part of the header first, so that its length is known
+        header: io.BytesIO = io.BytesIO()
+        FileIO_Helpers.write_string(header, self.subject_id)
+        FileIO_Helpers.write_datetime(header, datetime.now())
+        FileIO_Helpers.write_string(header, self.stage_name)
+        FileIO_Helpers.write_string(header, self.stage_description)
+        FileIO_Helpers.write(header, "int32", self.stage_type)
+        FileIO_Helpers.write(header, "float64", self.sample_rate)
+
+        #Pad the header so that the trial data is aligned
+        header_length: int = 8 + len(header.getbuffer())
+        padding_length: int = (-header_length) % IndexedTrialWriter.DATA_ALIGNMENT
+        header_length += padding_length
+
+        #Save the file version and the header length, followed by the rest of the header
+        FileIO_Helpers.write(self._fid, "int32", IndexedTrialWriter.FILE_VERSION)
+        FileIO_Helpers.write(self._fid, "int32", header_length)
+        self._fid.write(header.getbuffer())
+        self._fid.write(bytes(padding_length))
+
+        self._data_offset = header_length
+
+    #endregion
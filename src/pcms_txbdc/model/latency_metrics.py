@@ -0,0 +1,252 @@
+import math
+import time
+import threading
+import numpy as np
+
+class LatencyHistogram:
+    '''
+    A histogram of durations with logarithmically-spaced bins. Recording a value
+    is O(1) and uses a fixed amount of memory, so it is cheap enough to do for
+    every block/frame. Percentiles are estimated from the bins, and are accurate
+    to within the width of one bin (about 12% with the default bin spacing).
+    '''
+
+    #region Constants
+
+    #The range of durations (in seconds) covered by the bins. Values outside of this
+    #range are counted in the lowest or highest bin.
+    MIN_SECONDS: float = 1e-6
+    MAX_SECONDS: float = 100.0
+
+    #The number of bins per factor of 10
+    BINS_PER_DECADE: int = 20
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self):
+        decade_count: float = math.log10(LatencyHistogram.MAX_SECONDS / LatencyHistogram.MIN_SECONDS)
+        self._bin_count: int = int(math.ceil(decade_count * LatencyHistogram.BINS_PER_DECADE))
+
+        #The lower edge of each bin
+        self.bin_edges: np.ndarray = LatencyHistogram.MIN_SECONDS * np.power(10.0, np.arange(0, self._bin_count + 1) / LatencyHistogram.BINS_PER_DECADE)
+
+        self.counts: np.ndarray = np.zeros(self._bin_count, dtype = np.int64)
+        self.count: int = 0
+        self.total_seconds: float = 0.0
+        self.min_seconds: float = math.inf
+        self.max_seconds: float = 0.0
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def mean_seconds (self) -> float:
+        if (self.count == 0):
+            return 0.0
+        return self.total_seconds / self.count
+
+    #endregion
+
+    #region Methods
+
+    def record (self, seconds: float) -> None:
+        '''
+        Adds a duration (in seconds) to the histogram
+        '''
+
+        if (seconds > LatencyHistogram.MIN_SECONDS):
+            index: int = int(math.log10(seconds / LatencyHistogram.MIN_SECONDS) * LatencyHistogram.BINS_PER_DECADE)
+            index = min(index, self._bin_count - 1)
+        else:
+            index: int = 0
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        if (seconds < self.min_seconds):
+            self.min_seconds = seconds
+        if (seconds > self.max_seconds):
+            self.max_seconds = seconds
+
+    def percentile (self, p: float) -> float:
+        '''
+        Returns an estimate of the p-th percentile (0 to 100) of the recorded durations, in seconds
+        '''
+
+        if (self.count == 0):
+            return 0.0
+
+        #Find the bin that contains the requested rank
+        rank: float = (p / 100.0) * self.count
+        index: int = int(np.searchsorted(np.cumsum(self.counts), rank, side = 'left'))
+        index = min(index, self._bin_count - 1)
+
+        #Use the geometric center of the bin, but never report a value outside of the observed range
+        estimate: float = math.sqrt(self.bin_edges[index] * self.bin_edges[index + 1])
+        return min(max(estimate, self.min_seconds), self.max_seconds)
+
+    def clear (self) -> None:
+        self.counts.fill(0)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.min_seconds = math.inf
+        self.max_seconds = 0.0
+
+    #endregion
+
+class LatencyTimer:
+    '''
+    Times a block of code and records the duration in LatencyMetrics:
+
+        with LatencyMetrics.timer("filter"):
+            ...
+    '''
+
+    def __init__(self, name: str):
+        self._name: str = name
+        self._start_time: float = 0.0
+
+    def __enter__ (self):
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__ (self, exc_type, exc_value, traceback):
+        LatencyMetrics.record(self._name, time.perf_counter() - self._start_time)
+        return False
+
+class LatencyMetrics:
+    '''
+    Collects latency histograms for each step of the path from acquiring EMG data
+    to triggering a stimulus. Any thread may record a value. The histograms are
+    kept per session: they are cleared when a session starts, and can be dumped
+    to a file when it ends.
+    '''
+
+    #region Constants
+
+    #The names of the metrics that are recorded by the application
+    INGEST: str = "ingest"
+    ASSEMBLE: str = "assemble"
+    FILTER: str = "filter"
+    STAGE_QUEUE: str = "stage queue"
+    STAGE_PROCESS: str = "stage process"
+    ACQUISITION_TO_STAGE: str = "acquisition to stage"
+    STIMULATOR: str = "stimulator"
+    PLOT: str = "plot"
+
+    #The percentiles reported by the summary
+    SUMMARY_PERCENTILES: tuple = (50, 95, 99)
+
+    #endregion
+
+    #region Class members
+
+    _histograms: dict[str, LatencyHistogram] = {}
+    _lock: threading.Lock = threading.Lock()
+
+    #endregion
+
+    #region Methods
+
+    @staticmethod
+    def record (name: str, seconds: float) -> None:
+        '''
+        Records a duration (in seconds) for the named metric
+        '''
+
+        with LatencyMetrics._lock:
+            histogram: LatencyHistogram = LatencyMetrics._histograms.get(name, None)
+            if (histogram is None):
+                histogram = LatencyHistogram()
+                LatencyMetrics._histograms[name] = histogram
+            histogram.record(seconds)
+
+    @staticmethod
+    def timer (name: str) -> LatencyTimer:
+        '''
+        Returns a context manager that records how long its block of code takes
+        '''
+
+        return LatencyTimer(name)
+
+    @staticmethod
+    def reset () -> None:
+        '''
+        Clears all of the histograms
+        '''
+
+        with LatencyMetrics._lock:
+            LatencyMetrics._histograms.clear()
+
+    @staticmethod
+    def summary () -> dict[str, dict[str, float]]:
+        '''
+        Returns the count, mean, maximum, and percentiles (all in seconds) of each metric
+        '''
+
+        result: dict[str, dict[str, float]] = {}
+        with LatencyMetrics._lock:
+            for (name, histogram) in LatencyMetrics._histograms.items():
+                s: dict[str, float] = {
+                    'count': histogram.count,
+                    'mean': histogram.mean_seconds,
+                    'max': histogram.max_seconds
+                }
+                for p in LatencyMetrics.SUMMARY_PERCENTILES:
+                    s[f"p{p}"] = histogram.percentile(p)
+                result[name] = s
+
+        return result
+
+    @staticmethod
+    def summary_text (names: list[str] = None) -> str:
+        '''
+        Returns a short, single-line summary (median and 99th percentile, in milliseconds)
+        of the named metrics, or of every metric if no names are given
+        '''
+
+        summary: dict[str, dict[str, float]] = LatencyMetrics.summary()
+        if (names is None):
+            names = list(summary.keys())
+
+        parts: list[str] = []
+        for name in names:
+            if (name in summary):
+                s: dict[str, float] = summary[name]
+                parts.append(f"{name} {1000 * s['p50']:.2f}/{1000 * s['p99']:.2f}")
+
+        return ", ".join(parts)
+
+    @staticmethod
+    def dump (file_path: str) -> None:
+        '''
+        Writes a summary of every metric, followed by the full histogram of every metric,
+        to a text file
+        '''
+
+        summary: dict[str, dict[str, float]] = LatencyMetrics.summary()
+        percentile_names: list[str] = [f"p{p}" for p in LatencyMetrics.SUMMARY_PERCENTILES]
+
+        with LatencyMetrics._lock:
+            histograms: dict[str, tuple[np.ndarray, np.ndarray]] = {
+                name: (h.bin_edges.copy(), h.counts.copy()) for (name, h) in LatencyMetrics._histograms.items()
+            }
+
+        with open(file_path, "w") as f:
+            #Write the summary. All durations are in milliseconds.
+            f.write("metric,count,mean_ms,max_ms," + ",".join([f"{p}_ms" for p in percentile_names]) + "\n")
+            for (name, s) in summary.items():
+                values: list[float] = [s['mean'], s['max']] + [s[p] for p in percentile_names]
+                f.write(f"{name},{s['count']}," + ",".join([f"{1000 * v:.4f}" for v in values]) + "\n")
+
+            #Write the non-empty bins of each histogram
+            f.write("\n")
+            f.write("metric,bin_start_ms,bin_end_ms,count\n")
+            for (name, (bin_edges, counts)) in histograms.items():
+                for i in np.flatnonzero(counts):
+                    f.write(f"{name},{1000 * bin_edges[i]:.4f},{1000 * bin_edges[i + 1]:.4f},{counts[i]}\n")
+
+    #endregion
@@ -0,0 +1,228 @@
+import zmq
+import json
+import time
+import queue
+from collections import deque
+from dataclasses import dataclass
+
+@dataclass
+class _EventChannelRequest:
+
+    #The encoded JSON message
+    payload: bytes = b""
+
+    #Whether this request is an event (events are retried if they are not acknowledged,
+    #heartbeats are not)
+    is_event: bool = False
+
+    #The time (from time.monotonic) at which the request was last sent
+    sent_time: float = 0.0
+
+    #The number of times the request has been re-sent
+    retry_count: int = 0
+
+class OpenEphysEventChannel:
+    '''
+    Sends heartbeats and events to the Open Ephys ZMQ interface's event (REP) socket.
+
+    A DEALER socket is used rather than a REQ socket, so sending never has to wait
+    for the previous reply: several requests can be in flight at once, and the REP
+    socket answers them in the order in which they were sent. Events may be queued
+    from any thread, and are sent by the thread that calls "service".
+
+    If the oldest request in flight is not answered within the request timeout, the
+    socket is closed and re-opened (the "lazy pirate" pattern from the ZeroMQ guide),
+    and every unacknowledged event is sent again. Reconnection attempts back off
+    exponentially while Open Ephys is not answering, and the backoff is reset as soon
+    as a reply is received. Events are only ever discarded when the channel is closed.
+    '''
+
+    #region Constants
+
+    #The interval between heartbeats (in seconds)
+    HEARTBEAT_INTERVAL_SECONDS: float = 2.0
+
+    #The amount of time (in seconds) to wait for a reply before the socket is re-opened
+    REQUEST_TIMEOUT_SECONDS: float = 2.0
+
+    #The maximum number of requests that may be waiting for a reply at once
+    MAX_IN_FLIGHT_REQUESTS: int = 16
+
+    #The delay (in seconds) before the first reconnection attempt, and the maximum delay.
+    #The delay doubles with each consecutive reconnection.
+    RECONNECT_BACKOFF_MIN_SECONDS: float = 0.1
+    RECONNECT_BACKOFF_MAX_SECONDS: float = 10.0
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self, context: zmq.Context, address: str, app_name: str, uuid: str):
+
+        #Store the connection details
+        self.address: str = address
+        self.app_name: str = app_name
+        self.uuid: str = uuid
+
+        #Counters
+        self.sent_event_count: int = 0
+        self.acknowledged_event_count: int = 0
+        self.resent_event_count: int = 0
+        self.reconnect_count: int = 0
+
+        #Private members
+        self._context: zmq.Context = context
+        self._socket: zmq.Socket = None
+        self._poller: zmq.Poller = None
+        self._outgoing_events: queue.Queue = queue.Queue()
+        self._retry_requests: deque[_EventChannelRequest] = deque()
+        self._in_flight_requests: deque[_EventChannelRequest] = deque()
+        self._last_heartbeat_time: float = 0.0
+        self._reconnect_backoff_seconds: float = OpenEphysEventChannel.RECONNECT_BACKOFF_MIN_SECONDS
+        self._next_send_time: float = 0.0
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def pending_event_count (self) -> int:
+        '''
+        The number of events that have been queued but not yet acknowledged by Open Ephys
+        '''
+
+        in_flight_count: int = len([r for r in self._in_flight_requests if r.is_event])
+        return self._outgoing_events.qsize() + len(self._retry_requests) + in_flight_count
+
+    #endregion
+
+    #region Methods
+
+    def open (self, poller: zmq.Poller) -> None:
+        '''
+        Connects to Open Ephys. The channel's socket is registered with the poller,
+        so that the poller wakes up when a reply arrives.
+        '''
+
+        self._poller = poller
+        self._connect()
+
+    def close (self) -> None:
+        if (self._socket is not None):
+            self._poller.unregister(self._socket)
+            self._socket.close(linger = 0)
+            self._socket = None
+
+    def owns_socket (self, socket: zmq.Socket) -> bool:
+        return (self._socket is not None) and (socket is self._socket)
+
+    def queue_event (self, sample_num: int, event_channel: int, event_id: int, event_type: int) -> None:
+        '''
+        Queues an event to be sent to Open Ephys. This may be called from any thread, and it never blocks.
+        '''
+
+        #Compose the event message
+        de = {'type': event_type, 'sample_num': sample_num,
+              'event_id': event_id % 2 + 1,
+              'event_channel': event_channel}
+
+        d = {'application': self.app_name,
+             'uuid': self.uuid,
+             'type': 'event',
+             'event': de}
+
+        self._outgoing_events.put(_EventChannelRequest(json.dumps(d).encode('utf-8'), True))
+
+    def service (self) -> None:
+        '''
+        Receives any replies that are waiting, re-opens the socket if a request has
+        timed out, and then sends as many queued requests as the in-flight limit allows.
+        This must be called regularly by the thread that owns the channel.
+        '''
+
+        if (self._socket is None):
+            return
+
+        now: float = time.monotonic()
+
+        #Receive the replies that are waiting. Each reply answers the oldest request in flight.
+        while (True):
+            try:
+                self._socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            if (len(self._in_flight_requests) > 0):
+                request: _EventChannelRequest = self._in_flight_requests.popleft()
+                if (request.is_event):
+                    self.acknowledged_event_count += 1
+
+            #Open Ephys is answering, so reset the reconnection backoff
+            self._reconnect_backoff_seconds = OpenEphysEventChannel.RECONNECT_BACKOFF_MIN_SECONDS
+
+        #Check to see if the oldest request has timed out
+        if (len(self._in_flight_requests) > 0) and ((now - self._in_flight_requests[0].sent_time) > OpenEphysEventChannel.REQUEST_TIMEOUT_SECONDS):
+            self._reconnect(now)
+
+        #Wait out the backoff period after a reconnection before sending anything else
+        if (now < self._next_send_time):
+            return
+
+        #Queue a heartbeat if it is time to do so
+        if ((now - self._last_heartbeat_time) > OpenEphysEventChannel.HEARTBEAT_INTERVAL_SECONDS):
+            self._last_heartbeat_time = now
+            d = {'application': self.app_name,
+                 'uuid': self.uuid,
+                 'type': 'heartbeat'}
+            self._send(_EventChannelRequest(json.dumps(d).encode('utf-8'), False), now)
+
+        #Send events that need to be re-sent first, and then new events
+        while (len(self._in_flight_requests) < OpenEphysEventChannel.MAX_IN_FLIGHT_REQUESTS):
+            if (len(self._retry_requests) > 0):
+                request: _EventChannelRequest = self._retry_requests.popleft()
+                request.retry_count += 1
+                self.resent_event_count += 1
+            else:
+                try:
+                    request: _EventChannelRequest = self._outgoing_events.get_nowait()
+                except queue.Empty:
+                    break
+                self.sent_event_count += 1
+
+            self._send(request, now)
+
+    #endregion
+
+    #region Private methods
+
+    def _connect (self) -> None:
+        self._socket = self._context.socket(zmq.DEALER)
+        self._socket.connect(self.address)
+        self._poller.register(self._socket, zmq.POLLIN)
+
+    def _send (self, request: _EventChannelRequest, now: float) -> None:
+        #A REP socket expects each request to start with an empty delimiter frame
+        #(which a REQ socket would add automatically)
+        self._socket.send_multipart([b'', request.payload])
+        request.sent_time = now
+        self._in_flight_requests.append(request)
+
+    def _reconnect (self, now: float) -> None:
+        #Replies to requests that were sent on the old socket can no longer be received, so
+        #every event that was in flight is sent again (in its original order) on the new socket.
+        #Open Ephys may already have received some of them, in which case they are echoed twice
+        #(the stimulus marker tracker ignores the repeated echoes).
+        unacknowledged_events: list[_EventChannelRequest] = [r for r in self._in_flight_requests if r.is_event]
+        self._retry_requests.extendleft(reversed(unacknowledged_events))
+        self._in_flight_requests.clear()
+
+        #Re-open the socket
+        self.close()
+        self._connect()
+        self.reconnect_count += 1
+
+        #Back off before sending again
+        self._next_send_time = now + self._reconnect_backoff_seconds
+        self._reconnect_backoff_seconds = min(2 * self._reconnect_backoff_seconds, OpenEphysEventChannel.RECONNECT_BACKOFF_MAX_SECONDS)
+
+    #endregion
@@ -0,0 +1,214 @@
+import re
+import json
+from dataclasses import dataclass
+
+#orjson is an optional dependency. It is much faster than the standard library's json
+#module, so it is used to parse headers whenever it is installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#A JSON number (integer or floating point)
+_NUMBER_PATTERN: bytes = rb'(-?[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)'
+
+#A looser pattern for numbers that is used inside of templates. The rest of the template pins
+#down where each number starts and ends, so this doesn't need to validate the number itself,
+#and it is considerably faster to match.
+_TEMPLATE_NUMBER_PATTERN: bytes = rb'([-+.0-9eE]+)'
+
+#A JSON key followed by a numeric value
+_NUMERIC_FIELD_REGEX: re.Pattern = re.compile(rb'"([^"\\]+)"\s*:\s*' + _NUMBER_PATTERN)
+
+@dataclass
+class OpenEphysMessageHeader:
+
+    message_num: int = 0
+    type: str = ""
+    timestamp: int = 0
+    stream_name: str = ""
+    channel_num: int = 0
+    num_samples: int = 0
+    sample_num: int = 0
+    sample_rate: float = 0
+
+    #The "content" object of the header. This is only filled in for messages that are
+    #not data messages (data messages are described entirely by the fields above).
+    content: dict = None
+
+@dataclass
+class _HeaderTemplate:
+
+    #A regular expression that matches headers with the same layout as the header that
+    #the template was built from, with a capture group for each numeric value
+    regex: re.Pattern = None
+
+    #The capture group number of each of the required data fields
+    message_num_group: int = 0
+    timestamp_group: int = 0
+    channel_num_group: int = 0
+    num_samples_group: int = 0
+    sample_num_group: int = 0
+    sample_rate_group: int = 0
+
+    #The name of the stream that the template belongs to
+    stream_name: str = ""
+
+class OpenEphysHeaderParser:
+    '''
+    Parses the JSON headers of messages from the Open Ephys ZMQ interface.
+
+    Open Ephys sends data messages whose headers all have the same layout: only
+    the numbers (message number, sample number, channel number, etc.) change from
+    one message to the next. The first time a data header is seen for a given
+    stream, it is fully parsed, and a template of its layout is cached. Later
+    headers that match a cached template have their numeric fields pulled out
+    with a single precompiled regular expression, which is much cheaper than
+    parsing the JSON with the standard library. Anything that does not match a
+    template is fully parsed.
+
+    When orjson is installed, fully parsing a header with orjson is faster than
+    the template fast path (see scripts/benchmark_header_parsing.py), so by
+    default the fast path is only used when orjson is not available.
+    '''
+
+    #region Constants
+
+    #The maximum number of header layouts that are cached
+    MAX_TEMPLATE_COUNT: int = 16
+
+    #The numeric fields that must be present in a data header for a template to be built from it
+    REQUIRED_DATA_FIELDS: tuple = ("message_num", "timestamp", "num_samples", "channel_num", "sample_num", "sample_rate")
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self, use_fast_path: bool = None, use_orjson: bool = None):
+
+        #Whether orjson (if it is installed) is used to fully parse headers
+        if (use_orjson is None):
+            use_orjson = True
+        self.use_orjson: bool = use_orjson and (orjson is not None)
+
+        #Whether cached templates are used to parse data headers
+        if (use_fast_path is None):
+            use_fast_path = not self.use_orjson
+        self.use_fast_path: bool = use_fast_path
+
+        #The number of headers parsed with a cached template, and the number that were fully parsed
+        self.fast_path_count: int = 0
+        self.full_parse_count: int = 0
+
+        #Private members
+        self._templates: list[_HeaderTemplate] = []
+
+    #endregion
+
+    #region Methods
+
+    def parse (self, raw_header: bytes) -> OpenEphysMessageHeader:
+        '''
+        Parses the header of a message. A ValueError is raised if the header is not valid JSON.
+        '''
+
+        #Try each of the cached templates
+        if (self.use_fast_path):
+            for template in self._templates:
+                match: re.Match = template.regex.fullmatch(raw_header)
+                if (match is not None):
+                    #A value that does not convert to its field's type (for example, a fractional
+                    #value in an integer field) is left to the full parse below
+                    try:
+                        header: OpenEphysMessageHeader = self._header_from_match(template, match)
+                    except ValueError:
+                        break
+
+                    self.fast_path_count += 1
+                    return header
+
+        #Fully parse the header
+        self.full_parse_count += 1
+        if (self.use_orjson):
+            d: dict = orjson.loads(raw_header)
+        else:
+            d: dict = json.loads(raw_header.decode('utf-8'))
+
+        header: OpenEphysMessageHeader = OpenEphysMessageHeader(
+            message_num = d.get('message_num', 0),
+            type = d.get('type', ""),
+            timestamp = d.get('timestamp', 0),
+            content = d.get('content', None))
+
+        if (header.type == 'data'):
+            c: dict = header.content
+            header.stream_name = c['stream']
+            header.channel_num = c['channel_num']
+            header.num_samples = c['num_samples']
+            header.sample_num = c['sample_num']
+            header.sample_rate = float(c['sample_rate'])
+            header.content = None
+
+            #Cache the layout of this header
+            if (self.use_fast_path) and (len(self._templates) < OpenEphysHeaderParser.MAX_TEMPLATE_COUNT):
+                template: _HeaderTemplate = self._build_template(raw_header, header.stream_name)
+                if (template is not None):
+                    self._templates.append(template)
+
+        return header
+
+    def clear_templates (self) -> None:
+        '''
+        Discards all cached header templates
+        '''
+
+        self._templates.clear()
+
+    #endregion
+
+    #region Private methods
+
+    def _build_template (self, raw_header: bytes, stream_name: str) -> _HeaderTemplate:
+        #Find every numeric value in the header
+        matches: list[re.Match] = list(_NUMERIC_FIELD_REGEX.finditer(raw_header))
+        keys: tuple = tuple(m.group(1).decode('utf-8') for m in matches)
+
+        #A template is only useful if all of the required fields are numeric values in the header.
+        #Keys must also be unique, otherwise we would not know which value belongs to which field.
+        if (len(set(keys)) != len(keys)):
+            return None
+        for field_name in OpenEphysHeaderParser.REQUIRED_DATA_FIELDS:
+            if (field_name not in keys):
+                return None
+
+        #Build a regular expression that matches the header exactly, except that each numeric value
+        #is replaced by a capture group
+        pattern: bytes = b""
+        position: int = 0
+        for m in matches:
+            pattern += re.escape(raw_header[position:m.start(2)]) + _TEMPLATE_NUMBER_PATTERN
+            position = m.end(2)
+        pattern += re.escape(raw_header[position:])
+
+        return _HeaderTemplate(
+            regex = re.compile(pattern),
+            stream_name = stream_name,
+            message_num_group = keys.index("message_num") + 1,
+            timestamp_group = keys.index("timestamp") + 1,
+            channel_num_group = keys.index("channel_num") + 1,
+            num_samples_group = keys.index("num_samples") + 1,
+            sample_num_group = keys.index("sample_num") + 1,
+            sample_rate_group = keys.index("sample_rate") + 1)
+
+    def _header_from_match (self, template: _HeaderTemplate, match: re.Match) -> OpenEphysMessageHeader:
+        return OpenEphysMessageHeader(
+            int(match.group(template.message_num_group)),
+            'data',
+            int(match.group(template.timestamp_group)),
+            template.stream_name,
+            int(match.group(template.channel_num_group)),
+            int(match.group(template.num_samples_group)),
+            int(match.group(template.sample_num_group)),
+            float(match.group(template.sample_rate_group)))
+
+    #endregion
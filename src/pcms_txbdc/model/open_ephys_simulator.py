@@ -0,0 +1,266 @@
+import zmq
+import json
+import time
+import math
+import threading
+import numpy as np
+
+#The default addresses that the simulator binds to. These are the same ports that the
+#Open Ephys ZMQ interface uses, so the application can connect to the simulator unchanged.
+DEFAULT_SIMULATOR_DATA_ADDRESS: str = "tcp://*:5556"
+DEFAULT_SIMULATOR_EVENT_ADDRESS: str = "tcp://*:5557"
+
+class OpenEphysSimulator (object):
+    '''
+    A stand-in for the Open Ephys GUI's ZMQ interface, for exercising the
+    streamer and background worker without any acquisition hardware.
+
+    Data messages are published in real time on a PUB socket, one message per
+    channel per block, using the same multi-part layout and header schema as
+    Open Ephys. A TTL event message is published periodically, and a "param"
+    message is published when the simulator starts. Heartbeat and event
+    requests on the REP socket are answered the way Open Ephys answers them,
+    and each requested event is echoed back on the data socket as a TTL event
+    on the requested line, stamped with the sample number at which it arrived
+    (the requested sample number is reported alongside it).
+
+    Jitter (a random delay added to the send time of each block) and drops
+    (blocks that are randomly never sent) can be injected to test how the
+    application copes with an imperfect network.
+    '''
+
+    #region Constants
+
+    #The length (in seconds) of the pre-generated signal that the simulator loops over
+    SIGNAL_LOOP_DURATION_SECONDS: float = 10.0
+
+    #The values used for TTL events
+    EVENT_TYPE_TTL: int = 3
+    EVENT_SOURCE_NODE: int = 100
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self,
+        channel_count: int = 2,
+        samples_per_block: int = 64,
+        sample_rate: float = 5000.0,
+        stream_name: str = "Simulated Data",
+        jitter_ms: float = 0.0,
+        drop_probability: float = 0.0,
+        event_interval_seconds: float = 1.0,
+        data_address: str = DEFAULT_SIMULATOR_DATA_ADDRESS,
+        event_address: str = DEFAULT_SIMULATOR_EVENT_ADDRESS,
+        seed: int = None):
+
+        #Store the configuration of the simulator
+        self.channel_count: int = channel_count
+        self.samples_per_block: int = samples_per_block
+        self.sample_rate: float = sample_rate
+        self.stream_name: str = stream_name
+        self.jitter_ms: float = jitter_ms
+        self.drop_probability: float = drop_probability
+        self.event_interval_seconds: float = event_interval_seconds
+        self.data_address: str = data_address
+        self.event_address: str = event_address
+
+        #Counters
+        self.sent_block_count: int = 0
+        self.dropped_block_count: int = 0
+        self.sent_event_count: int = 0
+        self.received_request_count: int = 0
+
+        #Private members
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+        self._signal: np.ndarray = self._generate_signal()
+        self._message_num: int = 0
+        self._should_stop: bool = False
+        self._thread: threading.Thread = None
+
+    #endregion
+
+    #region Methods
+
+    def start (self) -> None:
+        '''
+        Starts publishing data on a background thread
+        '''
+
+        self._should_stop = False
+        self._thread = threading.Thread(target = self.run, name = "OpenEphysSimulator", daemon = True)
+        self._thread.start()
+
+    def stop (self) -> None:
+        '''
+        Stops publishing data and waits for the background thread to finish
+        '''
+
+        self._should_stop = True
+        if (self._thread is not None):
+            self._thread.join()
+            self._thread = None
+
+    def run (self) -> None:
+        '''
+        Publishes data until stop() is called. This is run on a background thread
+        by start(), but it may also be called directly.
+        '''
+
+        context: zmq.Context = zmq.Context()
+        data_socket: zmq.Socket = context.socket(zmq.PUB)
+        data_socket.bind(self.data_address)
+        event_socket: zmq.Socket = context.socket(zmq.REP)
+        event_socket.bind(self.event_address)
+
+        poller: zmq.Poller = zmq.Poller()
+        poller.register(event_socket, zmq.POLLIN)
+
+        #Tell subscribers about the stream
+        self._send_param_message(data_socket)
+
+        block_period: float = self.samples_per_block / self.sample_rate
+        event_interval_sample_count: int = max(1, int(self.event_interval_seconds * self.sample_rate))
+        sample_num: int = 0
+        next_event_sample_num: int = event_interval_sample_count
+        next_block_time: float = time.perf_counter()
+        next_block_send_time: float = next_block_time
+
+        while (not self._should_stop):
+            current_time: float = time.perf_counter()
+
+            if (current_time >= next_block_send_time):
+                #Send the next block of data on every channel
+                self._send_data_block(data_socket, sample_num)
+                sample_num += self.samples_per_block
+
+                #Send a TTL event if it is time to do so
+                if (sample_num >= next_event_sample_num):
+                    self._send_event_message(data_socket, next_event_sample_num)
+                    next_event_sample_num += event_interval_sample_count
+
+                #Schedule the next block. Jitter delays individual blocks, but it does not accumulate.
+                next_block_time += block_period
+                next_block_send_time = next_block_time
+                if (self.jitter_ms > 0):
+                    next_block_send_time += self._rng.uniform(0, self.jitter_ms) / 1000.0
+            else:
+                #Answer any requests while waiting for the next block to be due
+                timeout_ms: int = max(0, int(math.ceil((next_block_send_time - current_time) * 1000)))
+                socks = dict(poller.poll(timeout_ms))
+                if event_socket in socks:
+                    self._handle_request(event_socket, data_socket, sample_num)
+
+        data_socket.close(linger = 0)
+        event_socket.close(linger = 0)
+        context.term()
+
+    #endregion
+
+    #region Private methods
+
+    def _generate_signal (self) -> np.ndarray:
+        #Generate noise with periodic bursts of activity on each channel, so that the
+        #differential EMG derivations look roughly like EMG
+        sample_count: int = int(OpenEphysSimulator.SIGNAL_LOOP_DURATION_SECONDS * self.sample_rate)
+        sample_count = max(self.samples_per_block, sample_count - (sample_count % self.samples_per_block))
+        t: np.ndarray = np.arange(0, sample_count) / self.sample_rate
+        envelope: np.ndarray = 10.0 + 90.0 * (np.sin(2 * np.pi * 0.5 * t) > 0.8)
+        signal: np.ndarray = self._rng.normal(0, 1, (self.channel_count, sample_count)) * envelope
+
+        return signal.astype(np.float32)
+
+    def _next_message_num (self) -> int:
+        self._message_num += 1
+        return self._message_num
+
+    def _send_data_block (self, data_socket: zmq.Socket, sample_num: int) -> None:
+        loop_position: int = sample_num % self._signal.shape[1]
+        timestamp: int = int(math.floor(time.time() * 1000))
+
+        for channel_num in range(0, self.channel_count):
+            #Randomly drop blocks
+            if (self.drop_probability > 0) and (self._rng.random() < self.drop_probability):
+                self.dropped_block_count += 1
+                continue
+
+            payload: bytes = self._signal[channel_num, loop_position:(loop_position + self.samples_per_block)].tobytes()
+            header: dict = {
+                'message_num': self._next_message_num(),
+                'type': 'data',
+                'content': {
+                    'stream': self.stream_name,
+                    'channel_num': channel_num,
+                    'num_samples': self.samples_per_block,
+                    'sample_num': sample_num,
+                    'sample_rate': self.sample_rate
+                },
+                'data_size': len(payload),
+                'timestamp': timestamp
+            }
+
+            data_socket.send_multipart([b'data', json.dumps(header).encode('utf-8'), payload])
+            self.sent_block_count += 1
+
+    def _send_event_message (self, data_socket: zmq.Socket, sample_num: int, line: int = None, requested_sample_num: int = None) -> None:
+        content: dict = {
+            'stream': self.stream_name,
+            'source_node': OpenEphysSimulator.EVENT_SOURCE_NODE,
+            'type': OpenEphysSimulator.EVENT_TYPE_TTL,
+            'sample_num': sample_num
+        }
+        if (line is not None):
+            content['line'] = line
+            content['state'] = 1
+        if (requested_sample_num is not None):
+            content['requested_sample_num'] = requested_sample_num
+
+        header: dict = {
+            'message_num': self._next_message_num(),
+            'type': 'event',
+            'content': content,
+            'data_size': 0,
+            'timestamp': int(math.floor(time.time() * 1000))
+        }
+
+        data_socket.send_multipart([b'event', json.dumps(header).encode('utf-8')])
+        self.sent_event_count += 1
+
+    def _send_param_message (self, data_socket: zmq.Socket) -> None:
+        header: dict = {
+            'message_num': self._next_message_num(),
+            'type': 'param',
+            'content': {
+                'stream': self.stream_name,
+                'sample_rate': self.sample_rate
+            },
+            'data_size': 0,
+            'timestamp': int(math.floor(time.time() * 1000))
+        }
+
+        data_socket.send_multipart([b'param', json.dumps(header).encode('utf-8')])
+
+    def _handle_request (self, event_socket: zmq.Socket, data_socket: zmq.Socket, sample_num: int) -> None:
+        message: bytes = event_socket.recv()
+        self.received_request_count += 1
+
+        try:
+            request: dict = json.loads(message.decode('utf-8'))
+            request_type: str = request.get('type', "")
+        except ValueError:
+            request: dict = {}
+            request_type: str = ""
+
+        if (request_type == 'heartbeat'):
+            event_socket.send(b'heartbeat received')
+        elif (request_type == 'event'):
+            event_socket.send(b'event received')
+
+            #Echo the event the way Open Ephys does: as a TTL event on the requested line, stamped
+            #with the sample number at which the request arrived (not the one in the request)
+            event: dict = request.get('event', {})
+            self._send_event_message(data_socket, sample_num, event.get('event_channel', 0), event.get('sample_num', -1))
+        else:
+            event_socket.send(b'unknown request')
+
+    #endregion
@@ -1,18 +1,38 @@
 import zmq
-import sys
 import numpy as np
-import json
 import uuid
 import time
 import math
-from typing import Tuple
 
 from dataclasses import dataclass, field
 
 from .emg_data_filter import EmgDataFilter
+from .open_ephys_header_parser import OpenEphysHeaderParser, OpenEphysMessageHeader
+from .latency_metrics import LatencyMetrics
+from .open_ephys_event_channel import OpenEphysEventChannel
 
-OPEN_EPHYS_EXPECTED_CHANNEL_COUNT: int = 2
-CHANNEL_SHOWN: int = 0
+#The Open Ephys channels that are subscribed to by default. Consecutive pairs of channels
+#(in ascending order) form the differential EMG derivations, so to record from more muscles,
+#add more pairs of channels to this list.
+DEFAULT_SUBSCRIBED_CHANNELS: list[int] = [0, 1]
+
+#The default addresses of the Open Ephys ZMQ interface's data (PUB) and event (REP) sockets
+DEFAULT_DATA_ADDRESS: str = "tcp://localhost:5556"
+DEFAULT_EVENT_ADDRESS: str = "tcp://localhost:5557"
+
+#The maximum amount of time (in milliseconds) to wait for a message from Open Ephys. This bounds
+#how long the receive loop takes to notice that it has been cancelled, and how often incomplete
+#frames are checked for expiry while no data is arriving.
+POLL_TIMEOUT_MS: int = 20
+
+#The maximum number of messages that are received from the data socket in a single batch
+MAX_MESSAGES_PER_BATCH: int = 1000
+
+#The event type that Open Ephys uses for TTL events
+EVENT_TYPE_TTL: int = 3
+
+#The event channel on which stimulus events are sent to Open Ephys
+STIMULUS_EVENT_CHANNEL: int = 1
 
 @dataclass
 class OpenEphysDataBlock:
@@ -26,6 +46,29 @@ class OpenEphysDataBlock:
     sample_rate: float = 0
     data: np.ndarray = field(default_factory=lambda: np.array([], dtype=np.float32))
 
+@dataclass
+class OpenEphysEvent:
+
+    timestamp: int = 0
+    timestamp_received_millis: int = 0
+    stream_name: str = ""
+    source_node: int = 0
+    event_type: int = 0
+    sample_num: int = 0
+
+    #The TTL line of the event (-1 if it has none), and whether the line went high or low.
+    #When Open Ephys echoes an event that this application sent, the line is the event channel it was sent on.
+    line: int = -1
+    state: bool = True
+
+    #For an event that this application sent, the sample number that was requested when it was sent
+    #(-1 if it is not known). Open Ephys stamps the echoed event with its own sample number, and
+    #reports the requested one in the event's "requested_sample_num" content field.
+    requested_sample_num: int = -1
+
+    #The full "content" object of the event's header
+    content: dict = None
+
 @dataclass
 class OpenEphysDataFrame:
     timestamp: int = 0
@@ -33,21 +76,70 @@ class OpenEphysDataFrame:
     channel_data_blocks: list[OpenEphysDataBlock] = field(default_factory=lambda: [])
     timestamp_emitted: int = 0
 
+    #The time (in milliseconds, with sub-millisecond precision) at which the frame was delivered
+    #to the UI thread. This is set by the receiver of the frame, and is only used for measuring latency.
+    timestamp_delivered: float = 0
+
+    #A (channel count, sample count) array that holds the samples of every channel in this frame,
+    #in order of channel index. When this is present, the "data" of each channel data block is
+    #a view of its row in this array.
+    channel_data: np.ndarray = None
+
+    #The events that were received from Open Ephys since the previous frame was emitted
+    events: list[OpenEphysEvent] = field(default_factory=lambda: [])
+
     #The following data members are CALCULATED, and thus are NOT initialized with data upon
-    #construction of the object
-    diff_data_block: np.ndarray = field(default_factory=lambda: np.array([], dtype=np.float32))
-    filtered_data_block: np.ndarray = field(default_factory=lambda: np.array([], dtype=np.float32))
-    abs_data_block: np.ndarray = field(default_factory=lambda: np.array([], dtype=np.float32))
+    #construction of the object. Each of them has one row per differential derivation.
+    diff_data_block: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    filtered_data_block: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+    abs_data_block: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+
+    #region Properties
+
+    @property
+    def derivation_count (self) -> int:
+        '''
+        The number of differential derivations (pairs of channels) in this frame
+        '''
+
+        return len(self.channel_data_blocks) // 2
+
+    @property
+    def num_samples (self) -> int:
+        '''
+        The number of samples of each channel in this frame
+        '''
+
+        if (len(self.channel_data_blocks) == 0):
+            return 0
+        return self.channel_data_blocks[0].num_samples
+
+    #endregion
 
     #region Public methods
 
-    def calculate_fields (self) -> None:
-        if (len(self.channel_data_blocks) >= 2):
+    def calculate_fields (self, emg_filter: EmgDataFilter) -> None:
+        '''
+        Calculates the differential, filtered, and absolute-valued data for each
+        derivation. Derivation k is the difference between the channel blocks at
+        index 2k+1 and 2k (the channel blocks are kept in order of channel index).
+        The filter bank must have one channel per derivation.
+        '''
+
+        derivation_count: int = self.derivation_count
+        if (derivation_count >= 1):
+            #Gather the data from all channels into a single (channel count, sample count) array.
+            #The frame assembler normally does this already, in which case no copy is needed.
+            if (self.channel_data is not None):
+                channel_data: np.ndarray = self.channel_data
+            else:
+                channel_data: np.ndarray = np.stack([b.data for b in self.channel_data_blocks])
+
             #Do the differential subtraction
-            self.diff_data_block = self.channel_data_blocks[1].data - self.channel_data_blocks[0].data
+            self.diff_data_block = channel_data[1:(2 * derivation_count):2] - channel_data[0:(2 * derivation_count):2]
 
             #Now filter the data
-            self.filtered_data_block = EmgDataFilter.filter(self.diff_data_block)
+            self.filtered_data_block = emg_filter.filter(self.diff_data_block)
 
             #Now take the absolute value of the data
             self.abs_data_block = np.abs(self.filtered_data_block)
@@ -58,226 +150,231 @@ class OpenEphysStreamer (object):
 
     #region Constructor
 
-    def __init__(self, ):
+    def __init__(self, 
+        subscribed_channels: list[int] = None, 
+        data_address: str = DEFAULT_DATA_ADDRESS, 
+        event_address: str = DEFAULT_EVENT_ADDRESS):
+
+        #The set of channels for which data is received. Data for all other channels is ignored.
+        if (subscribed_channels is None):
+            subscribed_channels = DEFAULT_SUBSCRIBED_CHANNELS
+        self.subscribed_channels: set[int] = set(subscribed_channels)
+
+        #The addresses of the Open Ephys data and event sockets
+        self.data_address: str = data_address
+        self.event_address: str = event_address
+
         self.context = zmq.Context()
+        self.header_parser = OpenEphysHeaderParser()
         self.data_socket = None
-        self.event_socket = None
         self.poller = zmq.Poller()
         self.message_num = -1
-        self.socket_waits_reply = False
-        self.event_no = 0
         self.app_name = 'TxBDC PCMS'
         self.uuid = str(uuid.uuid4())
-        self.last_heartbeat_time = 0
-        self.last_reply_time = time.time()
         self.isTesting = True
 
+        #The channel through which heartbeats and events are sent to Open Ephys. Any thread may
+        #queue an event (see queue_event). The events are sent by the thread that receives data.
+        self.event_channel: OpenEphysEventChannel = OpenEphysEventChannel(self.context, self.event_address, self.app_name, self.uuid)
+
+        #Events that have been received from Open Ephys, but not yet collected (see take_received_events)
+        self._received_events: list[OpenEphysEvent] = []
+
     #endregion
 
     #region Methods
 
-    def send_heartbeat(self):
+    def send_event(self, event_list=None, event_type=EVENT_TYPE_TTL, sample_num=0, event_id=2, event_channel=1):
         '''
-        This method sends a heartbeat signal to the OpenEphys application
-        so that it knows we still exist.
+        This method queues an event (or each event in event_list) to be sent to the OpenEphys application.
         '''
 
-        #Compose the message
-        d = {'application': self.app_name,
-             'uuid': self.uuid,
-             'type': 'heartbeat'}
-        j_msg = json.dumps(d)
+        if event_list:
+            #Iterate over the event list, and queue each event in the list
+            for e in event_list:
+                self.queue_event(e['sample_num'], e['event_channel'], e['event_id'], e['event_type'])
+        else:
+            #If there is only a single event to send...
+            self.queue_event(sample_num, event_channel, event_id, event_type)
 
-        #Send the message
-        self.event_socket.send(j_msg.encode('utf-8'))
-        self.last_heartbeat_time = time.time()
-        self.socket_waits_reply = True
-
-    def send_event(self, event_list=None, event_type=3, sample_num=0, event_id=2, event_channel=1):
+    def queue_event (self, sample_num: int, event_channel: int = STIMULUS_EVENT_CHANNEL, event_id: int = 1, event_type: int = EVENT_TYPE_TTL) -> None:
         '''
-        This method composes a message for a specific event and sends the event to the OpenEphys application.
+        Queues an event to be sent to Open Ephys. This may be called from any thread,
+        and it never blocks: the event is sent by the receive loop, and is re-sent
+        if Open Ephys does not acknowledge it.
         '''
 
-        #Check to see if we are currently waiting for a reply from OpenEphys
-        if not self.socket_waits_reply:
-            #If we are not waiting for a reply...
-
-            #Check to see if there are events in the event_list to send
-            self.event_no += 1
-            if event_list:
-                #Iterate over the event list
-                for e in event_list:
-                    #Send each event in the event list
-                    self.send_event(event_type=e['event_type'],
-                                    sample_num=e['sample_num'],
-                                    event_id=e['event_id'],
-                                    event_channel=e['event_channel'])
-            else:
-                #If there is only a single event to send...
+        self.event_channel.queue_event(sample_num, event_channel, event_id, event_type)
 
-                #Compose the event message
-                de = {'type': event_type, 'sample_num': sample_num,
-                      'event_id': event_id % 2 + 1,
-                      'event_channel': event_channel}
-
-                d = {'application': self.app_name,
-                     'uuid': self.uuid,
-                     'type': 'event',
-                     'event': de}
-
-                j_msg = json.dumps(d)
+    def take_received_events (self) -> list[OpenEphysEvent]:
+        '''
+        Returns the events that have been received from Open Ephys since this was last called
+        '''
 
-                #Send the event message
-                if not self.socket_waits_reply:
-                    self.event_socket.send(j_msg.encode('utf-8'), 0)
-            self.socket_waits_reply = True
-            self.last_reply_time = time.time()
+        events: list[OpenEphysEvent] = self._received_events
+        self._received_events = []
+        return events
 
     def initialize (self) -> None:
         if not self.data_socket:
             #Initialize the data socket and the event socket
             self.data_socket = self.context.socket(zmq.SUB)
-            self.data_socket.connect("tcp://localhost:5556")
-
-            self.event_socket = self.context.socket(zmq.REQ)
-            self.event_socket.connect("tcp://localhost:5557")
+            self.data_socket.connect(self.data_address)
 
             self.data_socket.setsockopt(zmq.SUBSCRIBE, b'')
             self.poller.register(self.data_socket, zmq.POLLIN)
-            self.poller.register(self.event_socket, zmq.POLLIN)
-
-    def callback(self) -> OpenEphysDataBlock:
-        #Check to see if more than 2 seconds has passed since the last "heartbeat" message
-        if (time.time() - self.last_heartbeat_time) > 2.:
-            #Make sure we aren't currently waiting on a reply from a prior heartbeat message
-            if self.socket_waits_reply:
-                #We will try again...
-                self.last_heartbeat_time += 1.
-
-                #But if too much time has passed...
-                if (time.time() - self.last_reply_time) > 10.:
-                    # reconnecting the socket as per
-                    # the "lazy pirate" pattern (see the ZeroMQ guide)
-                    self.poller.unregister(self.event_socket)
-                    self.event_socket.close()
-                    self.event_socket = self.context.socket(zmq.REQ)
-                    self.event_socket.connect("tcp://localhost:5557")
-                    self.poller.register(self.event_socket)
-                    self.socket_waits_reply = False
-                    self.last_reply_time = time.time()
-            else:
-                #If we are not waiting for a reply from a prior heartbeat message, and
-                #more than 2 seconds has passed since the last heartbeat message that we
-                #sent, then it is time to send a new heartbeat message.
-                self.send_heartbeat()
 
-        #Get the sockets
-        socks = dict(self.poller.poll(1))
+            #Open the event channel. Its socket is registered with the same poller.
+            self.event_channel.open(self.poller)
+
+    def receive_data_blocks (self) -> list[OpenEphysDataBlock]:
+        '''
+        Waits (for at most POLL_TIMEOUT_MS milliseconds) for messages from Open Ephys,
+        and then receives every message that is waiting. Returns a list of the data
+        blocks that were received, which is empty if no data arrived before the timeout.
+        '''
+
+        #Receive replies from Open Ephys's event socket, and send any heartbeats and events that are waiting
+        self.event_channel.service()
+
+        #Block until one of the sockets has a message waiting, or until the timeout elapses
+        socks = dict(self.poller.poll(POLL_TIMEOUT_MS))
         if not socks:
-            return None
+            return []
+
+        received_blocks: list[OpenEphysDataBlock] = []
 
         #Get the data socket
         if self.data_socket in socks:
-            #Retrieve a multi-part message
-            try:
-                message = self.data_socket.recv_multipart(zmq.NOBLOCK)
-            except zmq.ZMQError as err:
-                return None
-
-            #Check to see if we have a message that was received
-            if message:
-
-                #Commenting this out since I don't think we need this.
-                #if len(message) < 2:
-                #    print("no frames for message: ", message[0])
-                
-                #Decode the message
+            drain_start_time: float = time.perf_counter()
+
+            #Drain all of the messages that are waiting on the data socket. The number of
+            #messages taken at once is capped so that a long burst can't starve the caller.
+            for i in range(0, MAX_MESSAGES_PER_BATCH):
+                #Retrieve a multi-part message. The message parts are received as ZMQ frames
+                #rather than being copied into bytes objects, so that the data payload can be
+                #read directly out of ZMQ's buffer.
                 try:
-                    header = json.loads(message[1].decode('utf-8'))
-                except ValueError as e:
-                    pass
-                    #print("ValueError: ", e)
-                    #print(message[1])
-                
-                #Commenting this out since I don't this we need this.
-                #if self.message_num != -1 and header['message_num'] != self.message_num + 1:
-                #    print("missing a message at number", self.message_num)
-                
-                #Get the message number
-                self.message_num = header['message_num']
-
-                #Check to see if the header type is "data"
-                if header['type'] == 'data':
-                    c = header['content']
-                    timestamp = header['timestamp']
-                    num_samples = c['num_samples']
-                    channel_num = c['channel_num']
-                    sample_id = c['sample_num']
-                    sample_rate = c['sample_rate']
-                    stream_name = c['stream']
-
-                    # Check which channel the data is coming from
-                    if channel_num == OpenEphysStreamer.CHANNEL_SHOWN:
-
-                        #Get the data from the message
-                        try:
-                            n_arr = np.frombuffer(message[2], dtype=np.float32)
-                            n_arr = np.reshape(n_arr, num_samples)
-
-                            #If there were samples in the data
-                            if num_samples > 0:
-
-                                #Calculate a millisecond timestamp for when our application received this data
-                                ts_received: int = int(math.floor(time.time() * 1000))
-
-                                #Package the received data into a structure that we will return to the caller
-                                received_data: OpenEphysDataBlock = OpenEphysDataBlock(
-                                    timestamp, ts_received, channel_num, stream_name, num_samples, sample_id, sample_rate, n_arr)
-
-                                #Update the UI
-                                return received_data
-
-                        except IndexError as e:
-                            #print(e)
-                            #print(header)
-                            #print(message[1])
-                            #if len(message) > 2:
-                            #    print(len(message[2]))
-                            #else:
-                            #    print("only one frame???")
-                            pass
-
-                elif header['type'] == 'event':
-
-                    #We will not handle this message type
-                    pass
+                    message = self.data_socket.recv_multipart(zmq.NOBLOCK, copy = False)
+                except zmq.Again:
+                    #There are no more messages waiting
+                    break
+                except zmq.ZMQError as err:
+                    break
+
+                #Check to see if we have a message that was received
+                if message:
+                    received_data: OpenEphysDataBlock = self._handle_data_socket_message(message)
+                    if (received_data is not None):
+                        received_blocks.append(received_data)
+
+            #Record how long it took to receive and decode this batch of messages
+            if (len(received_blocks) > 0):
+                LatencyMetrics.record(LatencyMetrics.INGEST, time.perf_counter() - drain_start_time)
+
+        #Replies on the event socket are received by the event channel the next time it is serviced
+        return received_blocks
+
+    #endregion
 
-                elif header['type'] == 'spike':
+    #region Private methods
 
-                    #We will not handle this message type
+    def _handle_data_socket_message (self, message: list[zmq.Frame]) -> OpenEphysDataBlock:
+        '''
+        Handles a single message from the data socket. If the message contains data
+        for a subscribed channel, the data block is returned. Otherwise, None is returned.
+        '''
+
+        #Commenting this out since I don't think we need this.
+        #if len(message) < 2:
+        #    print("no frames for message: ", message[0])
+        
+        #Decode the message header. Data headers all share the same layout, so the
+        #header parser caches that layout rather than decoding every header from scratch.
+        try:
+            header: OpenEphysMessageHeader = self.header_parser.parse(message[1].bytes)
+        except (ValueError, IndexError) as e:
+            #print("ValueError: ", e)
+            #print(message[1])
+            return None
+        
+        #Commenting this out since I don't this we need this.
+        #if self.message_num != -1 and header['message_num'] != self.message_num + 1:
+        #    print("missing a message at number", self.message_num)
+        
+        #Get the message number
+        self.message_num = header.message_num
+
+        #Check to see if the header type is "data"
+        if header.type == 'data':
+            timestamp = header.timestamp
+            num_samples = header.num_samples
+            channel_num = header.channel_num
+            sample_id = header.sample_num
+            sample_rate = header.sample_rate
+            stream_name = header.stream_name
+
+            # Check whether we are subscribed to the channel the data is coming from
+            if channel_num in self.subscribed_channels:
+
+                #Get the data from the message. This is a read-only view of the ZMQ frame's
+                #buffer (the view keeps the frame alive), so the samples are not copied here.
+                #They are copied exactly once, when the frame assembler places them into a frame.
+                try:
+                    n_arr = np.frombuffer(message[2].buffer, dtype=np.float32)
+                    n_arr = np.reshape(n_arr, num_samples)
+
+                    #If there were samples in the data
+                    if num_samples > 0:
+
+                        #Calculate a millisecond timestamp for when our application received this data
+                        ts_received: int = int(math.floor(time.time() * 1000))
+
+                        #Package the received data into a structure that we will return to the caller
+                        received_data: OpenEphysDataBlock = OpenEphysDataBlock(
+                            timestamp, ts_received, channel_num, stream_name, num_samples, sample_id, sample_rate, n_arr)
+
+                        #Return the data block to the caller
+                        return received_data
+
+                except IndexError as e:
+                    #print(e)
+                    #print(header)
+                    #print(message[1])
+                    #if len(message) > 2:
+                    #    print(len(message[2]))
+                    #else:
+                    #    print("only one frame???")
                     pass
 
-                elif header['type'] == 'param':
-                    c = header['content']
-                    self.__dict__.update(c)
-                    
-                    #print(c)
-                else:
-                    raise ValueError("message type unknown")
-            else:
-                #print("got not data")
-                return None
-        elif self.event_socket in socks and self.socket_waits_reply:
-            #If we are waiting for a reply on the event socket...
-
-            #Retrieve any messages
-            message = self.event_socket.recv()
-            #print("event reply received")
-            #print(message)
-
-            #Set the socket_waits_reply flag to false
-            if self.socket_waits_reply:
-                self.socket_waits_reply = False
+        elif header.type == 'event':
+
+            #Keep the event so that it can be passed along with the next frame of data
+            c: dict = header.content if (header.content is not None) else {}
+            self._received_events.append(OpenEphysEvent(
+                timestamp = header.timestamp,
+                timestamp_received_millis = int(math.floor(time.time() * 1000)),
+                stream_name = c.get('stream', ""),
+                source_node = c.get('source_node', 0),
+                event_type = c.get('type', 0),
+                sample_num = c.get('sample_num', 0),
+                line = c.get('line', c.get('event_channel', -1)),
+                state = bool(c.get('state', True)),
+                requested_sample_num = c.get('requested_sample_num', -1),
+                content = c))
+
+        elif header.type == 'spike':
+
+            #We will not handle this message type
+            pass
+
+        elif header.type == 'param':
+            c = header.content
+            self.__dict__.update(c)
+            
+            #print(c)
+        else:
+            raise ValueError("message type unknown")
 
         return None
 
@@ -0,0 +1,207 @@
+from datetime import datetime
+from typing import BinaryIO
+import io
+import queue
+import threading
+import numpy as np
+
+from .fileio_helpers import FileIO_Helpers
+from .open_ephys_streamer import OpenEphysDataFrame
+
+class RawEmgRecorder:
+    '''
+    Records every frame of raw EMG data received during a session to a file.
+
+    Frames are handed to the recorder through a bounded queue, and a dedicated
+    writer thread appends them to the file. The writer thread serializes all of
+    the frames that are waiting into one buffer and writes that buffer with a
+    single call, so the file is written in large pieces. Submitting a frame never
+    blocks: if the writer falls too far behind, new frames are dropped and counted.
+    A frame that cannot be serialized is also dropped and counted, so a single bad
+    frame never stops the recording.
+
+    The file starts with a header, which is followed by one chunk per frame
+    (see RawEmgRecordingData for the layout).
+    '''
+
+    #region Constants
+
+    #The version of the file format
+    FILE_VERSION: int = 1
+
+    #The maximum number of frames that may be waiting to be written
+    MAX_QUEUED_FRAMES: int = 5000
+
+    #The size (in bytes) of the file's write buffer
+    WRITE_BUFFER_SIZE: int = 1024 * 1024
+
+    #The maximum amount of time (in seconds) that "stop" waits for the writer thread
+    STOP_TIMEOUT_SECONDS: float = 10.0
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self, file_path: str, subject_id: str, channels: list[int]):
+
+        #Store the recording details
+        self.file_path: str = file_path
+        self.subject_id: str = subject_id
+        self.channels: list[int] = sorted(channels)
+
+        #Counters. The number of recorded frames is only changed by the writer thread. Dropped frames
+        #are counted by both the thread that submits frames and the writer thread, under a lock.
+        self.recorded_frame_count: int = 0
+        self.dropped_frame_count: int = 0
+
+        #Private members
+        self._counter_lock: threading.Lock = threading.Lock()
+        self._frame_queue: queue.Queue = queue.Queue(maxsize = RawEmgRecorder.MAX_QUEUED_FRAMES)
+        self._fid: BinaryIO = None
+        self._writer_thread: threading.Thread = None
+
+    #endregion
+
+    #region Methods
+
+    def start (self) -> None:
+        '''
+        Opens the file, writes the file header, and starts the writer thread
+        '''
+
+        self._fid = open(self.file_path, "wb", buffering = RawEmgRecorder.WRITE_BUFFER_SIZE)
+        self._write_file_header()
+
+        self._writer_thread = threading.Thread(target = self._run_writer_thread, name = "RawEmgRecorder", daemon = True)
+        self._writer_thread.start()
+
+    def submit (self, data_frame: OpenEphysDataFrame) -> None:
+        '''
+        Queues a frame to be written to the file. This never blocks the caller.
+        '''
+
+        try:
+            self._frame_queue.put_nowait(data_frame)
+        except queue.Full:
+            self._count_dropped_frame()
+
+    def stop (self) -> None:
+        '''
+        Writes any frames that are still waiting, stops the writer thread, and closes the file
+        '''
+
+        if (self._writer_thread is not None):
+            #A value of None tells the writer thread to exit once it has written everything before it.
+            #The queue is only full for long if the writer thread has stopped, so do not wait forever.
+            try:
+                self._frame_queue.put(None, timeout = RawEmgRecorder.STOP_TIMEOUT_SECONDS)
+            except queue.Full:
+                print("Raw EMG writer thread is not responding")
+
+            self._writer_thread.join(timeout = RawEmgRecorder.STOP_TIMEOUT_SECONDS)
+            self._writer_thread = None
+
+        if (self._fid is not None):
+            self._fid.close()
+            self._fid = None
+
+    #endregion
+
+    #region Private methods
+
+    def _write_file_header (self) -> None:
+        #Save the file version
+        FileIO_Helpers.write(self._fid, "int32", RawEmgRecorder.FILE_VERSION)
+
+        #Save the subject id
+        FileIO_Helpers.write_string(self._fid, self.subject_id)
+
+        #Save the recording date/time
+        FileIO_Helpers.write_datetime(self._fid, datetime.now())
+
+        #Save the channels that are recorded
+        FileIO_Helpers.write(self._fid, "int32", len(self.channels))
+        FileIO_Helpers.write_array(self._fid, "int32", self.channels)
+
+    def _run_writer_thread (self) -> None:
+        '''
+        This is the code executed by the writer thread
+        '''
+
+        should_exit: bool = False
+        while (not should_exit):
+            #Wait for a frame, and then take every other frame that is already waiting
+            frames: list[OpenEphysDataFrame] = [self._frame_queue.get()]
+            while (True):
+                try:
+                    frames.append(self._frame_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            #Serialize the frames into a single buffer
+            buffer: io.BytesIO = io.BytesIO()
+            for data_frame in frames:
+                if (data_frame is None):
+                    should_exit = True
+                    break
+
+                #If a frame cannot be serialized, discard whatever part of it was written and move on
+                chunk_start: int = buffer.tell()
+                try:
+                    self._write_chunk(buffer, data_frame)
+                    self.recorded_frame_count += 1
+                except Exception as e:
+                    print(f"Error serializing raw EMG frame: {e}")
+                    buffer.seek(chunk_start)
+                    buffer.truncate()
+                    self._count_dropped_frame()
+
+            #Write the buffer to the file
+            try:
+                self._fid.write(buffer.getbuffer())
+            except (OSError, ValueError) as e:
+                print(f"Error writing raw EMG data: {e}")
+
+        try:
+            self._fid.flush()
+        except (OSError, ValueError) as e:
+            print(f"Error writing raw EMG data: {e}")
+
+    def _count_dropped_frame (self) -> None:
+        with self._counter_lock:
+            self.dropped_frame_count += 1
+
+    def _write_chunk (self, buffer: BinaryIO, data_frame: OpenEphysDataFrame) -> None:
+        #Put the blocks in channel order, to match the order of the channels in the file header
+        blocks: list = sorted(data_frame.channel_data_blocks, key = lambda b: b.channel_index)
+
+        #Gather the samples of every channel into a (channel count, sample count) array
+        if (data_frame.channel_data is not None):
+            channel_data: np.ndarray = data_frame.channel_data
+        else:
+            channel_data: np.ndarray = np.stack([b.data for b in blocks])
+
+        #Every row of samples must have a matching block, or the chunk could not be read back
+        if (channel_data.shape[0] != len(blocks)):
+            raise ValueError(f"frame has {len(blocks)} blocks but {channel_data.shape[0]} channels of data")
+
+        #Save the sample number and Open Ephys timestamp of the frame
+        FileIO_Helpers.write(buffer, "int64", data_frame.sample_id)
+        FileIO_Helpers.write(buffer, "int64", data_frame.timestamp)
+
+        #Save the channels in this chunk. These can be a subset of the channels in the
+        #file header if a channel's data was missing from the frame.
+        FileIO_Helpers.write(buffer, "int32", len(blocks))
+        FileIO_Helpers.write_array(buffer, "int32", [b.channel_index for b in blocks])
+
+        #Save the time at which each channel's block was received
+        FileIO_Helpers.write_array(buffer, "int64", [b.timestamp_received_millis for b in blocks])
+
+        #Save the sample rate
+        FileIO_Helpers.write(buffer, "float64", blocks[0].sample_rate)
+
+        #Save the samples, one channel after another
+        FileIO_Helpers.write(buffer, "int32", channel_data.shape[1])
+        FileIO_Helpers.write_array(buffer, "float", channel_data)
+
+    #endregion
@@ -0,0 +1,124 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import BinaryIO
+import struct
+import numpy as np
+
+from .fileio_helpers import FileIO_Helpers
+
+@dataclass
+class RawEmgRecordingHeader:
+    file_version: int = 0
+    subject_id: str = ""
+    recording_datetime: datetime = datetime.min
+    channels: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+
+    def read_from_file (self, fid: BinaryIO) -> None:
+        self.file_version = FileIO_Helpers.read(fid, "int32")
+        self.subject_id = FileIO_Helpers.read_string(fid)
+        self.recording_datetime = FileIO_Helpers.read_datetime(fid)
+
+        N: int = FileIO_Helpers.read(fid, "int32")
+        self.channels = FileIO_Helpers.read_array(fid, "int32", N)
+
+        pass
+
+@dataclass
+class RawEmgRecordingChunk:
+
+    sample_num: int = 0
+    timestamp: int = 0
+
+    #The channel index of each row of data
+    channels: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+
+    timestamps_received_millis: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    sample_rate: float = 0.0
+
+    #The samples of each channel, with shape (channel count, sample count)
+    data: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), dtype=np.float32))
+
+    def read_from_file (self, fid: BinaryIO, header_channels: np.ndarray, file_version: int) -> None:
+        self.sample_num = FileIO_Helpers.read(fid, "int64")
+        self.timestamp = FileIO_Helpers.read(fid, "int64")
+
+        #Starting with version 1, each chunk lists its own channels. In version 0 files,
+        #every chunk has all of the channels from the file header.
+        if (file_version >= 1):
+            K: int = FileIO_Helpers.read(fid, "int32")
+            self.channels = FileIO_Helpers.read_array(fid, "int32", K)
+        else:
+            self.channels = np.array(header_channels, dtype=np.int32)
+
+        channel_count: int = len(self.channels)
+
+        self.timestamps_received_millis = FileIO_Helpers.read_array(fid, "int64", channel_count)
+        self.sample_rate = FileIO_Helpers.read(fid, "float64")
+
+        N: int = FileIO_Helpers.read(fid, "int32")
+        self.data = FileIO_Helpers.read_array(fid, "float", channel_count * N).reshape(channel_count, N)
+
+@dataclass
+class RawEmgRecordingData:
+    '''
+    The contents of a raw EMG recording file, as written by RawEmgRecorder.
+
+    File layout (native byte order):
+        Header:
+            int32       file version
+            string      subject id
+            datetime    recording date/time
+            int32       channel count (C)
+            int32[C]    channel indices, in ascending order
+        Followed by one chunk per frame, until the end of the file:
+            int64       sample number of the first sample in the chunk
+            int64       Open Ephys timestamp
+            int32       channel count in this chunk (K)                     (version 1 and later)
+            int32[K]    channel indices in this chunk, in ascending order   (version 1 and later)
+            int64[K]    time at which each channel's block was received (ms)
+            float64     sample rate
+            int32       sample count (N)
+            float32[K*N] samples, one channel after another
+
+    In version 0 files, every chunk holds all C channels of the file header.
+    '''
+
+    header: RawEmgRecordingHeader = None
+    chunks: list[RawEmgRecordingChunk] = field(default_factory=list)
+
+    def read (self, fid: BinaryIO) -> None:
+        self.header = RawEmgRecordingHeader()
+        self.header.read_from_file(fid)
+
+        self.chunks = []
+        while (True):
+            #Stop at the end of the file. A chunk that was only partially written
+            #(for example, if the application was closed abruptly) is ignored.
+            try:
+                chunk: RawEmgRecordingChunk = RawEmgRecordingChunk()
+                chunk.read_from_file(fid, self.header.channels, self.header.file_version)
+                self.chunks.append(chunk)
+            except (EOFError, struct.error):
+                break
+
+    def concatenated_data (self) -> np.ndarray:
+        '''
+        Returns all of the recorded samples as a single (channel count, sample count) array,
+        with one row per channel in the file header. Samples of a channel that was missing
+        from a chunk are NaN.
+        '''
+
+        header_channels: list[int] = list(self.header.channels)
+        rows: dict[int, int] = {c: i for (i, c) in enumerate(header_channels)}
+
+        sample_count: int = sum([c.data.shape[1] for c in self.chunks])
+        result: np.ndarray = np.full((len(header_channels), sample_count), np.nan, dtype=np.float32)
+
+        start: int = 0
+        for c in self.chunks:
+            N: int = c.data.shape[1]
+            for (i, channel) in enumerate(c.channels):
+                result[rows[int(channel)], start:(start + N)] = c.data[i]
+            start += N
+
+        return result
@@ -0,0 +1,194 @@
+from PySide6.QtCore import QRunnable, Slot, Signal, QObject
+import queue
+import threading
+import time
+import traceback
+
+from .open_ephys_streamer import OpenEphysDataFrame
+from .stages.stage import Stage
+from .latency_metrics import LatencyMetrics
+from .session_message import SessionMessage
+
+class StageRunnerSignals (QObject):
+
+    #region Signals
+
+    #This signal is emitted after the stage has been finalized and the runner has stopped
+    finished = Signal()
+
+    #endregion
+
+class StageRunner (QRunnable):
+    '''
+    Runs a stage on a dedicated thread. Frames of data are handed to the runner
+    through a bounded queue, and the runner passes each frame to the stage's
+    "process" method. Commands typed by the user are also handed to the runner,
+    so that the stage's "input" method runs on the same thread as "process" and
+    never in the middle of a frame. Any messages from the stage are delivered to
+    the UI thread through the stage's signals.
+
+    If the stage raises an exception while it handles a frame or a command, the
+    error is printed and reported to the UI, and the runner carries on with the
+    next frame. The session keeps running until the user (or the stage) stops it.
+    '''
+
+    #region Constants
+
+    #The maximum number of frames that may be waiting to be processed. If the stage
+    #falls this far behind, the oldest frames are discarded.
+    MAX_QUEUED_FRAMES: int = 500
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self, stage: Stage):
+        super().__init__()
+
+        #Public signals
+        self.signals = StageRunnerSignals()
+
+        #The number of frames that were discarded because the queue was full
+        self.dropped_frame_count: int = 0
+
+        #The number of frames and commands that the stage failed to handle
+        self.error_count: int = 0
+
+        #Private members
+        self._stage: Stage = stage
+        self._frame_queue: queue.Queue = queue.Queue(maxsize = StageRunner.MAX_QUEUED_FRAMES)
+        self._input_queue: queue.Queue = queue.Queue()
+        self._should_cancel = False
+        self._finished_event: threading.Event = threading.Event()
+        self._last_reported_error: str = ""
+
+    #endregion
+
+    #region Methods
+
+    def submit (self, data_frame: OpenEphysDataFrame) -> None:
+        '''
+        Queues a frame of data to be processed by the stage. This never blocks the caller.
+        '''
+
+        try:
+            self._frame_queue.put_nowait(data_frame)
+        except queue.Full:
+            #Discard the oldest frame to make room for the newest one
+            try:
+                self._frame_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            self.dropped_frame_count += 1
+            self._frame_queue.put_nowait(data_frame)
+
+    def submit_input (self, user_input: str) -> None:
+        '''
+        Queues a user command to be passed to the stage's "input" method. The command
+        is handled before the next frame of data is processed.
+        '''
+
+        self._input_queue.put(user_input)
+
+    def cancel (self) -> None:
+        '''
+        Tells the runner to stop. The stage is finalized by the runner's thread
+        once it has finished processing the current frame.
+        '''
+
+        self._should_cancel = True
+
+        #Wake up the runner in case it is waiting for a frame
+        self.submit(None)
+
+    def wait (self, timeout: float = None) -> bool:
+        '''
+        Blocks until the runner has finalized the stage and stopped. Returns False
+        if the timeout elapsed before that happened.
+        '''
+
+        return self._finished_event.wait(timeout)
+
+    @Slot()
+    def run (self):
+        '''
+        This is the code executed by the stage-execution thread.
+        '''
+
+        try:
+            #Iterate until the "should cancel" flag is set to True
+            while (not self._should_cancel):
+                #Pass any commands from the user to the stage
+                self._process_pending_inputs()
+
+                #Wait for the next frame of data
+                try:
+                    data_frame: OpenEphysDataFrame = self._frame_queue.get(timeout = 0.1)
+                except queue.Empty:
+                    continue
+
+                #A frame of None is only used to wake the runner up
+                if (data_frame is None):
+                    continue
+
+                #Record how long the frame waited to be processed
+                LatencyMetrics.record(LatencyMetrics.STAGE_QUEUE, max(0, (time.time() * 1000) - data_frame.timestamp_emitted) / 1000)
+
+                #Process the frame of data, after matching any echoed stimulus events to their stimuli.
+                #If the stage fails on this frame, the frame is skipped and the next one is processed.
+                try:
+                    with LatencyMetrics.timer(LatencyMetrics.STAGE_PROCESS):
+                        self._stage.update_stimulus_markers(data_frame)
+                        self._stage.process(data_frame)
+                except Exception as e:
+                    self._report_error("processing a frame of data", e)
+                    continue
+
+                #Record the total time from the frame's data arriving from Open Ephys to the stage
+                #having finished with it. This is the part of the closed loop that our application controls.
+                if (len(data_frame.channel_data_blocks) > 0):
+                    received_millis: int = max([b.timestamp_received_millis for b in data_frame.channel_data_blocks])
+                    LatencyMetrics.record(LatencyMetrics.ACQUISITION_TO_STAGE, max(0, (time.time() * 1000) - received_millis) / 1000)
+        finally:
+            #Finalize the stage on this thread, so that finalization never happens
+            #while the stage is in the middle of processing a frame. The UI waits for
+            #the finished event, so it must be set even if finalization fails.
+            try:
+                self._stage.finalize()
+            except Exception as e:
+                self._report_error("finalizing the stage", e)
+
+            self._finished_event.set()
+            self.signals.finished.emit()
+
+        return
+
+    #endregion
+
+    #region Private methods
+
+    def _process_pending_inputs (self) -> None:
+        while (True):
+            try:
+                user_input: str = self._input_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                self._stage.input(user_input)
+            except Exception as e:
+                self._report_error(f"handling the command \"{user_input}\"", e)
+
+    def _report_error (self, activity: str, e: Exception) -> None:
+        self.error_count += 1
+        traceback.print_exc()
+
+        #Only report an error to the UI when it differs from the previous one, so that a
+        #stage that fails on every frame does not flood the session messages
+        error_text: str = f"Error while {activity}: {e!r}"
+        if (error_text != self._last_reported_error):
+            self._last_reported_error = error_text
+            self._stage.signals.new_message.emit(SessionMessage(error_text))
+
+    #endregion
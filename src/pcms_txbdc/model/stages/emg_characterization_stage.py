@@ -12,6 +12,8 @@ from .stage import Stage
 from ..session_message import SessionMessage
 from ..application_configuration import ApplicationConfiguration
 from ..fileio_helpers import FileIO_Helpers
+from ..emg_bin_statistics import EmgBinStatistics
+from ..open_ephys_streamer import OpenEphysDataFrame
 
 class EmgCharacterizationStage (Stage):
 
@@ -46,11 +48,8 @@ class EmgCharacterizationStage (Stage):
         self.stage_description = "EMG Characterization"
         self.stage_type = Stage.STAGE_TYPE_EMG_CHARACTERIZATION
 
-        #Declare a variable to hold the monitored signal
-        self._monitored_signal: np.ndarray = np.zeros(1)
-
-        #Declare a variable to hold the bins
-        self._bins: np.ndarray = np.zeros(1)
+        #Declare a variable to hold the monitored signal and its bins
+        self._bin_statistics: EmgBinStatistics = EmgBinStatistics(1, EmgCharacterizationStage.BIN_DURATION_SAMPLE_COUNT)
 
         #Declare a variable to hold the current monitored signal duration
         self._monitored_signal_duration_seconds: float = 0.0
@@ -125,12 +124,17 @@ class EmgCharacterizationStage (Stage):
         #Return from this function
         return (True, "")
 
-    def process (self, data: np.ndarray) -> None:
+    def process (self, data_frame: OpenEphysDataFrame) -> None:
         '''
         Processes the most recent incoming data and takes any actions
         that are necessary based on the incoming data.
         '''
 
+        #This stage monitors the filtered signal of the first derivation
+        if (data_frame.derivation_count == 0):
+            return
+        data: np.ndarray = data_frame.filtered_data_block[0]
+
         #Check to see if we need to set up a new trial
         if (not self._is_trial_set_up):
             #Set up a new trial
@@ -142,24 +146,10 @@ class EmgCharacterizationStage (Stage):
             self._current_trial_sample_count += len(data)
 
             #Pull in new data to the monitored signal - and take the absolute value of the data
-            self._monitored_signal = np.concatenate([self._monitored_signal, np.abs(data)])
-            elements_to_remove: int = len(self._monitored_signal) - self._monitored_signal_sample_count
-            if (elements_to_remove > 0):
-                self._monitored_signal = self._monitored_signal[elements_to_remove:]
-
-            #Bin the data
-            for bin_index in range(0, len(self._bins)):
-                bin_start = EmgCharacterizationStage.BIN_DURATION_SAMPLE_COUNT * bin_index
-                bin_end = EmgCharacterizationStage.BIN_DURATION_SAMPLE_COUNT * (bin_index + 1)
+            self._bin_statistics.append(np.abs(data))
 
-                if (bin_end > len(self._monitored_signal)):
-                    bin_end = len(self._monitored_signal)
-
-                bin_mean: float = np.mean(self._monitored_signal[bin_start:bin_end])
-                self._bins[bin_index] = bin_mean
-            
             #Get the mean of all the bins
-            bin_grand_mean: float = np.mean(self._bins)
+            bin_grand_mean: float = self._bin_statistics.grand_mean
 
             #If the bin grand mean is within a pre-specified min or max range, then
             #we consider this a trial initiation.
@@ -175,11 +165,13 @@ class EmgCharacterizationStage (Stage):
                 #Save the trial to the data file
                 self._save_trial(bin_grand_mean)
 
-                #Update the session plot
-                self._update_session_plot()
-
-                #Update the trial plot
-                self._update_trial_plot(bin_grand_mean)
+                #Hand copies of the trial's data to the UI thread, which updates the session and trial plots
+                self.signals.trial_completed.emit((
+                    bin_grand_mean,
+                    np.array(self._bin_statistics.monitored_signal),
+                    self._bin_statistics.bins,
+                    list(self._trial_means)
+                ))
 
                 #Let's create a message object
                 message: SessionMessage = SessionMessage(f"Trial {len(self._trial_means)} initiated")
@@ -214,6 +206,15 @@ class EmgCharacterizationStage (Stage):
         #This stage will not support updating the plots from an external call.
         pass
 
+    def plot_trial (self, trial_data: object) -> None:
+        (bin_grand_mean, monitored_signal, bins, trial_means) = trial_data
+
+        #Update the session plot
+        self._update_session_plot(trial_means)
+
+        #Update the trial plot
+        self._update_trial_plot(bin_grand_mean, monitored_signal, bins)
+
     #endregion
 
     #region Private methods
@@ -237,9 +238,8 @@ class EmgCharacterizationStage (Stage):
         #Get the number of bins we will be collecting
         bin_count: int = int(dur_milliseconds / EmgCharacterizationStage.BIN_DURATION_MILLISECONDS)
 
-        #Re-size the appropriate arrays to hold the data we care about
-        self._monitored_signal = np.zeros(self._monitored_signal_sample_count)
-        self._bins = np.zeros(bin_count)
+        #Create an object to hold the monitored signal and its bins
+        self._bin_statistics = EmgBinStatistics(bin_count, EmgCharacterizationStage.BIN_DURATION_SAMPLE_COUNT)
 
         #Set the flag indicating that the trial has been set up
         self._is_trial_set_up = True
@@ -250,30 +250,30 @@ class EmgCharacterizationStage (Stage):
     def _round_special (self, x: int, base: int = 50) -> int:
         return base * int(round(float(x) / float(base)))
 
-    def _update_session_plot (self) -> None:
+    def _update_session_plot (self, trial_means: list[float]) -> None:
 
         #Clear the plot
         self._session_widget.clear()
 
         #Plot the trial means
-        self._session_widget.plot(range(0, len(self._trial_means)), self._trial_means, pen = None, symbol = 'o', symbolBrush=('b'), symbolSize=12)
+        self._session_widget.plot(range(0, len(trial_means)), trial_means, pen = None, symbol = 'o', symbolBrush=('b'), symbolSize=12)
 
         pass
 
-    def _update_trial_plot (self, bin_grand_mean: float) -> None:
+    def _update_trial_plot (self, bin_grand_mean: float, monitored_signal: np.ndarray, bins: np.ndarray) -> None:
         #Clear the plot
         self._trial_widget.clear()
 
         #Plot the "raw" (absolute-valued) EMG data for this trial
         pen = pg.mkPen(color=(0, 0, 0))
-        self._trial_widget.plot(range(0, len(self._monitored_signal)), self._monitored_signal, pen = pen)
+        self._trial_widget.plot(range(0, len(monitored_signal)), monitored_signal, pen = pen)
 
         #Plot the binned data
         pen = pg.mkPen(color=(255, 0, 0), width = 2.0)
-        xvals = list(range(0, len(self._bins)))
+        xvals = list(range(0, len(bins)))
         for i in range(0, len(xvals)):
             xvals[i] *= EmgCharacterizationStage.BIN_DURATION_SAMPLE_COUNT
-        self._trial_widget.plot(xvals, self._bins, pen = pen)
+        self._trial_widget.plot(xvals, bins, pen = pen)
 
         # Get the ViewBox object
         view_box = self._trial_widget.getPlotItem().getViewBox()
@@ -334,18 +334,18 @@ class EmgCharacterizationStage (Stage):
             FileIO_Helpers.write(self._fid, "float64", bin_grand_mean)
 
             #Save the number of bins
-            FileIO_Helpers.write(self._fid, "int32", len(self._bins))
+            bins: np.ndarray = self._bin_statistics.bins
+            FileIO_Helpers.write(self._fid, "int32", len(bins))
 
             #Save all of the bin data
-            for i in range(0, len(self._bins)):
-                FileIO_Helpers.write(self._fid, "float64", self._bins[i])
+            FileIO_Helpers.write_array(self._fid, "float64", bins)
             
             #Save the length of the monitored signal
-            FileIO_Helpers.write(self._fid, "int32", len(self._monitored_signal))
+            monitored_signal: np.ndarray = self._bin_statistics.monitored_signal
+            FileIO_Helpers.write(self._fid, "int32", len(monitored_signal))
 
             #Save all of the monitored signal data
-            for i in range(0, len(self._monitored_signal)):
-                FileIO_Helpers.write(self._fid, "float64", self._monitored_signal[i])
+            FileIO_Helpers.write_array(self._fid, "float64", monitored_signal)
             
             pass
 
@@ -13,6 +13,11 @@ from ..session_message import SessionMessage
 from ..application_configuration import ApplicationConfiguration
 from ..fileio_helpers import FileIO_Helpers
 from ..emg_characterization_data import EmgCharacterizationData, EmgCharacterizationHeader, EmgCharacterizationTrial, EmgHistogramData
+from ..emg_bin_statistics import EmgBinStatistics
+from ..emg_ring_buffer import EmgRingBuffer
+from ..open_ephys_streamer import OpenEphysDataFrame
+from ..trial_capture import TrialCapture
+from ..stimulus_marker import StimulusMarker
 
 from ..stimjim import StimJim
 
@@ -22,13 +27,10 @@ class MhRecruitmentCurveStage_TrialInitiationData:
 
     def __init__(self):
         #Declare a variable to hold the monitored signal
-        self.monitored_signal: np.ndarray = np.zeros(1)
+        self.signal_history: EmgRingBuffer = EmgRingBuffer(1, 1)
 
-        #Declare a variable to hold the absolute value monitored signal
-        self.monitored_signal_abs: np.ndarray = np.zeros(1)
-
-        #Declare a variable to hold the bins
-        self.bins: np.ndarray = np.zeros(1)
+        #Declare a variable to hold the absolute value monitored signal and its bins
+        self.bin_statistics: EmgBinStatistics = EmgBinStatistics(1, MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT)
 
         #Declare a variable to hold the current monitored signal duration
         self.monitored_signal_duration_seconds: float = 0.0
@@ -44,6 +46,18 @@ class MhRecruitmentCurveStage_TrialInitiationData:
 
     #endregion
 
+    #region Properties
+
+    @property
+    def monitored_signal (self) -> np.ndarray:
+        '''
+        The monitored signal, from oldest to newest. This is a view, not a copy.
+        '''
+
+        return self.signal_history.ordered_view(0)
+
+    #endregion
+
     #region Methods
 
     def initialize (self, dur_milliseconds: int) -> None:
@@ -57,9 +71,8 @@ class MhRecruitmentCurveStage_TrialInitiationData:
         bin_count: int = int(dur_milliseconds / MhRecruitmentCurveStage.BIN_DURATION_MILLISECONDS)
 
         #Re-size the appropriate arrays to hold the data we care about
-        self.monitored_signal = np.zeros(self.monitored_signal_sample_count)
-        self.monitored_signal_abs = np.zeros(self.monitored_signal_sample_count)
-        self.bins = np.zeros(bin_count)
+        self.signal_history = EmgRingBuffer(1, self.monitored_signal_sample_count)
+        self.bin_statistics = EmgBinStatistics(bin_count, MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT)
 
         #We are done. return from this function.
         return
@@ -71,26 +84,13 @@ class MhRecruitmentCurveStage_TrialInitiationData:
         self.current_monitored_signal_sample_count += len(data)
 
         #Add the new data to the monitored signal
-        self.monitored_signal = np.concatenate([self.monitored_signal, data])
-        self.monitored_signal_abs = np.concatenate([self.monitored_signal_abs, np.abs(data)])
-        elements_to_remove: int = len(self.monitored_signal) - self.monitored_signal_sample_count
-        if (elements_to_remove > 0):
-            self.monitored_signal = self.monitored_signal[elements_to_remove:]
-            self.monitored_signal_abs = self.monitored_signal_abs[elements_to_remove:]
-
-        #Bin the data
-        for bin_index in range(0, len(self.bins)):
-            bin_start = MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT * bin_index
-            bin_end = MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT * (bin_index + 1)
-
-            if (bin_end > len(self.monitored_signal_abs)):
-                bin_end = len(self.monitored_signal_abs)
-
-            bin_mean: float = np.mean(self.monitored_signal_abs[bin_start:bin_end])
-            self.bins[bin_index] = bin_mean
-        
+        self.signal_history.append(data)
+
+        #Add the absolute value of the new data to the binned signal
+        self.bin_statistics.append(np.abs(data))
+
         #Get the mean of all the bins
-        bin_grand_mean: float = np.mean(self.bins)
+        bin_grand_mean: float = self.bin_statistics.grand_mean
 
         #If the bin grand mean is within a pre-specified min or max range, then
         #we consider this a trial initiation.
@@ -113,18 +113,34 @@ class MhRecruitmentCurveTrial:
         #Create a timestamp
         self.start_time: datetime = datetime.min
 
-        #Define a numpy array to hold trial data
-        self.trial_data: np.ndarray = np.zeros(1)
+        #Define an object to capture the trial data: 50 ms before the trial initiation and 100 ms after it
+        self.capture: TrialCapture = TrialCapture(
+            MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT, 
+            MhRecruitmentCurveStage.TRIAL_RECORDING_DURATION_SAMPLE_COUNT)
 
         #Create variables to hold trial parameters
         self.min_initiation_threshold: float = 0.0
         self.max_initiation_threshold: float = 0.0
         self.stimulation_amplitude_ma: float = 0.0
 
+        #The marker of the stimulus in Open Ephys (None if no stimulus was issued)
+        self.stimulus_marker: StimulusMarker = None
+
+        #The Open Ephys sample number of the stimulus (-1 if it is not known)
+        self.stimulus_sample_num: int = -1
+
         pass
 
     #endregion
 
+    #region Properties
+
+    @property
+    def trial_data (self) -> np.ndarray:
+        return self.capture.data[0]
+
+    #endregion
+
     #region Methods
 
     def initialize (self, min_init_threshold: float, max_init_threshold: float, stim_amp: float) -> None:
@@ -147,12 +163,14 @@ class MhRecruitmentCurveTrial:
         #Save the stimulation amplitude for this trial
         FileIO_Helpers.write(fid, "float64", self.stimulation_amplitude_ma)
 
+        #Save the sample number of the stimulus
+        FileIO_Helpers.write(fid, "int64", self.stimulus_sample_num)
+
         #Save the sample count
         FileIO_Helpers.write(fid, "int32", len(self.trial_data))
 
         #Save the trial data
-        for i in range(0, len(self.trial_data)):
-            FileIO_Helpers.write(fid, "float64", self.trial_data[i])
+        FileIO_Helpers.write_array(fid, "float64", self.trial_data)
 
     #endregion
 
@@ -315,10 +333,11 @@ class MhRecruitmentCurveStage (Stage):
         #If we reach this point in the code, then no prior EMG sweep data exists for this animal.
         #Therefore, this stage can proceed.
 
-        #Load in the EMG characterization data from stage 1
+        #Load in the EMG characterization data from stage 1. Only the grand mean of each
+        #trial is needed for the histogram, so the rest of each trial is skipped.
         self._emg_characterization_data: EmgCharacterizationData = EmgCharacterizationData()
         fid = open(os.path.join(file_path, hrs1_file_name), "rb")
-        self._emg_characterization_data.read(fid)
+        self._emg_characterization_data.read(fid, scalars_only = True)
         fid.close()
 
         #Calculate the histogram data from the EMG characterization data from stage 1
@@ -352,13 +371,18 @@ class MhRecruitmentCurveStage (Stage):
         #Return from this function
         return (True, "")
 
-    def process (self, data: np.ndarray) -> None:
+    def process (self, data_frame: OpenEphysDataFrame) -> None:
         '''
         Processes the most recent incoming data and takes any actions
         that are necessary based on the incoming data.
         '''
         current_datetime: datetime = datetime.now()
 
+        #This stage monitors the filtered signal of the first derivation
+        if (data_frame.derivation_count == 0):
+            return
+        data: np.ndarray = data_frame.filtered_data_block[0]
+
         #Load in the data from the previous stage
         #That will give us our histogram
 
@@ -417,25 +441,34 @@ class MhRecruitmentCurveStage (Stage):
                 )
 
                 #Transfer the last 50 ms of trial initiation data into the trial object
-                self._current_trial.trial_data = self._current_trial_initiation_data.monitored_signal[-MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT:]
+                self._current_trial.capture.start(self._current_trial_initiation_data.signal_history)
 
-                #Trigger the stimjim
+                #Trigger the stimjim, and mark the stimulus in Open Ephys
                 if (ApplicationConfiguration.stimjim is not None):
                     ApplicationConfiguration.stimjim.send_command("T0")
+                    self._current_trial.stimulus_marker = self._send_stimulus_event(data_frame)
 
         elif (self._current_trial_state == MhRecruitmentCurveStage.TRIAL_STATE_RECORD):
 
             #Copy data into the trial object until we have 100 ms of post-stim data
-            self._current_trial.trial_data = np.concatenate([self._current_trial.trial_data, data])
+            self._current_trial.capture.append(data)
 
             #Check to see if we have enough data
-            if (len(self._current_trial.trial_data) >= (MhRecruitmentCurveStage.BIN_DURATION_SAMPLE_COUNT + MhRecruitmentCurveStage.TRIAL_RECORDING_DURATION_SAMPLE_COUNT)):
+            if (self._current_trial.capture.is_complete):
                 #If so, move on to the next stage
                 self._current_trial_state = MhRecruitmentCurveStage.TRIAL_STATE_FINALIZE
 
             pass
         elif (self._current_trial_state == MhRecruitmentCurveStage.TRIAL_STATE_FINALIZE):
-            
+
+            #Wait until Open Ephys has echoed the stimulus event (or the echo is no longer expected),
+            #so that the trial is saved with the sample number at which the stimulus actually occurred
+            stimulus_marker: StimulusMarker = self._current_trial.stimulus_marker
+            if (stimulus_marker is not None):
+                if (not stimulus_marker.is_settled):
+                    return
+                self._current_trial.stimulus_sample_num = stimulus_marker.sample_num
+
             #Append the current trial to the session's list of trials
             self._trials.append(self._current_trial)
 
@@ -455,9 +488,8 @@ class MhRecruitmentCurveStage (Stage):
             if (len(trial_isi_list) > 0):
                 self._average_ms_between_trials = np.mean(trial_isi_list)
 
-            #Plot data about this trial in the application's charts
-            ## TO DO
-            self._update_trial_plot()
+            #Plot data about this trial in the application's charts. The plot is drawn on the UI thread.
+            self.signals.trial_completed.emit(np.array(self._current_trial.trial_data))
 
             #Set the state
             self._current_trial_state = MhRecruitmentCurveStage.TRIAL_STATE_NOT_SETUP
@@ -500,6 +532,9 @@ class MhRecruitmentCurveStage (Stage):
         #This stage does not support updating the "most recent trial plot" from an external function call.
         pass
 
+    def plot_trial (self, trial_data: object) -> None:
+        self._update_trial_plot(trial_data)
+
     def update_session_plot (self) -> None:
 
         if (self._session_plot_index == 0):
@@ -537,7 +572,7 @@ class MhRecruitmentCurveStage (Stage):
         self._session_widget.addItem(min_thresh_line)
         self._session_widget.addItem(max_thresh_line)
 
-    def _update_trial_plot (self) -> None:
+    def _update_trial_plot (self, trial_data: np.ndarray) -> None:
         #Clear the plot
         self._trial_widget.clear()
 
@@ -545,11 +580,11 @@ class MhRecruitmentCurveStage (Stage):
         pen = pg.mkPen(color=(0, 0, 0), width = 2.0)
 
         #Transform each sample index into a millisecond time value for the trial's x-axis
-        num_ms: float = len(self._current_trial.trial_data) * MhRecruitmentCurveStage.MILLISECONDS_PER_SAMPLE
+        num_ms: float = len(trial_data) * MhRecruitmentCurveStage.MILLISECONDS_PER_SAMPLE
         x_data: np.ndarray = np.arange(0, num_ms, MhRecruitmentCurveStage.MILLISECONDS_PER_SAMPLE)
 
         #Plot the trial data
-        self._trial_widget.plot(x_data, self._current_trial.trial_data, pen = pen)
+        self._trial_widget.plot(x_data, trial_data, pen = pen)
 
         #Plot a vertical line annotation showing where the trial initiation occurred
         vert_line_pen = pg.mkPen(color=(255, 0, 0), width = 2.0, style=QtCore.Qt.DashLine)
@@ -639,7 +674,7 @@ class MhRecruitmentCurveStage (Stage):
     def _save_file_header (self) -> None:
         if (self._fid is not None):
             #Save the file version
-            FileIO_Helpers.write(self._fid, "int32", int(0))
+            FileIO_Helpers.write(self._fid, "int32", int(1))
 
             #Save the subject id
             FileIO_Helpers.write_string(self._fid, self._subject_id)
@@ -721,7 +756,7 @@ class MhRecruitmentCurveStage (Stage):
             
             self._current_min_initiation_threshold = max(lb, self._emg_histogram_data.min)
             self.signals.new_message.emit(SessionMessage(f"Min threshold set: {self._current_min_initiation_threshold:.2f}"))
-            self.update_session_plot()
+            self.signals.session_plot_changed.emit()
         else:
             ub: float = self._current_max_initiation_threshold
 
@@ -738,7 +773,7 @@ class MhRecruitmentCurveStage (Stage):
             
             self._current_max_initiation_threshold = min(ub, self._emg_histogram_data.max)
             self.signals.new_message.emit(SessionMessage(f"Min threshold set: {self._current_max_initiation_threshold:.2f}"))
-            self.update_session_plot()
+            self.signals.session_plot_changed.emit()
         pass
 
     def _parse_command_auto (self, user_input: str) -> None:
@@ -8,12 +8,16 @@ from .stage import Stage
 from ..session_message import SessionMessage
 from ..application_configuration import ApplicationConfiguration
 from ..fileio_helpers import FileIO_Helpers
+from ..indexed_trial_writer import IndexedTrialWriter
+from ..emg_ring_buffer import EmgRingBuffer
+from ..stimulus_marker import StimulusMarkerTracker
 
 
 class SalineBathDemoDataStage(Stage):
     STIM_GAP_MILLISECONDS = 100.0
     STIM_INTERVAL_SECONDS = 5.0
     STIM_INSTANCE_COUNT = 5
+    FILE_VERSION = 2
 
     def __init__(self):
         super().__init__()
@@ -21,7 +25,8 @@ class SalineBathDemoDataStage(Stage):
         self.stage_description = "Saline Bath Demo Data"
         self.stage_type = Stage.STAGE_TYPE_SALINE_DEMO_DATA
         self._fid = None
-        self.demo_data = np.zeros(1)
+        self._iteration_chunks = []
+        self._stimulus_markers = [None, None]
         self._stim_index = 0
         self._stim_phase = "STIM1"
         self._amplitude_list = [Stage.STIM1_AMPLITUDE, Stage.STIM2_AMPLITUDE]
@@ -30,6 +35,7 @@ class SalineBathDemoDataStage(Stage):
 
     def initialize(self, subject_id):
         self._subject_id = subject_id
+        self._iteration_chunks = []
         self._stim_index = 0
         self._stim_phase = "STIM1"
 
@@ -55,27 +61,23 @@ class SalineBathDemoDataStage(Stage):
 
         if self._stim_phase == "STIM1":
             self._stim_phase_timestamp = current_time
-            stim = ApplicationConfiguration.stimulator[0]
-            if stim:
-                stim.set_active(True)
-                stim.trigger_single()
+            self._stimulus_markers[0] = self._trigger_stimulator(0, data)
+            if self._stimulus_markers[0] is not None:
                 self.signals.new_message.emit(SessionMessage(f"Stim #{self._stim_index + 1} - AM 4100 #1"))
-            self.demo_data = np.concatenate([self.demo_data, data])
+            self._append_data(data)
             self._stim_phase = "WAIT_GAP"
 
         elif self._stim_phase == "WAIT_GAP":
-            self.demo_data = np.concatenate([self.demo_data, data])
+            self._append_data(data)
             if current_time - self._stim_phase_timestamp >= self.STIM_GAP_MILLISECONDS / 1000.0:
                 self._stim_phase = "STIM2"
 
         elif self._stim_phase == "STIM2":
             self._stim_phase_timestamp = current_time
-            stim = ApplicationConfiguration.stimulator[1]
-            if stim:
-                stim.set_active(True)
-                stim.trigger_single()
+            self._stimulus_markers[1] = self._trigger_stimulator(1, data)
+            if self._stimulus_markers[1] is not None:
                 self.signals.new_message.emit(SessionMessage(f"Stim #{self._stim_index + 1} - AM 4100 #2"))
-            self.demo_data = np.concatenate([self.demo_data, data])
+            self._append_data(data)
             self._stim_phase = "WAIT_LONG"
 
         elif self._stim_phase == "WAIT_LONG":
@@ -88,17 +90,29 @@ class SalineBathDemoDataStage(Stage):
                     self.signals.session_complete.emit()
 
     def save(self, fid):
+        #Only the data from the current iteration is saved, as its own block
+        iteration_data = np.concatenate(self._iteration_chunks, axis=1) if self._iteration_chunks else np.zeros((0, 0))
         FileIO_Helpers.write(fid, "int32", 1)
-        FileIO_Helpers.write_datetime(fid, self.current_datetime)
-        for val in self.demo_data:
-            FileIO_Helpers.write(fid, "float64", val)
+        FileIO_Helpers.write_datetime(fid, datetime.now())
+        FileIO_Helpers.write(fid, "int32", self._stim_index)
+        #The stimulus events were echoed by Open Ephys long before the iteration is saved
+        FileIO_Helpers.write_array(fid, "int64", [m.sample_num if m is not None else -1 for m in self._stimulus_markers])
+        FileIO_Helpers.write(fid, "int32", iteration_data.shape[0])
+        FileIO_Helpers.write(fid, "int32", iteration_data.shape[1])
+        FileIO_Helpers.write_array(fid, "float64", iteration_data)
+        self._iteration_chunks = []
+        self._stimulus_markers = [None, None]
+
+    def _append_data(self, data_frame):
+        if data_frame.derivation_count > 0:
+            self._iteration_chunks.append(data_frame.filtered_data_block)
 
     def finalize(self):
         if self._fid:
             self._fid.close()
 
     def _save_file_header(self):
-        FileIO_Helpers.write(self._fid, "int32", 0)
+        FileIO_Helpers.write(self._fid, "int32", self.FILE_VERSION)
         FileIO_Helpers.write_string(self._fid, self._subject_id)
         FileIO_Helpers.write_datetime(self._fid, datetime.now())
         FileIO_Helpers.write_string(self._fid, self.stage_name)
@@ -107,21 +121,50 @@ class SalineBathDemoDataStage(Stage):
 
 
 class Stage0aFWaveLatency(Stage):
-    def __init__(self):
+    #The length of the epoch saved for each trial, before and after the stimulus
+    PRE_TRIGGER_MILLISECONDS = 50
+    POST_TRIGGER_MILLISECONDS = 100
+
+    def __init__(self, pre_trigger_ms: float = PRE_TRIGGER_MILLISECONDS, post_trigger_ms: float = POST_TRIGGER_MILLISECONDS):
         super().__init__()
         self.stage_name = "Stage 0a: F-wave Latency and PCT"
         self.stage_description = "Stimulate Nerve repeatedly to collect EMG for F-wave and PCT"
         self.stage_type = Stage.STAGE_TYPE_EMG_CHARACTERIZATION
-        self._fid = None
+        self._trial_writer = None
         self._trial_index = 0
         self._interval_sec = 5
         self._max_trials = 10
+        self._amplitude_ma = 0.8
         self._start_time = None
+        self._stimulator_index = 1
+        self._stimulus_name = "Nerve Stim"
+        self._short_name = "Stage 0a"
+        self._title = "Stage 0a: F-wave Latency"
+
+        #The number of samples saved before and after each stimulus
+        self._pre_trigger_sample_count = int(pre_trigger_ms * Stage.SAMPLE_RATE / 1000)
+        self._post_trigger_sample_count = int(post_trigger_ms * Stage.SAMPLE_RATE / 1000)
+
+        #The most recent samples of each derivation are kept in a ring buffer, so that each trial's epoch can be cut
+        #out around the sample at which Open Ephys stamped the stimulus. That stamp arrives after the stimulus, so the
+        #buffer holds a whole epoch plus the longest wait for the echoed event. The buffer and the epoch array are
+        #created once the number of derivations is known.
+        self._history_capacity = (self._pre_trigger_sample_count + self._post_trigger_sample_count +
+            2 * int(StimulusMarkerTracker.MAX_ECHO_DELAY_SECONDS * Stage.SAMPLE_RATE))
+        self._history = None
+        self._history_end_sample_num = 0
+        self._epoch = None
+        self._is_capturing = False
+        self._capture_timestamp = 0.0
+        self._capture_marker = None
 
     def initialize(self, subject_id):
         self._subject_id = subject_id
         self._trial_index = 0
-        ApplicationConfiguration.set_biphasic_stimulus_pulse_parameters(1, amplitude_ma=0.8)
+        self._history = None
+        self._epoch = None
+        self._is_capturing = False
+        ApplicationConfiguration.set_biphasic_stimulus_pulse_parameters(self._stimulator_index, amplitude_ma=self._amplitude_ma)
         self._start_time = time.time()
         self._next_stim_time = self._start_time
         dt = datetime.now()
@@ -129,85 +172,110 @@ class Stage0aFWaveLatency(Stage):
         app_data_path = user_data_dir(ApplicationConfiguration.appname, ApplicationConfiguration.appauthor)
         file_path = os.path.join(app_data_path, subject_id)
         os.makedirs(file_path, exist_ok=True)
-        file_name = f"{subject_id}_{dt.strftime('%Y%m%dT%H%M%S')}_fwave0a.pcms"
-        self._fid = open(os.path.join(file_path, file_name), "wb")
-        self._save_file_header()
-        self.signals.new_message.emit(SessionMessage("Beginning Stage 0a: F-wave Latency"))
+        file_name = f"{subject_id}_{dt.strftime('%Y%m%dT%H%M%S')}_{self._file_suffix()}.pcms"
+        self._open_trial_writer(os.path.join(file_path, file_name))
+        self.signals.new_message.emit(SessionMessage(f"Beginning {self._title}"))
         return True, ""
 
     def process(self, data):
         current_time = time.time()
+        if data.derivation_count == 0:
+            return
+
+        #Keep the recent history of every derivation, and (re)create the buffers if the number of derivations changes
+        if (self._history is None) or (self._history.channel_count != data.derivation_count):
+            self._history = EmgRingBuffer(data.derivation_count, self._history_capacity, dtype=np.float32)
+            self._epoch = np.zeros((data.derivation_count, self._pre_trigger_sample_count + self._post_trigger_sample_count), dtype=np.float32)
+            self._is_capturing = False
+        elif (self._history.total_sample_count > 0) and (data.sample_id != self._history_end_sample_num):
+            #Epochs are cut out of the history by sample number, so the history must hold contiguous samples.
+            #If a frame was lost (or the sample numbers started over), start the history over and discard the trial in progress.
+            self._history.clear()
+            if self._is_capturing:
+                self._is_capturing = False
+                self.signals.new_message.emit(SessionMessage(f"Trial {self._trial_index}: epoch not saved, the data stream skipped from sample {self._history_end_sample_num} to {data.sample_id}"))
+        self._history.append(data.filtered_data_block)
+        self._history_end_sample_num = data.sample_id + data.num_samples
+
+        #If a trial is waiting for its epoch, save the epoch once Open Ephys has echoed the stimulus event
+        #(or the echo is no longer expected) and the whole post-trigger window has arrived
+        if self._is_capturing:
+            if self._capture_marker.is_settled:
+                self._save_epoch()
+            return
+
         if self._trial_index >= self._max_trials:
-            self.signals.new_message.emit(SessionMessage("→ Stage 0a complete."))
+            self.signals.new_message.emit(SessionMessage(f"→ {self._short_name} complete."))
             self.signals.session_complete.emit()
             return
+        #Hold off the first stimulus until the history holds a whole pre-trigger window
+        if self._history.total_sample_count < self._pre_trigger_sample_count:
+            return
+
         if current_time >= self._next_stim_time:
-            stim = ApplicationConfiguration.stimulator[1]
-            stim.set_active(True)
-            stim.trigger_single()
-            elapsed_time = current_time - self._start_time
-            FileIO_Helpers.write(self._fid, "int32", self._trial_index + 1)
-            FileIO_Helpers.write(self._fid, "float64", elapsed_time)
-            for val in data:
-                FileIO_Helpers.write(self._fid, "float64", val)
-            self._trial_index += 1
             self._next_stim_time += self._interval_sec
-            self.signals.new_message.emit(SessionMessage(f"Trial {self._trial_index}: Nerve Stim triggered"))
+
+            #Fire the stimulator. If it is not connected, there is no trial.
+            marker = self._trigger_stimulator(self._stimulator_index, data)
+            if marker is None:
+                self.signals.new_message.emit(SessionMessage(f"{self._stimulus_name} not triggered: AM 4100 #{self._stimulator_index + 1} not connected"))
+                return
+
+            #Wait for the trial's epoch
+            self._capture_marker = marker
+            self._capture_timestamp = current_time - self._start_time
+            self._is_capturing = True
+            self._trial_index += 1
+            self.signals.new_message.emit(SessionMessage(f"Trial {self._trial_index}: {self._stimulus_name} triggered"))
 
     def finalize(self):
-        if self._fid:
-            self._fid.close()
+        if self._trial_writer:
+            self._trial_writer.close()
+            self._trial_writer = None
+
+    def _save_epoch(self):
+        #The epoch is centred on the sample at which Open Ephys stamped the stimulus. If the stimulus
+        #event was never echoed, the end of the frame during which the stimulus was issued is used instead.
+        marker = self._capture_marker
+        stimulus_sample_num = marker.sample_num if marker.is_resolved else marker.estimated_sample_num
+        epoch_start_sample_num = stimulus_sample_num - self._pre_trigger_sample_count
+        epoch_end_sample_num = stimulus_sample_num + self._post_trigger_sample_count
+        if self._history_end_sample_num < epoch_end_sample_num:
+            return
 
-    def _save_file_header(self):
-        FileIO_Helpers.write(self._fid, "int32", 1)
-        FileIO_Helpers.write_string(self._fid, self._subject_id)
-        FileIO_Helpers.write_datetime(self._fid, self._current_datetime)
-        FileIO_Helpers.write_string(self._fid, self.stage_name)
-        FileIO_Helpers.write_string(self._fid, self.stage_description)
-        FileIO_Helpers.write(self._fid, "int32", self.stage_type)
+        #Copy the epoch out of the history, unless part of it has already been overwritten
+        self._is_capturing = False
+        history_sample_count = min(self._history.total_sample_count, self._history.capacity)
+        offset = self._history_end_sample_num - epoch_start_sample_num
+        if offset > history_sample_count:
+            self.signals.new_message.emit(SessionMessage(f"Trial {self._trial_index}: epoch not saved, the stimulus event arrived too late"))
+            return
+
+        np.copyto(self._epoch, self._history.latest(offset)[:, 0:self._epoch.shape[1]])
+        self._trial_writer.write_trial(self._epoch, self._capture_timestamp, self._amplitude_ma, marker.sample_num)
+
+    def _file_suffix(self):
+        return "fwave0a"
+
+    def _open_trial_writer(self, file_path):
+        #Trials are saved in the indexed trial format, so that any trial can be read back without reading the whole file
+        self._trial_writer = IndexedTrialWriter(
+            file_path, self._subject_id, self.stage_name, self.stage_description, self.stage_type, Stage.SAMPLE_RATE)
+        self._trial_writer.open()
 
 
 class Stage0bMEPLatency(Stage0aFWaveLatency):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, pre_trigger_ms: float = Stage0aFWaveLatency.PRE_TRIGGER_MILLISECONDS, post_trigger_ms: float = Stage0aFWaveLatency.POST_TRIGGER_MILLISECONDS):
+        super().__init__(pre_trigger_ms, post_trigger_ms)
         self.stage_name = "Stage 0b: MEP Latency and CCT"
         self.stage_description = "Stimulate Brain repeatedly to collect EMG for MEP and CCT"
+        self._stimulator_index = 0
+        self._stimulus_name = "Brain Stim"
+        self._short_name = "Stage 0b"
+        self._title = "Stage 0b: MEP Latency"
 
-    def initialize(self, subject_id):
-        self._subject_id = subject_id
-        self._trial_index = 0
-        ApplicationConfiguration.set_biphasic_stimulus_pulse_parameters(0, amplitude_ma=0.8)
-        self._start_time = time.time()
-        self._next_stim_time = self._start_time
-        dt = datetime.now()
-        self._current_datetime = dt
-        app_data_path = user_data_dir(ApplicationConfiguration.appname, ApplicationConfiguration.appauthor)
-        file_path = os.path.join(app_data_path, subject_id)
-        os.makedirs(file_path, exist_ok=True)
-        file_name = f"{subject_id}_{dt.strftime('%Y%m%dT%H%M%S')}_mep0b.pcms"
-        self._fid = open(os.path.join(file_path, file_name), "wb")
-        self._save_file_header()
-        self.signals.new_message.emit(SessionMessage("Beginning Stage 0b: MEP Latency"))
-        return True, ""
-
-    def process(self, data):
-        current_time = time.time()
-        if self._trial_index >= self._max_trials:
-            self.signals.new_message.emit(SessionMessage("→ Stage 0b complete."))
-            self.signals.session_complete.emit()
-            return
-        if current_time >= self._next_stim_time:
-            stim = ApplicationConfiguration.stimulator[0]
-            stim.set_active(True)
-            stim.trigger_single()
-            elapsed_time = current_time - self._start_time
-            FileIO_Helpers.write(self._fid, "int32", self._trial_index + 1)
-            FileIO_Helpers.write(self._fid, "float64", elapsed_time)
-            for val in data:
-                FileIO_Helpers.write(self._fid, "float64", val)
-            self._trial_index += 1
-            self._next_stim_time += self._interval_sec
-            self.signals.new_message.emit(SessionMessage(f"Trial {self._trial_index}: Brain Stim triggered"))
+    def _file_suffix(self):
+        return "mep0b"
 
 
 class PCMSConditioningStage(Stage):
@@ -222,10 +290,12 @@ class PCMSConditioningStage(Stage):
         self._duration_min = duration_min
         self._stim_indices = stim_indices
         self._start_time = None
+        self._pending_trials = []
 
     def initialize(self, subject_id):
         self._subject_id = subject_id
         self._trial_index = 0
+        self._pending_trials = []
 
         for i in self._stim_indices:
             ApplicationConfiguration.set_biphasic_stimulus_pulse_parameters(i, amplitude_ma=0.8)
@@ -248,6 +318,7 @@ class PCMSConditioningStage(Stage):
 
     def process(self, data):
         current_time = time.time()
+        self._write_settled_trials()
 
         if current_time >= self._end_time:
             self.signals.new_message.emit(SessionMessage(f"→ {self.stage_name} complete."))
@@ -255,28 +326,45 @@ class PCMSConditioningStage(Stage):
             return
 
         if current_time >= self._next_stim_time:
+            self._next_stim_time += self._interval_sec
+            markers = []
             for i in self._stim_indices:
-                stim = ApplicationConfiguration.stimulator[i]
-                stim.set_active(True)
-                stim.trigger_single()
+                markers.append(self._trigger_stimulator(i, data))
                 time.sleep(0.01)
 
+            #If none of the stimulators are connected, there is no trial
+            triggered_indices = [i for (i, m) in zip(self._stim_indices, markers) if m is not None]
+            if len(triggered_indices) == 0:
+                self.signals.new_message.emit(SessionMessage(f"Stim indices {self._stim_indices} not triggered: no AM 4100 connected"))
+                return
+
+            #The trial is saved once Open Ephys has echoed its stimulus events
             self._trial_index += 1
             elapsed_time = current_time - self._start_time
-            FileIO_Helpers.write(self._fid, "int32", self._trial_index)
-            FileIO_Helpers.write(self._fid, "float64", elapsed_time)
+            self._pending_trials.append((self._trial_index, elapsed_time, markers))
 
             self.signals.new_message.emit(SessionMessage(
-                f"Trial {self._trial_index}: Stim indices {self._stim_indices} triggered at {elapsed_time:.2f} sec"
+                f"Trial {self._trial_index}: Stim indices {triggered_indices} triggered at {elapsed_time:.2f} sec"
             ))
-            self._next_stim_time += self._interval_sec
 
     def finalize(self):
         if self._fid:
+            self._write_settled_trials(flush_all=True)
             self._fid.close()
 
+    def _write_settled_trials(self, flush_all=False):
+        #Trials are saved in order, each one once all of its stimulus markers are settled. When the file
+        #is about to be closed, the remaining trials are saved with whatever sample numbers are known.
+        while (len(self._pending_trials) > 0) and (flush_all or all(m is None or m.is_settled for m in self._pending_trials[0][2])):
+            trial_index, elapsed_time, markers = self._pending_trials.pop(0)
+            stimulus_sample_nums = [m.sample_num if m is not None else -1 for m in markers]
+            FileIO_Helpers.write(self._fid, "int32", trial_index)
+            FileIO_Helpers.write(self._fid, "float64", elapsed_time)
+            FileIO_Helpers.write(self._fid, "int32", len(stimulus_sample_nums))
+            FileIO_Helpers.write_array(self._fid, "int64", stimulus_sample_nums)
+
     def _save_file_header(self):
-        FileIO_Helpers.write(self._fid, "int32", 1)
+        FileIO_Helpers.write(self._fid, "int32", 2)
         FileIO_Helpers.write_string(self._fid, self._subject_id)
         FileIO_Helpers.write_datetime(self._fid, self._current_datetime)
         FileIO_Helpers.write_string(self._fid, self.stage_name)
@@ -10,6 +10,8 @@ from .stage import Stage
 from ..session_message import SessionMessage
 from ..application_configuration import ApplicationConfiguration
 from ..fileio_helpers import FileIO_Helpers
+from ..open_ephys_streamer import OpenEphysDataFrame
+from ..stimulus_marker import StimulusMarker
 
 # from ..stimjim import StimJim
 from am_systems_4100.am_systems_4100 import AmSystems4100
@@ -26,20 +28,51 @@ class SalineBathDemoDataStage(Stage):
     # This defines the number of stimulations to induce. For demodata collection, any small number would work.
     STIM_INSTANCE_COUNT: int = 5
 
+    # The version of the file format
+    FILE_VERSION: int = 2
+
     #endregion
 
     #region Methods
 
     def save (self, fid: BinaryIO) -> None:
+        '''
+        Saves the data collected during the current stim iteration as a new block
+        at the end of the file, and then clears it. Data from earlier iterations
+        has already been saved, so it is not written again.
+        '''
+
+        #Gather the chunks collected during this iteration into a single (derivation count, sample count) array
+        if (len(self._iteration_chunks) > 0):
+            iteration_data: np.ndarray = np.concatenate(self._iteration_chunks, axis = 1)
+        else:
+            iteration_data: np.ndarray = np.zeros((0, 0))
+
         #Save a trial block indicator
         FileIO_Helpers.write(fid, "int32", int(1))
 
-        #Save the timestamp for this trial
-        FileIO_Helpers.write_datetime(fid, self.current_datetime)
+        #Save the timestamp for this iteration
+        FileIO_Helpers.write_datetime(fid, datetime.now())
 
-        #Save the trial data
-        for i in range(0, len(self.demo_data)):
-            FileIO_Helpers.write(fid, "float64", self.demo_data[i])
+        #Save the index of this iteration
+        FileIO_Helpers.write(fid, "int32", self._stim_index)
+
+        #Save the Open Ephys sample numbers at which AM 4100 #1 and #2 were triggered (-1 if they were not,
+        #or if Open Ephys did not echo the stimulus event). The iteration is saved several seconds after
+        #its stimuli, so the echoed events have already been received.
+        stimulus_sample_nums: list[int] = [m.sample_num if (m is not None) else -1 for m in self._stimulus_markers]
+        FileIO_Helpers.write_array(fid, "int64", stimulus_sample_nums)
+
+        #Save the number of derivations and samples in this iteration
+        FileIO_Helpers.write(fid, "int32", iteration_data.shape[0])
+        FileIO_Helpers.write(fid, "int32", iteration_data.shape[1])
+
+        #Save the iteration data, one derivation after another
+        FileIO_Helpers.write_array(fid, "float64", iteration_data)
+
+        #Start a new, empty list of chunks for the next iteration
+        self._iteration_chunks = []
+        self._stimulus_markers = [None, None]
 
     #endregion
 
@@ -56,8 +89,11 @@ class SalineBathDemoDataStage(Stage):
         #Create a private variable that will be used to store a save-file handle
         self._fid: BinaryIO = None
 
-        #Create a numpy array to hold the demo data
-        self.demo_data: np.ndarray = np.zeros(1)
+        #Create a list to hold the chunks of data collected during the current stim iteration
+        self._iteration_chunks: list[np.ndarray] = []
+
+        #Create a list to hold the marker of the stimulus from each stimulator during the current stim iteration
+        self._stimulus_markers: list[StimulusMarker] = [None, None]
         
         # Create a variable to track how many stims were made
         self._stim_index: int = 0
@@ -87,8 +123,9 @@ class SalineBathDemoDataStage(Stage):
         # Set the subject id
         self._subject_id = subject_id
 
-        #Create a numpy array to hold the demo data
-        self.demo_data: np.ndarray = np.zeros(1)
+        #Create a list to hold the chunks of data collected during the current stim iteration
+        self._iteration_chunks = []
+        self._stimulus_markers = [None, None]
 
         # Create a variable to track how many stims were made
         self._stim_index = 0
@@ -136,7 +173,7 @@ class SalineBathDemoDataStage(Stage):
         #Return from this function
         return (True, "")
 
-    def process(self, data: np.ndarray) -> None:
+    def process(self, data_frame: OpenEphysDataFrame) -> None:
         '''
         Process that set_active and trigger_single for AM 4100 #1 and #2, or displays
         a message in a timely manner. Each phase is split to allow PAUSE button.
@@ -159,18 +196,16 @@ class SalineBathDemoDataStage(Stage):
                 message: SessionMessage = SessionMessage(f"Stim iteration #{self._stim_index + 1} - AM 4100 #1")
                 self.signals.new_message.emit(message)
 
-                # Send the activation command to stimulator[0], which is AM 4100 #1 "Brain".
-                stim = ApplicationConfiguration.stimulator[0]
-                stim.set_active(True)
-                stim.trigger_single()
+                # Send the activation command to stimulator[0], which is AM 4100 #1 "Brain", and mark the stimulus in Open Ephys.
+                self._stimulus_markers[0] = self._trigger_stimulator(0, data_frame)
 
             else:
                 # Display a message: "Stimulator not found. Stim iteration #n - Stimulator #1".
                 message: SessionMessage = SessionMessage(f"Stimulator not found. Stim iteration #{self._stim_index + 1} - Stimulator #1")
                 self.signals.new_message.emit(message)
 
-            # Copy data into the demo data object
-            self.demo_data = np.concatenate([self.demo_data, data])
+            # Add the data to the current iteration
+            self._append_data(data_frame)
 
             # Set phase to next.
             self._stim_phase = "WAIT_GAP"
@@ -178,8 +213,8 @@ class SalineBathDemoDataStage(Stage):
         # Second phase, simply a wait time between stimulators 1 and 2.
         elif self._stim_phase == "WAIT_GAP":
 
-            # Copy data into the demo data object
-            self.demo_data = np.concatenate([self.demo_data, data])
+            # Add the data to the current iteration
+            self._append_data(data_frame)
             
             # Check if STIM_GAP_MILLISECONDS have elapsed since the timestamp of previous phase.
             if current_timestamp - self._stim_phase_timestamp >= self.STIM_GAP_MILLISECONDS / 1000.0:
@@ -198,18 +233,16 @@ class SalineBathDemoDataStage(Stage):
                 message: SessionMessage = SessionMessage(f"Stim iteration #{self._stim_index + 1} - AM 4100 #2")
                 self.signals.new_message.emit(message)
 
-                # Send the activation command to stimulator[1], which is AM 4100 #2 "Nerve".
-                stim = ApplicationConfiguration.stimulator[1]
-                stim.set_active(True)
-                stim.trigger_single()
+                # Send the activation command to stimulator[1], which is AM 4100 #2 "Nerve", and mark the stimulus in Open Ephys.
+                self._stimulus_markers[1] = self._trigger_stimulator(1, data_frame)
 
             else:
                 # Display a message: "Stimulator not found. Stim iteration #n - Stimulator #2"
                 message: SessionMessage = SessionMessage(f"Stimulator not found. Stim iteration #{self._stim_index + 1} - Stimulator #2")
                 self.signals.new_message.emit(message)
 
-            # Copy data into the demo data object
-            self.demo_data = np.concatenate([self.demo_data, data])
+            # Add the data to the current iteration
+            self._append_data(data_frame)
 
             # Set phase to next
             self._stim_phase = "WAIT_LONG"
@@ -248,7 +281,7 @@ class SalineBathDemoDataStage(Stage):
     def _save_file_header (self) -> None:
         if (self._fid is not None):
             #Save the file version
-            FileIO_Helpers.write(self._fid, "int32", int(0))
+            FileIO_Helpers.write(self._fid, "int32", SalineBathDemoDataStage.FILE_VERSION)
             
             #Save the subject id
             FileIO_Helpers.write_string(self._fid, self._subject_id)
@@ -267,6 +300,11 @@ class SalineBathDemoDataStage(Stage):
 
             pass
 
+    def _append_data (self, data_frame: OpenEphysDataFrame) -> None:
+        #The chunks are only joined together once per iteration, when the iteration is saved
+        if (data_frame.derivation_count > 0):
+            self._iteration_chunks.append(data_frame.filtered_data_block)
+
     def _check_am_4100_availability(self, index: int) -> bool:
         am_4100_list = ApplicationConfiguration.stimulator
         if (index < len(am_4100_list) and am_4100_list[index] is not None):
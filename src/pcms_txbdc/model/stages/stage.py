@@ -1,8 +1,11 @@
 from PySide6.QtCore import Signal, QObject
+from concurrent.futures import Future
 import pyqtgraph as pg
 import numpy as np
 
-from ..open_ephys_streamer import OpenEphysDataFrame
+from ..open_ephys_streamer import OpenEphysDataFrame, STIMULUS_EVENT_CHANNEL
+from ..application_configuration import ApplicationConfiguration
+from ..stimulus_marker import StimulusMarker, StimulusMarkerTracker
 
 class StageSignals (QObject):
 
@@ -13,6 +16,15 @@ class StageSignals (QObject):
     # Session running flag to control Start/Stop
     session_complete = Signal()
 
+    #Emitted by "process" when a trial has been completed. It carries the data that is
+    #needed to plot the trial. Plot widgets may only be touched on the UI thread, so the
+    #UI responds to this signal by calling the stage's "plot_trial" method.
+    trial_completed = Signal(object)
+
+    #Emitted when the stage's session plot needs to be redrawn. The UI responds to this
+    #signal by calling the stage's "update_session_plot" method.
+    session_plot_changed = Signal()
+
     #endregion
 
 class Stage (object):
@@ -54,6 +66,9 @@ class Stage (object):
         #Set the subject name
         self._subject_id: str = ""
 
+        #Keeps track of the stimuli whose TTL events have not yet been echoed by Open Ephys
+        self._stimulus_marker_tracker: StimulusMarkerTracker = StimulusMarkerTracker()
+
     #endregion
 
     #region Properties
@@ -107,6 +122,82 @@ class Stage (object):
 
         return
 
+    def plot_trial (self, trial_data: object) -> None:
+
+        #This is called on the UI thread with the data from the "trial_completed" signal.
+        #It should be implemented by each stage that plots its trials.
+
+        return
+
+    def update_session_plot (self) -> None:
+
+        #This is called on the UI thread when the stage emits the "session_plot_changed" signal.
+        #It should be implemented by each stage that has a session plot.
+
+        return
+
+    def update_stimulus_markers (self, data_frame: OpenEphysDataFrame) -> None:
+        '''
+        Resolves the stimulus markers whose TTL events were echoed by Open Ephys with this
+        frame. The stage runner calls this before passing each frame to "process".
+        '''
+
+        self._stimulus_marker_tracker.update(data_frame)
+
+    def _send_stimulus_event (self, data_frame: OpenEphysDataFrame, event_channel: int = STIMULUS_EVENT_CHANNEL) -> StimulusMarker:
+        '''
+        Sends a TTL event to Open Ephys to mark a stimulus that is being issued while
+        the given frame is processed. The returned marker holds the sample number of
+        the stimulus once Open Ephys has echoed the event (see StimulusMarker).
+        '''
+
+        marker: StimulusMarker = self._add_stimulus_marker(data_frame, event_channel)
+        ApplicationConfiguration.send_stimulus_event(marker.estimated_sample_num, event_channel)
+        return marker
+
+    def _trigger_stimulator (self, index: int, data_frame: OpenEphysDataFrame) -> StimulusMarker:
+        '''
+        Triggers a single stimulus on one of the AM 4100 stimulators, and marks it with a TTL event
+        to Open Ephys on the event channel for that stimulator (index + 1). Returns the
+        stimulus marker, or None if the stimulator is not connected.
+
+        The AM 4100 sends its commands from its own I/O thread, so the stimulus is only issued once
+        every command queued before it has been sent. The TTL event is therefore sent when the
+        stimulator acknowledges the trigger, rather than now. If the trigger fails, no event is
+        sent and the marker expires with an unknown sample number.
+        '''
+
+        am_4100_list = ApplicationConfiguration.stimulator
+        if (am_4100_list is None) or (index >= len(am_4100_list)) or (am_4100_list[index] is None):
+            return None
+
+        stim = am_4100_list[index]
+        stim.set_active(True)
+        trigger_future: Future = stim.trigger_single()
+
+        event_channel: int = index + 1
+        marker: StimulusMarker = self._add_stimulus_marker(data_frame, event_channel)
+
+        def _on_trigger_complete (completed_future: Future) -> None:
+            #This runs on the stimulator's I/O thread. Queueing an event is safe from any thread.
+            if (completed_future.cancelled()) or (completed_future.exception() is not None):
+                return
+            if (not stim.is_acknowledgement(completed_future.result())):
+                return
+
+            ApplicationConfiguration.send_stimulus_event(marker.estimated_sample_num, event_channel)
+
+        trigger_future.add_done_callback(_on_trigger_complete)
+
+        return marker
+
+    def _add_stimulus_marker (self, data_frame: OpenEphysDataFrame, event_channel: int) -> StimulusMarker:
+        #The first sample after the end of the frame is the earliest sample that can have been
+        #acquired after the stimulus was issued. It is only used until the echoed event arrives.
+        marker: StimulusMarker = StimulusMarker(event_channel, data_frame.sample_id + data_frame.num_samples)
+        self._stimulus_marker_tracker.add(marker)
+        return marker
+
     # def set_session_and_trial_widgets (self, session_widget: pg.PlotWidget, trial_widget: pg.PlotWidget) -> None:
     #     '''
     #     The UI calls this method to set the session and trial widgets on the stage object.
@@ -140,11 +231,5 @@ class Stage (object):
 
     #     pass
 
-    # def update_session_plot (self) -> None:
-
-    #     #This should be implemented by each stage
-
-    #     pass
-
     #endregion
 
@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+
+from .open_ephys_streamer import OpenEphysDataFrame, OpenEphysEvent, EVENT_TYPE_TTL
+
+@dataclass
+class StimulusMarker:
+    '''
+    A stimulus that has been marked in Open Ephys with a TTL event.
+
+    When the stimulus is issued, the only sample number that is known is an estimate:
+    the first sample after the end of the frame that was being processed at the time.
+    That estimate lags the real stimulus by the latency of the data stream. Open Ephys
+    echoes the TTL event back on the data socket, stamped with the sample number at
+    which it entered the signal chain, and that sample number is used once it arrives.
+
+    The estimate is also the sample number that is requested when the event is sent,
+    and together with the event channel it identifies the marker's echo.
+    '''
+
+    #The event channel on which the TTL event was sent
+    event_channel: int = 0
+
+    #The first sample after the end of the frame during which the stimulus was issued
+    estimated_sample_num: int = -1
+
+    #The sample number of the echoed TTL event (-1 until the echo has been received)
+    resolved_sample_num: int = -1
+
+    #True if Open Ephys did not echo the TTL event in time
+    is_expired: bool = False
+
+    #region Properties
+
+    @property
+    def is_resolved (self) -> bool:
+        return (self.resolved_sample_num >= 0)
+
+    @property
+    def is_settled (self) -> bool:
+        '''
+        True once the echoed event has been received, or once it is no longer expected
+        '''
+
+        return (self.is_resolved or self.is_expired)
+
+    @property
+    def sample_num (self) -> int:
+        '''
+        The sample number of the echoed TTL event, or -1 if it is not known
+        '''
+
+        return self.resolved_sample_num
+
+    #endregion
+
+class StimulusMarkerTracker:
+    '''
+    Matches the TTL events that Open Ephys echoes back to the stimulus markers
+    that are waiting for them.
+
+    Each echoed event is matched to a marker by its line and the sample number that was
+    requested when the event was sent (see OpenEphysEvent.requested_sample_num). An event
+    may be echoed more than once, because the event channel re-sends every event that was
+    in flight when it reconnects, even if Open Ephys had already received it. An echo that
+    matches no waiting marker is therefore ignored, rather than given to another marker.
+
+    A marker whose echo has not arrived within MAX_ECHO_DELAY_SECONDS of its estimated
+    sample number expires, and its sample number stays unknown.
+    '''
+
+    #region Constants
+
+    #The longest amount of time (in seconds) to wait for Open Ephys to echo an event
+    MAX_ECHO_DELAY_SECONDS: float = 1.0
+
+    #endregion
+
+    #region Constructor
+
+    def __init__(self):
+
+        #The number of echoed events that did not match a waiting marker
+        self.unmatched_echo_count: int = 0
+
+        #Private members. The waiting markers are keyed by (event channel, requested sample number).
+        self._pending_markers: dict[tuple[int, int], StimulusMarker] = {}
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def pending_marker_count (self) -> int:
+        return len(self._pending_markers)
+
+    #endregion
+
+    #region Methods
+
+    def add (self, marker: StimulusMarker) -> None:
+        '''
+        Starts waiting for the echo of a marker's TTL event. This must be called before the
+        event is sent, because the marker's estimated sample number may be moved forward by a
+        sample so that no two waiting markers on the same channel request the same sample number.
+        '''
+
+        while ((marker.event_channel, marker.estimated_sample_num) in self._pending_markers):
+            marker.estimated_sample_num += 1
+
+        self._pending_markers[(marker.event_channel, marker.estimated_sample_num)] = marker
+
+    def update (self, data_frame: OpenEphysDataFrame) -> None:
+        '''
+        Resolves the markers whose events were echoed with this frame, and expires
+        the markers that have waited too long
+        '''
+
+        #Resolve the marker that each echoed TTL event belongs to
+        for event in data_frame.events:
+            if (not self._is_echoed_stimulus_event(event)):
+                continue
+
+            marker: StimulusMarker = self._pending_markers.pop((event.line, event.requested_sample_num), None)
+            if (marker is None):
+                #This is a repeated echo, or the echo of a marker that has already expired
+                self.unmatched_echo_count += 1
+                continue
+
+            marker.resolved_sample_num = event.sample_num
+
+        #Give up on markers that have waited too long
+        if (len(self._pending_markers) > 0) and (data_frame.num_samples > 0):
+            sample_rate: float = data_frame.channel_data_blocks[0].sample_rate
+            max_delay_sample_count: int = int(StimulusMarkerTracker.MAX_ECHO_DELAY_SECONDS * sample_rate)
+            frame_end_sample_num: int = data_frame.sample_id + data_frame.num_samples
+
+            for (key, marker) in list(self._pending_markers.items()):
+                if ((marker.estimated_sample_num + max_delay_sample_count) < frame_end_sample_num):
+                    marker.is_expired = True
+                    del self._pending_markers[key]
+
+    def clear (self) -> None:
+        '''
+        Expires every marker that is still waiting
+        '''
+
+        for marker in self._pending_markers.values():
+            marker.is_expired = True
+        self._pending_markers.clear()
+
+    #endregion
+
+    #region Private methods
+
+    def _is_echoed_stimulus_event (self, event: OpenEphysEvent) -> bool:
+        #Only the rising edge of a TTL event on a known line marks a stimulus
+        return (event.event_type == EVENT_TYPE_TTL) and (event.line >= 0) and (event.state)
+
+    #endregion
@@ -0,0 +1,90 @@
+import numpy as np
+
+from .emg_ring_buffer import EmgRingBuffer
+
+class TrialCapture:
+    '''
+    Captures a fixed-length, multi-channel snippet of EMG around a trigger.
+
+    The snippet is made of a pre-trigger window, which is copied from a ring buffer
+    of recent samples when the capture is started, followed by a post-trigger window
+    that is filled as new data arrives. The snippet's array is allocated once, when
+    the capture is created, and incoming samples are copied into it at a write index.
+    Samples beyond the end of the snippet are ignored, so a completed snippet always
+    has exactly the requested length.
+    '''
+
+    #region Constructor
+
+    def __init__(self, pre_trigger_sample_count: int, post_trigger_sample_count: int, channel_count: int = 1, dtype = np.float64):
+
+        #Store the dimensions of the snippet
+        self.pre_trigger_sample_count: int = pre_trigger_sample_count
+        self.post_trigger_sample_count: int = post_trigger_sample_count
+        self.channel_count: int = channel_count
+        self.sample_count: int = pre_trigger_sample_count + post_trigger_sample_count
+
+        #Allocate the snippet
+        self._buffer: np.ndarray = np.zeros((channel_count, self.sample_count), dtype = dtype)
+
+        #This is the index at which the next sample will be written
+        self._write_index: int = 0
+
+    #endregion
+
+    #region Properties
+
+    @property
+    def is_complete (self) -> bool:
+        return (self._write_index >= self.sample_count)
+
+    @property
+    def data (self) -> np.ndarray:
+        '''
+        The samples that have been captured so far, with one row per channel.
+        This is a view, not a copy.
+        '''
+
+        return self._buffer[:, 0:self._write_index]
+
+    #endregion
+
+    #region Methods
+
+    def start (self, history: EmgRingBuffer = None) -> None:
+        '''
+        Starts a new capture. The pre-trigger window is filled with the most recent
+        samples in the history buffer. If no history buffer is given (or it holds fewer
+        samples than the pre-trigger window), the missing samples are left as zeros.
+        '''
+
+        self._buffer.fill(0)
+        self._write_index = self.pre_trigger_sample_count
+
+        if (history is not None) and (self.pre_trigger_sample_count > 0):
+            recent: np.ndarray = history.latest(self.pre_trigger_sample_count)
+            n: int = recent.shape[1]
+            self._buffer[:, self.pre_trigger_sample_count - n:self.pre_trigger_sample_count] = recent[0:self.channel_count]
+
+    def append (self, data) -> int:
+        '''
+        Copies new samples into the post-trigger window, and returns the number
+        of samples that were used. The data can be a 1-D array (for a single-channel
+        capture), or a 2-D array with one row per channel.
+        '''
+
+        #Allow single-channel captures to be given a 1-D array
+        if (self.channel_count == 1) and (np.ndim(data) == 1):
+            data = (data,)
+
+        n: int = min(len(data[0]), self.sample_count - self._write_index)
+        if (n <= 0):
+            return 0
+
+        for c in range(0, self.channel_count):
+            self._buffer[c, self._write_index:self._write_index + n] = data[c][0:n]
+
+        self._write_index += n
+        return n
+
+    #endregion
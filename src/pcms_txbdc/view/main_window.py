@@ -17,7 +17,7 @@ from PySide6.QtWidgets import (
 )
 
 from PySide6.QtGui import QFont, QAction
-from PySide6.QtCore import QThreadPool
+from PySide6.QtCore import QThreadPool, QTimer
 from PySide6 import QtCore, QtWidgets
 from PySide6.QtCore import Qt
 import pyqtgraph as pg
@@ -25,12 +25,13 @@ import numpy as np
 import pandas as pd
 import os
 from datetime import datetime
-from datetime import timedelta
 import time
 
 from typing import Tuple
+from platformdirs import user_data_dir
 
 from ..model.background_worker import BackgroundWorker
+from ..model.stage_runner import StageRunner
 from ..model.stages.stage import Stage
 from ..model.stages.salinebath_demodata_stage import SalineBathDemoDataStage
 from ..model.stages.pcms_stages import Stage0aFWaveLatency, Stage0bMEPLatency, PCMSConditioningStage #, SalineBathDemoDataStage, 
@@ -38,9 +39,11 @@ from ..model.stages.pcms_stages import Stage0aFWaveLatency, Stage0bMEPLatency, P
 from ..model.session_message import SessionMessage
 from ..model.application_configuration import ApplicationConfiguration
 
-from ..model.open_ephys_streamer import OpenEphysStreamer
+from ..model.open_ephys_streamer import DEFAULT_SUBSCRIBED_CHANNELS
 from ..model.open_ephys_streamer import OpenEphysDataBlock, OpenEphysDataFrame
-from ..model.emg_data_filter import EmgDataFilter
+from ..model.emg_ring_buffer import EmgRingBuffer
+from ..model.latency_metrics import LatencyMetrics
+from ..model.raw_emg_recorder import RawEmgRecorder
 
 class MainWindow(QMainWindow):
     """
@@ -52,6 +55,16 @@ class MainWindow(QMainWindow):
 
     EMG_PLOTTING_SAMPLE_COUNT: int = 5000
 
+    #The maximum rate (frames per second) at which the live EMG plot is redrawn. All data
+    #received between two redraws is shown together on the next redraw.
+    LIVE_EMG_PLOT_FPS: int = 30
+
+    #Whether pyqtgraph should downsample the live EMG plot and only draw the visible region
+    LIVE_EMG_PLOT_DOWNSAMPLING: bool = True
+
+    #How often (in milliseconds) the metrics in the status bar are updated
+    STATUS_BAR_UPDATE_INTERVAL_MS: int = 1000
+
     #endregion
 
     #region Constructor
@@ -62,20 +75,31 @@ class MainWindow(QMainWindow):
         # List to store message text entries
         self._msg_text_list = []  
         
-        # Initialize a variable to hold EMG signal data for plotting
-        self._emg_signal_data_raw = np.zeros(MainWindow.EMG_PLOTTING_SAMPLE_COUNT)
-        self._emg_signal_data_filtered = np.zeros(MainWindow.EMG_PLOTTING_SAMPLE_COUNT)
-        self._emg_signal_data_abs = np.zeros(MainWindow.EMG_PLOTTING_SAMPLE_COUNT)
+        # Initialize a ring buffer to hold EMG signal data for plotting
+        # Channel 0 = raw diff'd data, Channel 1 = filtered data, Channel 2 = abs'd data
+        self._emg_signal_buffer: EmgRingBuffer = EmgRingBuffer(3, MainWindow.EMG_PLOTTING_SAMPLE_COUNT)
 
         # Initialize a few flags used for plotting live emg data
         # Index 0 = plot raw diff'd data, Index 1 = plot filtered data, Index 2 = plot abs'd data
         self._live_emg_data_plot_flags: list[bool] = [True, False, False]
         self._live_emg_data_plot_legend_names: list[str] = ["Raw EMG data", "Filtered EMG data", "Absoluted-value EMG data"]
 
+        # This flag indicates that new EMG data has arrived since the live EMG plot was last redrawn
+        self._live_emg_plot_needs_update: bool = False
+
+        # The index of the differential EMG derivation that is shown on the live EMG plot
+        self._selected_derivation_index: int = 0
+
         # Initialize a flag to track whether a session is currently running
         self._is_session_running: bool = False
         self._is_session_paused: bool = False
 
+        # The stage runner executes the selected stage on its own thread while a session is running
+        self._stage_runner: StageRunner = None
+
+        # The raw EMG recorder saves every frame of data received while a session is running
+        self._raw_emg_recorder: RawEmgRecorder = None
+
         # STAGES -  FROM '..MODEL/STAGE/PSCMS_Stage' File
         # Initialize a list of stages
         self._stages: list[Stage] = []
@@ -147,12 +171,16 @@ class MainWindow(QMainWindow):
         central_widget.setLayout(self._layout)
         self.setCentralWidget(central_widget)
 
-        # Initialize some debug variables
+        # Initialize the counters used for the status bar metrics
         self._frame_count: int = 0
         self._sample_count: int = 0
-        self._min_sample_count: int = -1
-        self._max_sample_count: int = -1
-        self._frame_start = datetime.now()
+        self._sample_rate: float = 0
+        self._frame_count_start_time: float = time.perf_counter()
+
+        # Create the status bar panel that displays performance metrics
+        self._metrics_label = QLabel()
+        self._metrics_label.setFont(self._regular_font)
+        self.statusBar().addPermanentWidget(self._metrics_label, 1)
 
         # Set the session and plot widgets on each stage
         # for s in self._stages:
@@ -162,8 +190,21 @@ class MainWindow(QMainWindow):
         self.threadpool = QThreadPool()
         self.background_worker = BackgroundWorker()
         self.background_worker.signals.data_received_signal.connect(self._on_data_received)
+        ApplicationConfiguration.open_ephys_streamer = self.background_worker.open_ephys_streamer
         self.threadpool.start(self.background_worker)
 
+        # Initialize the timer that redraws the live EMG plot
+        self._live_emg_plot_timer = QTimer(self)
+        self._live_emg_plot_timer.setInterval(int(1000 / MainWindow.LIVE_EMG_PLOT_FPS))
+        self._live_emg_plot_timer.timeout.connect(self._on_live_emg_plot_timer_tick)
+        self._live_emg_plot_timer.start()
+
+        # Initialize the timer that updates the metrics in the status bar
+        self._status_bar_timer = QTimer(self)
+        self._status_bar_timer.setInterval(MainWindow.STATUS_BAR_UPDATE_INTERVAL_MS)
+        self._status_bar_timer.timeout.connect(self._on_status_bar_timer_tick)
+        self._status_bar_timer.start()
+
     #endregion
             
     #region Methods for creating the user interface
@@ -233,9 +274,11 @@ class MainWindow(QMainWindow):
         self._channel_selection_box.setStyleSheet("QComboBox {color: #000000; background-color: #FFFFFF;}")
         self._channel_selection_box.currentIndexChanged.connect(self._on_channel_selection_changed)
 
-        # Populate the stage selection box
-        channel_list: list[int] = list(range(1, 17))
-        self._channel_selection_box.addItems([str(c) for c in channel_list])
+        # Populate the channel selection box with one item for each differential derivation
+        # (each derivation is a pair of subscribed channels, shown here as 1-based channel numbers)
+        subscribed_channels: list[int] = sorted(DEFAULT_SUBSCRIBED_CHANNELS)
+        for k in range(0, len(subscribed_channels) // 2):
+            self._channel_selection_box.addItem(f"{k + 1} ({subscribed_channels[2 * k + 1] + 1} - {subscribed_channels[2 * k] + 1})")
 
         # Add elements to layout
         channel_layout.addStretch()
@@ -509,9 +552,24 @@ class MainWindow(QMainWindow):
         #Disconnect from the data received signal
         self.background_worker.signals.data_received_signal.disconnect(self._on_data_received)
 
+        #Stop redrawing the live EMG plot and updating the status bar
+        self._live_emg_plot_timer.stop()
+        self._status_bar_timer.stop()
+
         #Shut down the background thread
         self.background_worker.cancel()
 
+        #Shut down the stage-execution thread (this also finalizes the stage)
+        if (self._stage_runner is not None):
+            self._stage_runner.cancel()
+            self._stage_runner.wait()
+            self._stage_runner = None
+
+        #Finish writing the raw EMG recording
+        if (self._raw_emg_recorder is not None):
+            self._raw_emg_recorder.stop()
+            self._raw_emg_recorder = None
+
         #Close the AM 4100 stimulator serial/tcp connection if it exists
         ApplicationConfiguration.disconnect_from_am_systems_4100()
 
@@ -595,66 +653,88 @@ class MainWindow(QMainWindow):
         in the EMG channel selection box.
         '''
 
-        #Set the selected stage
-        current_stage_index = self._channel_selection_box.currentIndex()
-        if (current_stage_index >= 0):
-            OpenEphysStreamer.CHANNEL_SHOWN = current_stage_index
+        #Set the derivation that is shown on the live EMG plot
+        current_channel_index = self._channel_selection_box.currentIndex()
+        if (current_channel_index >= 0):
+            self._selected_derivation_index = current_channel_index
         else:
-            OpenEphysStreamer.CHANNEL_SHOWN = 0
+            self._selected_derivation_index = 0
+
+        #Discard the data of the previously selected derivation, so that the plot never mixes two derivations
+        self._emg_signal_buffer.clear()
+        self._live_emg_plot_needs_update = True
 
     def _on_data_received (self, received: OpenEphysDataFrame) -> None:
-        #Initialize the filter if necessary
-        if (EmgDataFilter.sos is None):
-            EmgDataFilter.initialize_filter()
+        #The background worker has already calculated the differential, filtered,
+        #and absolute-valued data for this frame
 
-        #Calculate the uninitialized fields in the dataframe
-        received.calculate_fields()
+        #Record every frame of data that is received while a session is running (even while paused)
+        if (self._raw_emg_recorder is not None):
+            self._raw_emg_recorder.submit(received)
+
+        #Check to see if a session is actively running
+        if (self._is_session_running) and (not (self._is_session_paused)):
+            #If so, hand the data to the stage-execution thread to be processed by the selected stage
+            self._stage_runner.submit(received)
+
+        #Make sure the frame contains the derivation that is selected for display
+        d: int = self._selected_derivation_index
+        if (d >= received.derivation_count):
+            return
 
         #Grab the data was sent from Open Ephys
-        data = received.diff_data_block
+        data = received.diff_data_block[d]
         sample_rate = received.channel_data_blocks[0].sample_rate
 
-        #Append the new data to the live EMG signal array, and remove old data
-        self._emg_signal_data_raw = np.concatenate([self._emg_signal_data_raw, received.diff_data_block])
-        self._emg_signal_data_filtered = np.concatenate([self._emg_signal_data_filtered, received.filtered_data_block])
-        self._emg_signal_data_abs = np.concatenate([self._emg_signal_data_abs, received.abs_data_block])
-        if (len(self._emg_signal_data_raw) > MainWindow.EMG_PLOTTING_SAMPLE_COUNT):
-            elements_to_remove = len(self._emg_signal_data_raw) - MainWindow.EMG_PLOTTING_SAMPLE_COUNT
-            self._emg_signal_data_raw = self._emg_signal_data_raw[elements_to_remove:]
-            self._emg_signal_data_filtered = self._emg_signal_data_filtered[elements_to_remove:]
-            self._emg_signal_data_abs = self._emg_signal_data_abs[elements_to_remove:]
+        #Append the new data to the live EMG signal buffer (this overwrites the oldest data)
+        self._emg_signal_buffer.append((received.diff_data_block[d], received.filtered_data_block[d], received.abs_data_block[d]))
         
-        #For debugging purposes, keep a count of how many frames per second we are achieving
+        #Keep a count of how many frames per second we are achieving, for the status bar
         self._frame_count += 1
         self._sample_count += len(data)
+        self._sample_rate = sample_rate
 
-        if (self._min_sample_count == -1) or (len(data) < self._min_sample_count):
-            self._min_sample_count = len(data)
-        
-        if (self._max_sample_count == -1) or (len(data) > self._max_sample_count):
-            self._max_sample_count = len(data)
-        
-        current_time = datetime.now()
-        if (current_time >= (self._frame_start + timedelta(seconds=1))):
-            samples_per_frame = self._sample_count / self._frame_count
-            print(f"Frame count = {self._frame_count}, Sample count = {self._sample_count}, Samples per frame = {samples_per_frame}, Min samples per frame = {self._min_sample_count}, Max samples per frame = {self._max_sample_count}, Sample rate = {sample_rate}")
-            self._min_sample_count = -1
-            self._max_sample_count = -1
-            self._frame_start = current_time
-            self._frame_count = 0
-            self._sample_count = 0
-        
-        #Check to see if a session is actively running
-        if (self._is_session_running) and (not (self._is_session_paused)):
-            #If so, process the data through the selected stage
-            self._selected_stage.process(received)
-
-        #Plot the live emg data
-        self._plot_live_emg()
+        #Flag the live emg plot to be redrawn on the next tick of the plot timer
+        self._live_emg_plot_needs_update = True
 
         #Return from this function
         return
     
+    def _on_live_emg_plot_timer_tick (self) -> None:
+        #Only redraw the live emg plot if new data has arrived since the last redraw
+        if (self._live_emg_plot_needs_update):
+            self._live_emg_plot_needs_update = False
+            with LatencyMetrics.timer(LatencyMetrics.PLOT):
+                self._plot_live_emg()
+
+    def _on_status_bar_timer_tick (self) -> None:
+        #Calculate the frame rate since the last update
+        current_time: float = time.perf_counter()
+        elapsed_time: float = current_time - self._frame_count_start_time
+        frames_per_second: float = self._frame_count / elapsed_time if (elapsed_time > 0) else 0
+        samples_per_frame: float = self._sample_count / self._frame_count if (self._frame_count > 0) else 0
+
+        self._frame_count = 0
+        self._sample_count = 0
+        self._frame_count_start_time = current_time
+
+        #Display the frame rate, any lost data, and the latency of each step (median/99th percentile, in ms)
+        frame_assembler = self.background_worker.frame_assembler
+        dropped_stage_frame_count: int = self._stage_runner.dropped_frame_count if (self._stage_runner is not None) else 0
+        latency_text: str = LatencyMetrics.summary_text([
+            LatencyMetrics.INGEST,
+            LatencyMetrics.FILTER,
+            LatencyMetrics.STAGE_PROCESS,
+            LatencyMetrics.ACQUISITION_TO_STAGE,
+            LatencyMetrics.STIMULATOR,
+            LatencyMetrics.PLOT
+        ])
+
+        self._metrics_label.setText(
+            f"{frames_per_second:.0f} frames/s ({samples_per_frame:.0f} samples/frame @ {self._sample_rate:.0f} Hz) | "
+            f"Dropped: {frame_assembler.dropped_frame_count} frames, {frame_assembler.dropped_block_count} blocks, {dropped_stage_frame_count} stage frames | "
+            f"Latency p50/p99 (ms): {latency_text}")
+
     def _on_single_stim_button_clicked(self) -> None:
         """
         Handles clicks for Brain/Nerve Stim buttons.
@@ -689,7 +769,9 @@ class MainWindow(QMainWindow):
             # Set stimulator parameters
             ApplicationConfiguration.set_biphasic_stimulus_pulse_parameters(stim_number, amplitude)
             stim = ApplicationConfiguration.stimulator[stim_number]
-            
+
+            # Wait for the parameters to be acknowledged, and then give the AM 4100 time to load them
+            stim.wait_for_pending_commands()
             time.sleep(0.1)     # wait for AM 4100 to load the parameters
 
             stim.set_active(True)
@@ -790,6 +872,8 @@ class MainWindow(QMainWindow):
             #Subscribe to signals from the selected stage
             self._selected_stage.signals.new_message.connect(self._on_message_received_from_stage)
             self._selected_stage.signals.session_complete.connect(self._on_stage_session_complete)
+            self._selected_stage.signals.trial_completed.connect(self._on_trial_completed_from_stage)
+            self._selected_stage.signals.session_plot_changed.connect(self._on_session_plot_changed_from_stage)
 
             #Initialize the selected stage
             init_result: tuple[bool, str] = self._selected_stage.initialize(self._subject_name)
@@ -799,6 +883,8 @@ class MainWindow(QMainWindow):
                 #Disconnect from the signals of the selected stage
                 self._selected_stage.signals.new_message.disconnect(self._on_message_received_from_stage)
                 self._selected_stage.signals.session_complete.disconnect(self._on_stage_session_complete)
+                self._selected_stage.signals.trial_completed.disconnect(self._on_trial_completed_from_stage)
+                self._selected_stage.signals.session_plot_changed.disconnect(self._on_session_plot_changed_from_stage)
 
                 #If not, then display an error dialog box to the user
                 error_message: str = init_result[1]
@@ -816,6 +902,16 @@ class MainWindow(QMainWindow):
             self._session_messages.append(message)
             self._update_session_messages()
 
+            #Start collecting a fresh set of latency metrics for this session
+            LatencyMetrics.reset()
+
+            #Start recording the raw EMG data for this session
+            self._start_raw_emg_recording()
+
+            #Start running the selected stage on its own thread
+            self._stage_runner = StageRunner(self._selected_stage)
+            self.threadpool.start(self._stage_runner)
+
             #Set the "session running" flag to True
             self._is_session_running = True
 
@@ -837,12 +933,25 @@ class MainWindow(QMainWindow):
             #Disconnect from the signals of the selected stage
             self._selected_stage.signals.new_message.disconnect(self._on_message_received_from_stage)
             self._selected_stage.signals.session_complete.disconnect(self._on_stage_session_complete)
+            self._selected_stage.signals.trial_completed.disconnect(self._on_trial_completed_from_stage)
+            self._selected_stage.signals.session_plot_changed.disconnect(self._on_session_plot_changed_from_stage)
 
             #Set the "session running" flag to False
             self._is_session_running = False
 
-            #Finalize the stage and close the data file
-            self._selected_stage.finalize()
+            #Stop the stage-execution thread. The stage runner finalizes the stage
+            #and closes the data file once the frame it is currently processing is finished.
+            self._stage_runner.cancel()
+            self._stage_runner.wait()
+            self._stage_runner = None
+
+            #Finish writing the raw EMG recording
+            if (self._raw_emg_recorder is not None):
+                self._raw_emg_recorder.stop()
+                self._raw_emg_recorder = None
+
+            #Save the latency metrics that were collected during this session
+            self._save_session_metrics()
 
             #Update she session message box
             message: SessionMessage = SessionMessage(f"Session stopped ({self._subject_name})")
@@ -903,6 +1012,13 @@ class MainWindow(QMainWindow):
         self._session_messages.append(message)
         self._update_session_messages()
 
+    def _on_trial_completed_from_stage (self, trial_data: object) -> None:
+        #The stage's plots are drawn here, on the UI thread, rather than on the stage's thread
+        self._selected_stage.plot_trial(trial_data)
+
+    def _on_session_plot_changed_from_stage (self) -> None:
+        self._selected_stage.update_session_plot()
+
     def _on_stage_session_complete (self) -> None:
         # Called when session_complete signal is emit
         if (self._is_session_running):
@@ -921,8 +1037,9 @@ class MainWindow(QMainWindow):
             self._session_messages.append(message)
             self._update_session_messages()
 
-            #Pass the text to the stage
-            self._selected_stage.input(user_input)
+            #Pass the text to the stage. The stage runner hands it to the stage between
+            #frames, so that it never races with the stage's processing of the data.
+            self._stage_runner.submit_input(user_input)
 
         pass
 
@@ -947,6 +1064,10 @@ class MainWindow(QMainWindow):
                     elif (i == 2):
                         self._live_emg_line_object_abs.setVisible(checked)
 
+                    #Hidden plot items are not updated, so make sure a newly visible
+                    #plot item is brought up to date on the next redraw
+                    self._live_emg_plot_needs_update = True
+
                     #Break out of the loop early (no need to continue since we found the correct item already)
                     break
 
@@ -961,6 +1082,60 @@ class MainWindow(QMainWindow):
 
         pass
 
+    def _get_subject_data_path (self) -> str:
+        '''
+        Returns the folder in which the current subject's data is saved, creating it if necessary
+        '''
+
+        app_data_path: str = user_data_dir(ApplicationConfiguration.appname, ApplicationConfiguration.appauthor)
+        file_path: str = os.path.join(app_data_path, self._subject_name)
+
+        #Create the folder if it does not yet exist
+        if (not os.path.exists(file_path)):
+            os.makedirs(file_path)
+
+        return file_path
+
+    def _start_raw_emg_recording (self) -> None:
+        '''
+        Opens a new raw EMG recording file for the session in the subject's data folder
+        '''
+
+        try:
+            file_path: str = self._get_subject_data_path()
+            file_timestamp: str = datetime.now().strftime("%Y%m%dT%H%M%S")
+            file_name: str = f"{self._subject_name}_{file_timestamp}.emgraw"
+
+            self._raw_emg_recorder = RawEmgRecorder(
+                os.path.join(file_path, file_name), 
+                self._subject_name, 
+                list(self.background_worker.frame_assembler.channels))
+            self._raw_emg_recorder.start()
+        except OSError as e:
+            self._raw_emg_recorder = None
+
+            message: SessionMessage = SessionMessage(f"Unable to record raw EMG data for this session: {e}")
+            self._session_messages.append(message)
+            self._update_session_messages()
+
+    def _save_session_metrics (self) -> None:
+        '''
+        Saves the latency metrics collected during the session to a file in the subject's data folder
+        '''
+
+        try:
+            #Define the path where we will save the metrics
+            file_path: str = self._get_subject_data_path()
+
+            #Save the metrics
+            file_timestamp: str = datetime.now().strftime("%Y%m%dT%H%M%S")
+            file_name: str = f"{self._subject_name}_{file_timestamp}_metrics.csv"
+            LatencyMetrics.dump(os.path.join(file_path, file_name))
+        except OSError as e:
+            message: SessionMessage = SessionMessage(f"Unable to save the session's latency metrics: {e}")
+            self._session_messages.append(message)
+            self._update_session_messages()
+
     def _clear_session_messages (self) -> None:
         #Clear the session messages
         self._session_messages.clear()
@@ -986,24 +1161,35 @@ class MainWindow(QMainWindow):
         pen_0 = pg.mkPen(color = (0, 0, 255), width = 2)
         pen_1 = pg.mkPen(color = (255, 0, 0), width = 2)
         pen_2 = pg.mkPen(color = (0, 255, 0), width = 2)
-        self._live_emg_x_data = list(range(0, len(self._emg_signal_data_raw)))
-        self._live_emg_line_object_raw = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_data_raw, pen = pen_0, name=self._live_emg_data_plot_legend_names[0])
-        self._live_emg_line_object_filtered = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_data_filtered, pen = pen_1, name=self._live_emg_data_plot_legend_names[1])
-        self._live_emg_line_object_abs = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_data_abs, pen = pen_2, name=self._live_emg_data_plot_legend_names[2])
+        self._live_emg_x_data = np.arange(0, self._emg_signal_buffer.capacity)
+        self._live_emg_line_object_raw = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_buffer.ordered_view(0), pen = pen_0, name=self._live_emg_data_plot_legend_names[0])
+        self._live_emg_line_object_filtered = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_buffer.ordered_view(1), pen = pen_1, name=self._live_emg_data_plot_legend_names[1])
+        self._live_emg_line_object_abs = self._live_emg_graph_widget.plot(self._live_emg_x_data, self._emg_signal_buffer.ordered_view(2), pen = pen_2, name=self._live_emg_data_plot_legend_names[2])
 
         self._live_emg_line_object_raw.setVisible(self._live_emg_data_plot_flags[0])
         self._live_emg_line_object_filtered.setVisible(self._live_emg_data_plot_flags[1])
         self._live_emg_line_object_abs.setVisible(self._live_emg_data_plot_flags[2])
 
+        #Keep the line objects in a list that is indexed the same way as the plot flags
+        self._live_emg_line_objects: list[pg.PlotDataItem] = [
+            self._live_emg_line_object_raw, 
+            self._live_emg_line_object_filtered, 
+            self._live_emg_line_object_abs
+        ]
+
+        #Let pyqtgraph reduce the number of points that are drawn
+        if (MainWindow.LIVE_EMG_PLOT_DOWNSAMPLING):
+            for line_object in self._live_emg_line_objects:
+                line_object.setDownsampling(auto = True, method = 'peak')
+                line_object.setClipToView(True)
+
     def _plot_live_emg(self) -> None:
         """
-        Plots the current live EMG data.
-
-        Parameters:
-            figure (Figure): Matplotlib Figure object for the live EMG plot.
+        Plots the current live EMG data. Only the plot items that are currently
+        visible are updated.
          """
-        self._live_emg_line_object_raw.setData(self._live_emg_x_data, self._emg_signal_data_raw)
-        self._live_emg_line_object_filtered.setData(self._live_emg_x_data, self._emg_signal_data_filtered)
-        self._live_emg_line_object_abs.setData(self._live_emg_x_data, self._emg_signal_data_abs)
+        for i in range(0, len(self._live_emg_line_objects)):
+            if (self._live_emg_data_plot_flags[i]):
+                self._live_emg_line_objects[i].setData(self._live_emg_x_data, self._emg_signal_buffer.ordered_view(i))
 
     #endregion
\ No newline at end of file